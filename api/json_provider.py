@@ -0,0 +1,67 @@
+import json
+from datetime import date
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson está en requirements.txt
+    orjson = None
+
+
+def _default(obj):
+    """Tipos que orjson no serializa por sí mismo, con el mismo formato que usa Flask."""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, date):
+        return http_date(obj)
+    if hasattr(obj, "__html__"):
+        return str(obj.__html__())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj, indent=False):
+    """
+    Serializar `obj` a bytes JSON UTF-8.
+
+    Usa orjson cuando está instalado. Las fechas pasan por `_default` para conservar el
+    formato HTTP de Flask, y los Decimal se devuelven como texto, igual que hasta ahora.
+    Si orjson no puede con el objeto (p. ej. enteros de más de 64 bits), se usa json.
+    """
+    if orjson is not None:
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=_default, option=option)
+        except orjson.JSONEncodeError:
+            pass
+
+    return json.dumps(
+        obj,
+        default=DefaultJSONProvider.default,
+        sort_keys=True,
+        ensure_ascii=False,
+        indent=2 if indent else None,
+        separators=None if indent else (",", ":")
+    ).encode("utf-8")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Proveedor JSON de la app: jsonify y app.json.dumps serializan con orjson."""
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # Opciones propias de json.dumps (p. ej. el filtro tojson de Jinja)
+            return super().dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode("utf-8")
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
+
+
+def init_json(app):
+    app.json = OrjsonProvider(app)
@@ -0,0 +1,72 @@
+import hashlib
+from datetime import datetime, timezone
+from flask import request, current_app, make_response
+from api.database import db
+from api.models.versiones_tablas import VersionesTablas
+
+def conditional_get(validators):
+    """
+    Middleware to answer conditional GETs (If-None-Match / If-Modified-Since) with 304.
+
+    `validators(**kwargs)` receives the route arguments and returns a tuple of values that
+    change whenever the representation changes (row and table versions, plus updated_at
+    timestamps for Last-Modified), or
+    None when the resource does not exist, in which case the endpoint runs normally. The
+    strong ETag is a hash of those values and Last-Modified is the newest timestamp among
+    them. The check runs before the endpoint, so a 304 never loads or serializes the body.
+    """
+    def decorator(f):
+        from functools import wraps
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            parts = validators(**kwargs)
+            if parts is None:
+                return f(*args, **kwargs)
+
+            etag = hashlib.sha1(repr((request.endpoint, *parts)).encode("utf-8")).hexdigest()
+            timestamps = [part for part in parts if isinstance(part, datetime)]
+            last_modified = None
+            if timestamps:
+                # updated_at columns are stored as naive UTC timestamps
+                last_modified = max(timestamps).replace(tzinfo=timezone.utc, microsecond=0)
+
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # The client may keep the body but must revalidate it on every use
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        return decorated_function
+    return decorator
+
+def _not_modified(etag, last_modified):
+    # If-None-Match takes precedence over If-Modified-Since and uses weak comparison (RFC 9110, 13.1.2)
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def table_versions(*tables):
+    """
+    Versions of `tables` from versiones_tablas, in argument order.
+
+    A statement trigger bumps the counter on every INSERT, UPDATE or DELETE, and writers
+    serialize on its row, so it grows in commit order; max(updated_at) can go backwards when a
+    long transaction commits after a shorter one (migrations/018_versiones_get_condicional.sql).
+    """
+    versions = dict(
+        db.session.query(VersionesTablas.tabla, VersionesTablas.version)
+        .filter(VersionesTablas.tabla.in_(tables))
+        .all()
+    )
+    return tuple(versions.get(table) for table in tables)
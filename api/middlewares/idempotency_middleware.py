@@ -0,0 +1,163 @@
+import hashlib
+import time
+from datetime import timedelta
+from urllib.parse import urlencode
+from flask import request, jsonify, current_app, make_response
+from sqlalchemy import select, delete, update, func, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from api.database import db
+from api.models.idempotency_keys import IdempotencyKeys
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+# Rows left 'en_proceso' by a crashed worker expire after this and can be claimed again
+LOCK_TIMEOUT = timedelta(minutes=5)
+EXPIRED_ROWS_PER_PURGE = 100
+
+_table = IdempotencyKeys.__table__
+
+
+def idempotent(ttl=timedelta(hours=24), wait_seconds=30):
+    """
+    Middleware to make a POST endpoint safe to retry with an `Idempotency-Key` header.
+
+    The first request with a key claims it in Postgres, runs the endpoint and stores the
+    response for `ttl`. Later requests with the same key and user get the stored response
+    back (with `Idempotent-Replayed: true`) without running the endpoint again. Keys are
+    scoped by the verified Firebase uid (when the route is authenticated) and by the route
+    parameters, so a key never replays a response stored for another user or resource. A duplicate
+    that arrives while the first one is still running waits up to `wait_seconds` for it to
+    finish (single-flight) and then replays its response, or answers 409 if it is still
+    running. Reusing a key with a different body answers 422. 5xx responses and exceptions
+    release the key so the client can retry. Requests without the header run normally.
+
+    The key table is accessed through its own short transactions, never through
+    db.session, so the endpoint keeps full control of its transaction.
+    """
+    def decorator(f):
+        from functools import wraps
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return f(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+            resource = _request_resource(kwargs)
+            if len(resource) > MAX_KEY_LENGTH:
+                return jsonify({'error': 'Route parameters are too long for an idempotent request'}), 400
+
+            ident = {'usuario': _request_user(), 'endpoint': request.endpoint, 'recurso': resource, 'clave': key}
+            fingerprint = hashlib.sha256(
+                b'\n'.join([request.method.encode(), request.path.encode(), request.get_data(cache=True)])
+            ).hexdigest()
+
+            deadline = time.monotonic() + wait_seconds
+            delay = 0.05
+            while True:
+                if _claim(ident, fingerprint):
+                    return _run_and_store(f, args, kwargs, ident, ttl)
+
+                stored = _load(ident)
+                if stored is None:
+                    # Released or expired between the claim and the read: try to claim again
+                    continue
+                if stored.huella != fingerprint:
+                    return jsonify({'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'}), 422
+                if stored.estado == 'completado':
+                    response = current_app.response_class(stored.cuerpo, status=stored.status_code, mimetype=stored.mimetype)
+                    response.headers['Idempotent-Replayed'] = 'true'
+                    return response
+                if time.monotonic() >= deadline:
+                    return jsonify({'error': 'A request with this Idempotency-Key is still being processed'}), 409
+
+                time.sleep(delay)
+                delay = min(delay * 2, 1.0)
+
+        return decorated_function
+    return decorator
+
+
+def _request_user():
+    """
+    Scope keys per user: the verified Firebase uid, or '' on unauthenticated routes.
+
+    A user id sent in the body is chosen by the client, so it is not used; unauthenticated
+    routes rely on the route parameters (`_request_resource`) instead.
+    """
+    user = getattr(request, 'user', None) or {}
+    return user.get('uid') or ''
+
+
+def _request_resource(kwargs):
+    """Scope keys per resource: the route parameters in a canonical form ('' when there are none)."""
+    return urlencode(sorted((name, str(value)) for name, value in kwargs.items()))
+
+
+def _claim(ident, fingerprint):
+    """Insert the key as 'en_proceso'; returns False if a live row for it already exists."""
+    with db.engine.begin() as conn:
+        conn.execute(delete(_table).where(*_matches(ident), _table.c.expira_en < func.timezone('utc', func.now())))
+        claimed = conn.execute(
+            insert(_table)
+            .values(
+                **ident,
+                huella=fingerprint,
+                estado='en_proceso',
+                expira_en=func.timezone('utc', func.now()) + LOCK_TIMEOUT
+            )
+            .on_conflict_do_nothing()
+            .returning(_table.c.clave)
+        ).first()
+    return claimed is not None
+
+
+def _load(ident):
+    with db.engine.connect() as conn:
+        return conn.execute(select(_table).where(*_matches(ident))).first()
+
+
+def _run_and_store(f, args, kwargs, ident, ttl):
+    try:
+        response = make_response(f(*args, **kwargs))
+    except Exception:
+        _release(ident)
+        raise
+
+    if response.status_code >= 500 or response.is_streamed:
+        _release(ident)
+        return response
+
+    with db.engine.begin() as conn:
+        conn.execute(
+            update(_table)
+            .where(*_matches(ident))
+            .values(
+                estado='completado',
+                status_code=response.status_code,
+                mimetype=response.mimetype,
+                cuerpo=response.get_data(),
+                expira_en=func.timezone('utc', func.now()) + ttl
+            )
+        )
+        # Opportunistic cleanup so the table does not grow without bound
+        expired = select(_table.c.usuario, _table.c.endpoint, _table.c.recurso, _table.c.clave).where(
+            _table.c.expira_en < func.timezone('utc', func.now())
+        ).limit(EXPIRED_ROWS_PER_PURGE)
+        conn.execute(
+            delete(_table).where(
+                tuple_(_table.c.usuario, _table.c.endpoint, _table.c.recurso, _table.c.clave).in_(expired)
+            )
+        )
+    return response
+
+
+def _release(ident):
+    with db.engine.begin() as conn:
+        conn.execute(delete(_table).where(*_matches(ident), _table.c.estado == 'en_proceso'))
+
+
+def _matches(ident):
+    return [_table.c[column] == value for column, value in ident.items()]
@@ -12,6 +12,8 @@ from .detalles_catalogo import DetallesCatalogo
 from .detalles_lamparas_ranpu import DetallesLamparasRanpu
 from .detalles_productos_ia import DetallesProductosIA
 from .modelos import Modelos
+from .resumen_modelos_productos import ResumenModelosProductos
+from .resumen_pedidos_usuario import ResumenPedidosUsuario
 from .estados_impresoras import EstadosImpresoras
 from .categorias_filamentos import CategoriasFilamentos
 from .filamentos import Filamentos
@@ -19,6 +21,11 @@ from .impresoras import Impresoras
 from .filamentos_compatibles import FilamentosCompatibles
 from .imagenes_ranpulamps import ImagenesRanpulamps
 from .colores import Colores
+from .idempotency_keys import IdempotencyKeys
+from .carritos import Carritos
+from .transiciones_pedidos import TransicionesPedidos
+from .outbox_eventos import OutboxEventos
+from .versiones_tablas import VersionesTablas
 
 # from .impresion import Impresion
 # from .modelos_impresion import ModelosImpresion
@@ -0,0 +1,24 @@
+from ..database import db
+
+class Carritos(db.Model):
+    __tablename__ = "carritos"
+
+    # Copia en Postgres de /carts/<firebase_uid>; la mantiene api/services/cart_store.py
+    firebase_uid = db.Column(db.String(128), primary_key=True)
+    contenido = db.Column(db.JSON, nullable=False)
+    # Cambio local todavía no replicado en Firebase (lo envía FirebaseCartSync por lotes)
+    pendiente_firebase = db.Column(db.Boolean, nullable=False, server_default=db.text("false"))
+    # Sube con cada escritura local; la réplica solo confirma la versión que envió
+    version = db.Column(db.BigInteger, nullable=False, server_default=db.text("0"))
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        server_default=db.text("timezone('utc', now())"),
+        server_onupdate=db.FetchedValue()
+    )
+
+    def to_dict(self):
+        return {
+            "firebase_uid": self.firebase_uid,
+            **(self.contenido or {})
+        }
@@ -7,6 +7,9 @@ class Colores(db.Model):
     nombre = db.Column(db.String(50), nullable=False)
     nombre_ingles = db.Column(db.String(50), nullable=False)
     hexadecimal = db.Column(db.String(10), nullable=False)
+    # Mantenidas por el trigger set_updated_at_version (migrations/003 y 018), en UTC
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"), server_onupdate=db.FetchedValue())
+    version = db.Column(db.BigInteger, nullable=False, server_default=db.text("0"), server_onupdate=db.FetchedValue())
 
     def to_dict(self):
         return {
@@ -13,6 +13,9 @@ class Filamentos(db.Model):
     fecha_compra = db.Column(db.DateTime, nullable=False)
     categoria_filamento_id = db.Column(db.Integer, db.ForeignKey('categorias_filamentos.categoria_filamento_id'), nullable=False)
     color_id = db.Column(db.Integer, db.ForeignKey('colores.color_id'), nullable=False)
+    # Mantenidas por el trigger set_updated_at_version (migrations/003 y 018), en UTC
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"), server_onupdate=db.FetchedValue())
+    version = db.Column(db.BigInteger, nullable=False, server_default=db.text("0"), server_onupdate=db.FetchedValue())
 
     # Relaciones
     categoria_filamento = db.relationship('CategoriasFilamentos', backref=db.backref('filamentos', lazy=True))
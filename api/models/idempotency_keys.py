@@ -0,0 +1,18 @@
+from ..database import db
+
+class IdempotencyKeys(db.Model):
+    __tablename__ = "idempotency_keys"
+
+    # Respuestas guardadas por Idempotency-Key; las maneja api/middlewares/idempotency_middleware.py
+    usuario = db.Column(db.String(128), primary_key=True)
+    endpoint = db.Column(db.String(100), primary_key=True)
+    # Parámetros de la ruta ("order_id=..."), ver migrations/019_idempotency_keys_recurso.sql
+    recurso = db.Column(db.String(255), primary_key=True, server_default="")
+    clave = db.Column(db.String(255), primary_key=True)
+    huella = db.Column(db.String(64), nullable=False)
+    estado = db.Column(db.String(20), nullable=False)  # 'en_proceso' o 'completado'
+    status_code = db.Column(db.Integer, nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+    cuerpo = db.Column(db.LargeBinary, nullable=True)
+    creado_en = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
+    expira_en = db.Column(db.DateTime, nullable=False, index=True)
@@ -8,6 +8,8 @@ class ImagenesProductos(db.Model):
     ubicacion = db.Column(db.String(1000), nullable=False)
     producto_id = db.Column(db.Integer, db.ForeignKey('productos.producto_id'), nullable=False)
     is_thumbnail = db.Column(db.Boolean, nullable=False, default=False)
+    # Versiones redimensionadas (thumbnail, card, detail) en WebP y JPEG; ver api/services/image_variants.py
+    variantes = db.Column(db.JSON, nullable=True)
 
     def to_dict(self):
         return {
@@ -15,5 +17,6 @@ class ImagenesProductos(db.Model):
             "descripcion": self.descripcion,
             "ubicacion": self.ubicacion,
             "producto_id": self.producto_id,
-            "is_thumbnail": self.is_thumbnail
+            "is_thumbnail": self.is_thumbnail,
+            "variantes": self.variantes or {}
         }
@@ -5,7 +5,16 @@ class ImagenesRanpulamps(db.Model):
 
     imagenes_ranpulamps_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     imagen_url = db.Column(db.String(1000), nullable=False)
-    producto_pedido_id = db.Column(db.Integer, db.ForeignKey('productos_pedidos.producto_pedido_id'), nullable=False)
+    producto_pedido_id = db.Column(db.Integer, nullable=False)
+    # Clave de partición mensual, la misma que la de su línea
+    fecha_pedido = db.Column(db.DateTime, primary_key=True)
+
+    __table_args__ = (
+        db.ForeignKeyConstraint(
+            ['producto_pedido_id', 'fecha_pedido'],
+            ['productos_pedidos.producto_pedido_id', 'productos_pedidos.fecha_pedido']
+        ),
+    )
 
     # Relationship to access producto_pedido if needed
     producto_pedido = db.relationship('ProductosPedidos', backref='imagenes')
@@ -0,0 +1,18 @@
+from sqlalchemy.dialects.postgresql import JSONB
+from ..database import db
+
+class OutboxEventos(db.Model):
+    __tablename__ = "outbox_eventos"
+
+    # Efectos externos (p. ej. borrar el carrito en Firebase) registrados en la misma transacción
+    # que el cambio que los causa; los procesa api/services/outbox.py con reintentos
+    evento_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    tipo = db.Column(db.String(50), nullable=False)
+    # Clave de deduplicación opcional (p. ej. 'paypal:<id del evento>')
+    clave = db.Column(db.String(200), nullable=True, unique=True)
+    payload = db.Column(JSONB, nullable=False)
+    intentos = db.Column(db.Integer, nullable=False, server_default=db.text("0"))
+    disponible_en = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
+    procesado_en = db.Column(db.DateTime, nullable=True)
+    ultimo_error = db.Column(db.String(1000), nullable=True)
+    creado_en = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
@@ -1,10 +1,13 @@
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
 from ..database import db
 
 class Pedidos(db.Model):
     __tablename__ = "pedidos"
 
     pedido_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    fecha_creacion = db.Column(db.DateTime, nullable=True)
+    # También es la clave de partición de las líneas del pedido (migrations/021_particiones_lineas_pedido.sql)
+    fecha_creacion = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
     fecha_envio = db.Column(db.DateTime, nullable=False)
     fecha_entrega = db.Column(db.DateTime, nullable=False)
     fecha_pago = db.Column(db.DateTime, nullable=False)
@@ -15,14 +18,24 @@ class Pedidos(db.Model):
     precio_final = db.Column(db.Numeric(10, 2), nullable=False)
     pago_id = db.Column(db.String(1000), nullable=False)
     temporal_cart_id = db.Column(db.String(100), nullable=False)
-    detalles_pago = db.Column(db.JSON, nullable=True)              
+    # Respuesta completa de la captura de PayPal; no se carga salvo con undefer()
+    detalles_pago = deferred(db.Column(JSONB(none_as_null=True), nullable=True))
+    # Campos de detalles_pago extraídos al capturar (api/services/detalles_pago.py)
+    paypal_capture_id = db.Column(db.String(64), nullable=True, index=True)
+    paypal_payer_id = db.Column(db.String(64), nullable=True, index=True)
+    paypal_status = db.Column(db.String(32), nullable=True, index=True)
     ingreso_neto = db.Column(db.Numeric(10, 2), nullable=True) 
+    # URI gs:// del JSON de la captura ya movido a Cloud Storage (api/services/archivo_pagos.py)
+    detalles_pago_archivo = db.Column(db.String(500), nullable=True)
+    detalles_pago_archivado_en = db.Column(db.DateTime, nullable=True)
 
     estado_pedido = db.relationship('EstadosPedidos', backref=db.backref('pedidos', lazy=True))
     direcciones = db.relationship('Direcciones', backref=db.backref('pedidos', lazy=True))
     impuesto = db.relationship('Impuestos', backref=db.backref('pedidos', lazy=True))
 
     def to_dict(self):
+        # detalles_pago no se incluye: puede estar archivado en Cloud Storage, se lee con
+        # api/services/archivo_pagos.leer_detalles_pago(_lote)
         return {
             "pedido_id": self.pedido_id,
             "fecha_creacion": self.fecha_creacion.isoformat() if self.fecha_creacion else None,
@@ -36,6 +49,9 @@ class Pedidos(db.Model):
             "precio_final": str(self.precio_final),
             "pago_id": self.pago_id,
             "temporal_cart_id": self.temporal_cart_id,
-            "detalles_pago": self.detalles_pago if self.detalles_pago else None, 
+            "paypal_capture_id": self.paypal_capture_id,
+            "paypal_payer_id": self.paypal_payer_id,
+            "paypal_status": self.paypal_status,
+            "detalles_pago_archivado": self.detalles_pago_archivo is not None,
             "ingreso_neto": str(self.ingreso_neto) if self.ingreso_neto else None
         }
@@ -12,11 +12,19 @@ class Productos(db.Model):
     gbl = db.Column(db.String(1000), nullable=False)
     precio = db.Column(db.Numeric(10, 2), nullable=False)
     categoria_producto_id = db.Column(db.Integer, db.ForeignKey('categorias_productos.categoria_producto_id'), nullable=False)
+    # Mantenidas por el trigger set_updated_at_version (migrations/003 y 018), en UTC
+    updated_at = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"), server_onupdate=db.FetchedValue())
+    version = db.Column(db.BigInteger, nullable=False, server_default=db.text("0"), server_onupdate=db.FetchedValue())
 
     # Relaciones
     categoria_producto = db.relationship('CategoriasProductos', backref=db.backref('productos', lazy=True))
     imagenes = db.relationship('ImagenesProductos', backref='producto', lazy=True)
 
+    # Relaciones 1:1 de solo lectura con las tablas de detalles (se escriben directamente en cada tabla)
+    detalles_catalogo = db.relationship('DetallesCatalogo', uselist=False, viewonly=True)
+    detalles_lamparas_ranpu = db.relationship('DetallesLamparasRanpu', uselist=False, viewonly=True)
+    detalles_productos_ia = db.relationship('DetallesProductosIA', uselist=False, viewonly=True)
+
     def to_dict(self):
         return {
             "producto_id": self.producto_id,
@@ -4,11 +4,17 @@ class ProductosPedidos(db.Model):
     __tablename__ = "productos_pedidos"
 
     producto_pedido_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos.pedido_id'), nullable=False)
+    pedido_id = db.Column(db.Integer, nullable=False)
+    # Clave de partición mensual: fecha_creacion del pedido (migrations/021_particiones_lineas_pedido.sql)
+    fecha_pedido = db.Column(db.DateTime, primary_key=True)
     producto_id = db.Column(db.Integer, db.ForeignKey('productos.producto_id'), nullable=False)
     color_id = db.Column(db.Integer, db.ForeignKey('colores.color_id'), nullable=True)
     cantidad = db.Column(db.Integer, nullable=False)
 
+    __table_args__ = (
+        db.ForeignKeyConstraint(['pedido_id', 'fecha_pedido'], ['pedidos.pedido_id', 'pedidos.fecha_creacion']),
+    )
+
     pedido = db.relationship('Pedidos', backref=db.backref('productos_pedidos_list', lazy=True))
     producto = db.relationship('Productos', backref=db.backref('productos_pedidos_list', lazy=True))
     color = db.relationship('Colores', backref=db.backref('productos_pedidos_list', lazy=True))
@@ -0,0 +1,20 @@
+from ..database import db
+
+class ResumenModelosProductos(db.Model):
+    __tablename__ = "resumen_modelos_productos"
+
+    # Agregados de los modelos de cada producto; los mantiene api/services/resumen_modelos.py
+    producto_id = db.Column(db.Integer, db.ForeignKey('productos.producto_id', ondelete='CASCADE'), primary_key=True)
+    cantidad_modelos = db.Column(db.Integer, nullable=False)
+    tiempo_estimado_total = db.Column(db.Interval, nullable=False)
+    peso_estimado_gramos_total = db.Column(db.Numeric(12, 2), nullable=False)
+    stock_minimo = db.Column(db.Integer, nullable=False)
+
+    def to_dict(self):
+        return {
+            "producto_id": self.producto_id,
+            "cantidad_modelos": self.cantidad_modelos,
+            "tiempo_estimado_total": str(self.tiempo_estimado_total),
+            "peso_estimado_gramos_total": str(self.peso_estimado_gramos_total),
+            "stock_minimo": self.stock_minimo
+        }
@@ -0,0 +1,32 @@
+from ..database import db
+
+class ResumenPedidosUsuario(db.Model):
+    __tablename__ = "resumen_pedidos_usuario"
+
+    # Modelo de lectura de "Mis pedidos"; lo mantiene api/services/resumen_pedidos.py
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos.pedido_id', ondelete='CASCADE'), primary_key=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuarios.usuario_id', ondelete='CASCADE'), nullable=False)
+    estado_pedido_id = db.Column(db.Integer, db.ForeignKey('estados_pedidos.estado_pedido_id'), nullable=False)
+    fecha_efectiva = db.Column(db.DateTime, nullable=False)
+    fecha_efectiva_es = db.Column(db.String(50), nullable=False)
+    fecha_efectiva_en = db.Column(db.String(50), nullable=False)
+    productos_nombres = db.Column(db.Text, nullable=False)
+    cantidad_total = db.Column(db.Integer, nullable=False)
+    thumbnail = db.Column(db.String(1000), nullable=True)
+
+    estado_pedido = db.relationship('EstadosPedidos')
+
+    def to_dict(self):
+        return {
+            "pedido_id": self.pedido_id,
+            "fecha_creacion": self.fecha_efectiva.isoformat(),
+            "fecha_creacion_es": self.fecha_efectiva_es,
+            "fecha_creacion_en": self.fecha_efectiva_en,
+            "estado": {
+                "nombre": self.estado_pedido.nombre,
+                "nombre_ingles": self.estado_pedido.nombre_ingles
+            },
+            "productos_nombres": self.productos_nombres,
+            "cantidad_total": self.cantidad_total,
+            "thumbnail": self.thumbnail
+        }
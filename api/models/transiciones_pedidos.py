@@ -0,0 +1,22 @@
+from ..database import db
+
+class TransicionesPedidos(db.Model):
+    __tablename__ = "transiciones_pedidos"
+
+    # Historial de cambios de estado hechos con POST /api/pedidos/transiciones
+    transicion_id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedidos.pedido_id', ondelete='CASCADE'), nullable=False, index=True)
+    estado_anterior_id = db.Column(db.Integer, db.ForeignKey('estados_pedidos.estado_pedido_id'), nullable=False)
+    estado_nuevo_id = db.Column(db.Integer, db.ForeignKey('estados_pedidos.estado_pedido_id'), nullable=False)
+    usuario = db.Column(db.String(128), nullable=True)
+    fecha = db.Column(db.DateTime, nullable=False, server_default=db.text("timezone('utc', now())"))
+
+    def to_dict(self):
+        return {
+            "transicion_id": self.transicion_id,
+            "pedido_id": self.pedido_id,
+            "estado_anterior_id": self.estado_anterior_id,
+            "estado_nuevo_id": self.estado_nuevo_id,
+            "usuario": self.usuario,
+            "fecha": self.fecha.isoformat() if self.fecha else None
+        }
@@ -0,0 +1,9 @@
+from ..database import db
+
+class VersionesTablas(db.Model):
+    __tablename__ = "versiones_tablas"
+
+    # Contador por tabla para los GET condicionales; lo sube un trigger por sentencia
+    # (migrations/018_versiones_get_condicional.sql), así que crece en orden de commit
+    tabla = db.Column(db.String(63), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, server_default=db.text("0"))
@@ -8,6 +8,7 @@ from paypalserversdk.logging.configuration.api_logging_configuration import (
     ResponseLoggingConfiguration
 )
 from paypalserversdk.paypal_serversdk_client import PaypalServersdkClient
+from api.services.http_client import http_client, TIMEOUTS
 
 # Assuming you use environment variables or your config to store PayPal credentials:
 PAYPAL_CLIENT_ID = os.getenv('PAYPAL_CLIENT_ID')
@@ -21,8 +22,10 @@ paypal_logging_config = LoggingConfiguration(
     response_logging_config=ResponseLoggingConfiguration(log_headers=True, log_body=True)
 )
 
-# Create the PayPal client
+# Create the PayPal client on the shared pooled session (keep-alive + per-host metrics)
 paypal_client = PaypalServersdkClient(
+    http_client_instance=http_client.session,
+    timeout=TIMEOUTS["paypal"][1],
     client_credentials_auth_credentials=ClientCredentialsAuthCredentials(
         o_auth_client_id=PAYPAL_CLIENT_ID,
         o_auth_client_secret=PAYPAL_CLIENT_SECRET
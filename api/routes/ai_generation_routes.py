@@ -1,5 +1,6 @@
 import os
 import time
+import logging
 import requests
 from datetime import datetime, timedelta, timezone
 from flask import Blueprint, request, jsonify, make_response, Response
@@ -10,6 +11,8 @@ from ..models.productos import Productos
 from ..models.detalles_productos_ia import DetallesProductosIA
 from ..models.imagenes_productos import ImagenesProductos
 from ..google_storage_config import GoogleCloudStorageConfig
+from ..services.image_variants import subir_variantes
+from ..services.http_client import http_client
 import firebase_admin
 from firebase_admin import storage
 
@@ -17,6 +20,8 @@ from firebase_admin import storage
 from api.middlewares.origin_middleware import validate_origin
 from api.middlewares.firebase_auth_middleware import firebase_auth_required
 
+logger = logging.getLogger(__name__)
+
 # Create Blueprint
 ai_generation_bp = Blueprint('ai_generation', __name__)
 
@@ -170,8 +175,9 @@ def generate_3d_model():
 
     # Verify that the api key has credits
     try:
-        response = requests.get(
-            "https://api.meshy.ai/openapi/v1/balance",
+        response = http_client.get(
+            "meshy",
+            f"{MESHY_BASE_URL}/v1/balance",
             headers=HEADERS,
         )
         response.raise_for_status()
@@ -191,7 +197,7 @@ def generate_3d_model():
     # Create the meshy ai task
     try:
         # 1. Submit the job to Meshy.ai
-        response = requests.post(url, json=payload, headers=HEADERS, timeout=120)
+        response = http_client.post("meshy", url, json=payload, headers=HEADERS, timeout=(5, 120))
         response.raise_for_status()
         job_info = response.json()
         job_id = job_info.get('result')
@@ -332,7 +338,7 @@ def finalize_3d_model():
 
     try:
         # 1. GET request to Meshy.ai to retrieve the job's current status
-        response = requests.get(status_url, headers=HEADERS, timeout=60)
+        response = http_client.get("meshy", status_url, headers=HEADERS)
         response.raise_for_status()
 
         # 2. Parse the JSON response
@@ -347,7 +353,7 @@ def finalize_3d_model():
         thumbnail_url = job_info.get('thumbnail_url', {}) # Thumbnail image extraction
 
         # Download the GLB file
-        glb_response = requests.get(glb_url)
+        glb_response = http_client.get("descargas", glb_url)
         glb_response.raise_for_status()
 
         if not glb_url or not obj_url:
@@ -395,7 +401,7 @@ def finalize_3d_model():
         # 10. Process and save the thumbnail in Google Cloud Storage
     try:
         # Download the thumbnail image
-        thumbnail_response = requests.get(thumbnail_url)
+        thumbnail_response = http_client.get("descargas", thumbnail_url)
         thumbnail_response.raise_for_status()
 
         # Initialize Google Cloud Storage
@@ -413,12 +419,22 @@ def finalize_3d_model():
         # Get the public URL of the uploaded thumbnail
         thumbnail_url_in_bucket = blob.public_url
 
+        # Resized WebP/JPEG variants next to the original; the product is saved even if this fails
+        try:
+            thumbnail_variants = subir_variantes(
+                thumbnail_response.content, thumbnail_url_in_bucket, new_product.producto_id
+            )
+        except Exception as e:
+            logger.error(f"Failed to generate thumbnail variants for job {job_id}: {e}")
+            thumbnail_variants = None
+
         # Save the thumbnail URL in the database
         new_thumbnail = ImagenesProductos(
             descripcion='Thumbnail generado por IA',
             ubicacion=thumbnail_url_in_bucket,
             producto_id=new_product.producto_id,
-            is_thumbnail=True
+            is_thumbnail=True,
+            variantes=thumbnail_variants
         )
         db.session.add(new_thumbnail)
 
@@ -529,7 +545,7 @@ def get_model_status():
 
     try:
         # 1. GET request to Meshy.ai to retrieve the job's current status
-        response = requests.get(status_url, headers=HEADERS, timeout=60)
+        response = http_client.get("meshy", status_url, headers=HEADERS)
         response.raise_for_status()
 
         # 2. Parse the JSON response
@@ -0,0 +1,245 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask import Blueprint, request, jsonify
+from flasgger import swag_from
+from ..services.analytics import ventas_diarias, productos_mas_vendidos, pedidos_por_estado, refrescar_vistas
+from ..services.http_client import http_client
+
+# Middleware protections
+from api.middlewares.origin_middleware import validate_origin
+from api.middlewares.firebase_auth_middleware import firebase_auth_required
+
+# Crear el Blueprint para la analítica de ventas
+analytics_bp = Blueprint('analytics', __name__)
+
+DIAS_POR_DEFECTO = 30
+MAX_PRODUCTOS_TOP = 100
+
+PARAMETROS_RANGO = [
+    {'name': 'start_date', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False, 'description': 'Fecha inicial (YYYY-MM-DD); por defecto hace 30 días'},
+    {'name': 'end_date', 'in': 'query', 'type': 'string', 'format': 'date', 'required': False, 'description': 'Fecha final inclusive (YYYY-MM-DD); por defecto hoy'}
+]
+
+
+def _rango_fechas():
+    """Leer start_date y end_date (YYYY-MM-DD); lanza ValueError si son inválidas."""
+    hasta = request.args.get('end_date')
+    hasta = datetime.strptime(hasta, '%Y-%m-%d').date() if hasta else date.today()
+    desde = request.args.get('start_date')
+    desde = datetime.strptime(desde, '%Y-%m-%d').date() if desde else hasta - timedelta(days=DIAS_POR_DEFECTO)
+    if desde > hasta:
+        raise ValueError("start_date no puede ser posterior a end_date")
+    return desde, hasta
+
+
+@analytics_bp.route('/ventas-diarias', methods=['GET'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Analítica'],
+    'summary': 'Ventas por día',
+    'description': 'Pedidos pagados, subtotal, ingresos e ingreso neto por día (hora de Ecuador). Se lee de una vista materializada que se refresca periódicamente.',
+    'parameters': PARAMETROS_RANGO,
+    'responses': {
+        200: {
+            'description': 'Ventas por día y totales del rango',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'dias': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'dia': {'type': 'string', 'example': '2024-11-15'},
+                                'pedidos': {'type': 'integer', 'example': 12},
+                                'subtotal': {'type': 'string', 'example': '300.00'},
+                                'ingresos': {'type': 'string', 'example': '347.00'},
+                                'ingreso_neto': {'type': 'string', 'example': '330.12'}
+                            }
+                        }
+                    },
+                    'totales': {'type': 'object'}
+                }
+            }
+        },
+        400: {'description': 'Fechas inválidas'},
+        500: {'description': 'Error interno del servidor'}
+    }
+})
+def get_ventas_diarias():
+    """Obtener las ventas por día en un rango de fechas."""
+    try:
+        desde, hasta = _rango_fechas()
+    except ValueError as e:
+        return jsonify({"message": "Fechas inválidas, use YYYY-MM-DD", "error": str(e)}), 400
+
+    try:
+        dias = ventas_diarias(desde, hasta)
+        totales = {"pedidos": sum(dia["pedidos"] for dia in dias)}
+        for campo in ("subtotal", "ingresos", "ingreso_neto"):
+            totales[campo] = str(sum((Decimal(dia[campo]) for dia in dias), Decimal("0.00")))
+        return jsonify({
+            "start_date": desde.isoformat(),
+            "end_date": hasta.isoformat(),
+            "dias": dias,
+            "totales": totales
+        }), 200
+    except Exception as e:
+        return jsonify({"message": "Error al obtener las ventas diarias", "error": str(e)}), 500
+
+
+@analytics_bp.route('/productos-top', methods=['GET'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Analítica'],
+    'summary': 'Productos más vendidos',
+    'description': 'Productos con más unidades vendidas en pedidos pagados dentro del rango.',
+    'parameters': PARAMETROS_RANGO + [
+        {'name': 'limit', 'in': 'query', 'type': 'integer', 'required': False, 'default': 10, 'description': 'Cantidad de productos (máximo 100)'}
+    ],
+    'responses': {
+        200: {
+            'description': 'Productos ordenados por unidades vendidas',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'productos': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'producto_id': {'type': 'integer', 'example': 1},
+                                'nombre': {'type': 'string', 'example': 'RanpuLamp'},
+                                'unidades': {'type': 'integer', 'example': 40},
+                                'pedidos': {'type': 'integer', 'example': 31}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {'description': 'Parámetros inválidos'},
+        500: {'description': 'Error interno del servidor'}
+    }
+})
+def get_productos_top():
+    """Obtener los productos más vendidos en un rango de fechas."""
+    try:
+        desde, hasta = _rango_fechas()
+    except ValueError as e:
+        return jsonify({"message": "Fechas inválidas, use YYYY-MM-DD", "error": str(e)}), 400
+
+    limite = request.args.get('limit', 10, type=int)
+    if limite < 1:
+        return jsonify({"message": "limit debe ser mayor que 0"}), 400
+    limite = min(limite, MAX_PRODUCTOS_TOP)
+
+    try:
+        return jsonify({
+            "start_date": desde.isoformat(),
+            "end_date": hasta.isoformat(),
+            "productos": productos_mas_vendidos(desde, hasta, limite)
+        }), 200
+    except Exception as e:
+        return jsonify({"message": "Error al obtener los productos más vendidos", "error": str(e)}), 500
+
+
+@analytics_bp.route('/pedidos-por-estado', methods=['GET'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Analítica'],
+    'summary': 'Pedidos por estado',
+    'description': 'Cantidad de pedidos y monto total por estado de pedido.',
+    'responses': {
+        200: {
+            'description': 'Pedidos agrupados por estado',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'estados': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'estado_pedido_id': {'type': 'integer', 'example': 4},
+                                'nombre': {'type': 'string', 'example': 'Pagado'},
+                                'nombre_ingles': {'type': 'string', 'example': 'Paid'},
+                                'pedidos': {'type': 'integer', 'example': 120},
+                                'total': {'type': 'string', 'example': '4210.50'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        500: {'description': 'Error interno del servidor'}
+    }
+})
+def get_pedidos_por_estado():
+    """Obtener la cantidad de pedidos por estado."""
+    try:
+        return jsonify({"estados": pedidos_por_estado()}), 200
+    except Exception as e:
+        return jsonify({"message": "Error al obtener los pedidos por estado", "error": str(e)}), 500
+
+
+@analytics_bp.route('/refresh', methods=['POST'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Analítica'],
+    'summary': 'Refrescar las vistas de analítica',
+    'description': 'Refresca ahora las vistas materializadas (sin bloquear las lecturas). Normalmente se refrescan solas cada ANALYTICS_REFRESH_SECONDS.',
+    'responses': {
+        200: {'description': 'Vistas refrescadas'},
+        409: {'description': 'Otro proceso ya está refrescando las vistas'},
+        500: {'description': 'Error interno del servidor'}
+    }
+})
+def refresh_analytics():
+    """Refrescar las vistas materializadas de analítica."""
+    try:
+        if not refrescar_vistas():
+            return jsonify({"message": "Las vistas ya se están refrescando"}), 409
+        return jsonify({"message": "Vistas refrescadas exitosamente"}), 200
+    except Exception as e:
+        return jsonify({"message": "Error al refrescar las vistas", "error": str(e)}), 500
+
+
+@analytics_bp.route('/integraciones', methods=['GET'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Analítica'],
+    'summary': 'Métricas de las llamadas HTTP salientes',
+    'description': (
+        'Solicitudes, errores de conexión, reintentos, respuestas por status y latencia (p50, p95 y máximo de las '
+        'últimas 500 llamadas) por host externo (PayPal, Meshy, descargas). Los contadores son de este proceso.'
+    ),
+    'responses': {
+        200: {
+            'description': 'Métricas por host',
+            'schema': {
+                'type': 'object',
+                'additionalProperties': {
+                    'type': 'object',
+                    'properties': {
+                        'solicitudes': {'type': 'integer', 'example': 120},
+                        'errores': {'type': 'integer', 'example': 1},
+                        'reintentos': {'type': 'integer', 'example': 2},
+                        'por_status': {'type': 'object', 'example': {'200': 118, '201': 2}},
+                        'latencia_ms_p50': {'type': 'number', 'example': 180.5},
+                        'latencia_ms_p95': {'type': 'number', 'example': 640.2},
+                        'latencia_ms_max': {'type': 'number', 'example': 1210.0}
+                    }
+                }
+            }
+        }
+    }
+})
+def get_metricas_integraciones():
+    """Obtener las métricas por host del cliente HTTP compartido."""
+    return jsonify(http_client.stats()), 200
@@ -0,0 +1,153 @@
+from flask import Blueprint, request, jsonify
+from flasgger import swag_from
+from ..database import db
+from ..services.cart_store import obtener_carrito, guardar_carrito, eliminar_carrito
+
+# Middleware protections
+from api.middlewares.origin_middleware import validate_origin
+from api.middlewares.firebase_auth_middleware import firebase_auth_required
+
+# Crear el Blueprint para carritos
+carritos_bp = Blueprint('carritos', __name__)
+
+
+def _es_propietario(firebase_uid):
+    """Solo el usuario autenticado puede leer o modificar su carrito."""
+    return (getattr(request, 'user', None) or {}).get('uid') == firebase_uid
+
+
+@carritos_bp.route('/<string:firebase_uid>', methods=['GET'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Carritos'],
+    'summary': 'Obtener el carrito de un usuario',
+    'description': 'Devuelve el carrito guardado en el servidor. Los cambios hechos directamente en Firebase llegan por un listener en segundo plano.',
+    'parameters': [
+        {
+            'name': 'firebase_uid',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'UID de Firebase del usuario'
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Carrito del usuario',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'items': {'type': 'array', 'items': {'type': 'object'}},
+                    'temporalId': {'type': 'string', 'example': 'a1b2c3'}
+                }
+            }
+        },
+        403: {'description': 'El carrito pertenece a otro usuario'},
+        404: {'description': 'Carrito no encontrado'},
+        500: {'description': 'Error interno del servidor'}
+    }
+})
+def get_carrito(firebase_uid):
+    """Obtener el carrito de un usuario."""
+    if not _es_propietario(firebase_uid):
+        return jsonify({"message": "No tienes permiso para ver este carrito"}), 403
+
+    try:
+        contenido = obtener_carrito(firebase_uid)
+        if not contenido:
+            return jsonify({"message": "Carrito no encontrado"}), 404
+        return jsonify(contenido), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": "Error al obtener el carrito", "error": str(e)}), 500
+
+
+@carritos_bp.route('/<string:firebase_uid>', methods=['PUT'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Carritos'],
+    'summary': 'Guardar el carrito de un usuario',
+    'description': 'Reemplaza el carrito en el servidor. El cambio se replica en Firebase en segundo plano, agrupado con otros carritos.',
+    'parameters': [
+        {
+            'name': 'firebase_uid',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'UID de Firebase del usuario'
+        },
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'items': {'type': 'array', 'items': {'type': 'object'}},
+                    'temporalId': {'type': 'string', 'example': 'a1b2c3'}
+                },
+                'required': ['items']
+            }
+        }
+    ],
+    'responses': {
+        200: {'description': 'Carrito guardado'},
+        400: {'description': 'Datos inválidos'},
+        403: {'description': 'El carrito pertenece a otro usuario'},
+        500: {'description': 'Error interno del servidor'}
+    }
+})
+def update_carrito(firebase_uid):
+    """Guardar el carrito de un usuario (write-through hacia Firebase)."""
+    if not _es_propietario(firebase_uid):
+        return jsonify({"message": "No tienes permiso para modificar este carrito"}), 403
+
+    contenido = request.get_json(silent=True)
+    if not isinstance(contenido, dict) or not isinstance(contenido.get('items'), list):
+        return jsonify({"message": "El carrito debe ser un objeto con una lista 'items'"}), 400
+
+    try:
+        guardar_carrito(firebase_uid, contenido)
+        db.session.commit()
+        return jsonify({"message": "Carrito guardado exitosamente"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": "Error al guardar el carrito", "error": str(e)}), 500
+
+
+@carritos_bp.route('/<string:firebase_uid>', methods=['DELETE'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Carritos'],
+    'summary': 'Eliminar el carrito de un usuario',
+    'description': 'Elimina el carrito en el servidor y, en segundo plano, en Firebase.',
+    'parameters': [
+        {
+            'name': 'firebase_uid',
+            'in': 'path',
+            'type': 'string',
+            'required': True,
+            'description': 'UID de Firebase del usuario'
+        }
+    ],
+    'responses': {
+        200: {'description': 'Carrito eliminado'},
+        403: {'description': 'El carrito pertenece a otro usuario'},
+        500: {'description': 'Error interno del servidor'}
+    }
+})
+def delete_carrito(firebase_uid):
+    """Eliminar el carrito de un usuario."""
+    if not _es_propietario(firebase_uid):
+        return jsonify({"message": "No tienes permiso para eliminar este carrito"}), 403
+
+    try:
+        eliminar_carrito(firebase_uid)
+        db.session.commit()
+        return jsonify({"message": "Carrito eliminado exitosamente"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": "Error al eliminar el carrito", "error": str(e)}), 500
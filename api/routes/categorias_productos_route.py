@@ -1,13 +1,24 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
+from sqlalchemy import func
 from ..models.categorias_productos import CategoriasProductos
 from ..database import db
+from ..services.catalog_cache import catalog_cache
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
+from api.middlewares.conditional_get_middleware import conditional_get, table_versions
 
 categorias_productos_bp = Blueprint('categorias_productos', __name__)
 
+def _validadores_categorias():
+    """Validadores para GET condicionales del listado"""
+    return (db.session.query(func.max(CategoriasProductos.updated_at)).scalar(), *table_versions("categorias_productos"))
+
+def _validadores_categoria(categoria_producto_id):
+    """Validadores para GET condicionales; None si no existe (la ruta responde 404)"""
+    return db.session.query(CategoriasProductos.updated_at, CategoriasProductos.version).filter(CategoriasProductos.categoria_producto_id == categoria_producto_id).first()
+
 @categorias_productos_bp.route('/', methods=['GET'])
 @validate_origin()
 @swag_from({
@@ -27,9 +38,11 @@ categorias_productos_bp = Blueprint('categorias_productos', __name__)
                     }
                 }
             }
-        }
+        },
+        304: {'description': 'No modificado desde la versión indicada en If-None-Match / If-Modified-Since'}
     }
 })
+@conditional_get(_validadores_categorias)
 def get_categorias_productos():
     """Obtener todas las categorías de productos"""
     categorias = CategoriasProductos.query.all()
@@ -61,9 +74,11 @@ def get_categorias_productos():
                 }
             }
         },
+        304: {'description': 'No modificado desde la versión indicada en If-None-Match / If-Modified-Since'},
         404: {'description': 'Categoría de producto no encontrada'}
     }
 })
+@conditional_get(_validadores_categoria)
 def get_categoria_producto(categoria_producto_id):
     """Obtener una categoría de producto por ID"""
     categoria = CategoriasProductos.query.get_or_404(categoria_producto_id)
@@ -152,6 +167,8 @@ def update_categoria_producto(categoria_producto_id):
     try:
         categoria.nombre = data['nombre']
         db.session.commit()
+        # El nombre de la categoría forma parte de cada producto del catálogo
+        catalog_cache.bump_version()
         return jsonify(categoria.to_dict()), 200
     except Exception as e:
         db.session.rollback()
@@ -183,6 +200,7 @@ def delete_categoria_producto(categoria_producto_id):
     try:
         db.session.delete(categoria)
         db.session.commit()
+        catalog_cache.bump_version()
         return jsonify({"message": "Categoría de producto eliminada exitosamente"}), 200
     except Exception as e:
         db.session.rollback()
@@ -7,10 +7,17 @@ from ..database import db
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
+from api.middlewares.conditional_get_middleware import conditional_get, table_versions
 
 # Crear el Blueprint para los colores disponibles
 colors_bp = Blueprint('colors', __name__)
 
+def _validadores_colores_disponibles():
+    """La disponibilidad cambia con los colores y con la longitud restante de los filamentos."""
+    colores = db.session.query(func.max(Colores.updated_at)).scalar()
+    filamentos = db.session.query(func.max(Filamentos.updated_at)).scalar()
+    return (colores, filamentos, *table_versions("colores", "filamentos"))
+
 @colors_bp.route('/available-colors', methods=['GET'])
 @validate_origin()
 @swag_from({
@@ -34,6 +41,7 @@ colors_bp = Blueprint('colors', __name__)
                 }
             }
         },
+        304: {'description': 'No modificado desde la versión indicada en If-None-Match / If-Modified-Since'},
         500: {
             'description': 'Error interno del servidor',
             'schema': {
@@ -46,6 +54,7 @@ colors_bp = Blueprint('colors', __name__)
         }
     }
 })
+@conditional_get(_validadores_colores_disponibles)
 def get_available_colors():
     """Obtiene la disponibilidad de colores basado en la suma de la longitud_actual de los filamentos."""
     try:
@@ -3,6 +3,7 @@ from flasgger import swag_from
 from ..models.estados_pedidos import EstadosPedidos
 from ..schemas.estados_pedidos_schema import EstadosPedidosSchema
 from ..database import db
+from ..services.transiciones_pedidos import estados_graph
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
@@ -84,6 +85,7 @@ def create_estado_pedido():
         estado = estados_pedidos_schema.load(data, session=db.session)
         db.session.add(estado)
         db.session.commit()
+        estados_graph.invalidate()
         return jsonify(estados_pedidos_schema.dump(estado)), 201
     except Exception as e:
         db.session.rollback()
@@ -172,6 +174,7 @@ def update_estado_pedido(estado_pedido_id):
     try:
         estado = estados_pedidos_schema.load(data, instance=estado, session=db.session)
         db.session.commit()
+        estados_graph.invalidate()
         return jsonify(estados_pedidos_schema.dump(estado)), 200
     except Exception as e:
         db.session.rollback()
@@ -204,6 +207,7 @@ def delete_estado_pedido(estado_pedido_id):
     try:
         db.session.delete(estado)
         db.session.commit()
+        estados_graph.invalidate()
         return jsonify({"message": "Estado de pedido eliminado exitosamente"}), 200
     except Exception as e:
         db.session.rollback()
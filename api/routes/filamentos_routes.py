@@ -1,9 +1,11 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
+from sqlalchemy.orm import joinedload
 from ..models.filamentos import Filamentos
 from ..schemas.filamentos_schema import FilamentosSchema
 from ..models.colores import Colores
 from ..database import db
+from ..services.json_stream import stream_json_list
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
@@ -47,8 +49,8 @@ filamentos_schema = FilamentosSchema(many=True)
 })
 def get_todos_filamentos():
     """Obtener todos los filamentos."""
-    filamentos = Filamentos.query.all()
-    return jsonify(filamentos_schema.dump(filamentos)), 200
+    query = Filamentos.query.options(joinedload(Filamentos.color)).order_by(Filamentos.filamento_id)
+    return stream_json_list(query, filamentos_schema.dump), 200
 
 @filamentos_bp.route('/<int:filamento_id>', methods=['GET'])
 @validate_origin()
@@ -1,8 +1,6 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
-from firebase_admin import storage
-from urllib.parse import urlparse, parse_qs, unquote
-import datetime
+from ..services.signed_urls import signed_url_cache
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
@@ -55,18 +53,10 @@ def get_signed_url():
         return jsonify({"message": "userId e imagePath son requeridos."}), 400
 
     try:
-        # Extract object path from the full URL
-        parsed_url = urlparse(image_url)
-        # Decode the path and remove leading "/v0/b/<bucket_name>/o/"
-        object_path = unquote(parsed_url.path).split('/o/')[-1]
-
-        bucket = storage.bucket()
-        blob = bucket.blob(object_path)
-
-        url = blob.generate_signed_url(
-            expiration=datetime.timedelta(minutes=15),
-            method="GET"
-        )
+        # Misma caché y pool de firmas que el detalle de pedidos
+        url = signed_url_cache.firmar([image_url]).get(image_url)
+        if url is None:
+            return jsonify({"message": "Error al generar la URL firmada."}), 500
 
         return jsonify({"url": url}), 200
 
@@ -1,14 +1,25 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
+from sqlalchemy import func
 from ..models.impuestos import Impuestos
 from ..schemas.impuestos_schema import ImpuestosSchema
 from ..database import db
+from ..services.cart_pricing import active_tax_cache
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
+from api.middlewares.conditional_get_middleware import conditional_get, table_versions
 
 impuestos_bp = Blueprint('impuestos', __name__)
 
+def _validadores_impuestos():
+    """Validadores para GET condicionales del listado"""
+    return (db.session.query(func.max(Impuestos.updated_at)).scalar(), *table_versions("impuestos"))
+
+def _validadores_impuesto(impuesto_id):
+    """Validadores para GET condicionales; None si no existe (la ruta responde 404)"""
+    return db.session.query(Impuestos.updated_at, Impuestos.version).filter(Impuestos.impuesto_id == impuesto_id).first()
+
 # Instancias de los schemas
 impuestos_schema = ImpuestosSchema()
 multiple_impuestos_schema = ImpuestosSchema(many=True)
@@ -34,9 +45,11 @@ multiple_impuestos_schema = ImpuestosSchema(many=True)
                     }
                 }
             }
-        }
+        },
+        304: {'description': 'No modificado desde la versión indicada en If-None-Match / If-Modified-Since'}
     }
 })
+@conditional_get(_validadores_impuestos)
 def get_impuestos():
     """Obtener todos los impuestos"""
     impuestos = Impuestos.query.all()
@@ -89,6 +102,7 @@ def create_impuesto():
             Impuestos.query.update({"activo": False})
         db.session.add(impuesto)
         db.session.commit()
+        active_tax_cache.invalidate()
         return jsonify(impuestos_schema.dump(impuesto)), 201
     except Exception as e:
         db.session.rollback()
@@ -121,9 +135,11 @@ def create_impuesto():
                 }
             }
         },
+        304: {'description': 'No modificado desde la versión indicada en If-None-Match / If-Modified-Since'},
         404: {'description': 'Impuesto no encontrado'}
     }
 })
+@conditional_get(_validadores_impuesto)
 def get_impuesto(impuesto_id):
     """Obtener un impuesto por ID"""
     impuesto = Impuestos.query.get_or_404(impuesto_id)
@@ -183,6 +199,7 @@ def update_impuesto(impuesto_id):
             Impuestos.query.update({"activo": False})
         impuesto = impuestos_schema.load(data, instance=impuesto, session=db.session)
         db.session.commit()
+        active_tax_cache.invalidate()
         return jsonify(impuestos_schema.dump(impuesto)), 200
     except Exception as e:
         db.session.rollback()
@@ -214,6 +231,7 @@ def delete_impuesto(impuesto_id):
     try:
         db.session.delete(impuesto)
         db.session.commit()
+        active_tax_cache.invalidate()
         return jsonify({"message": "Impuesto eliminado exitosamente"}), 200
     except Exception as e:
         db.session.rollback()
@@ -260,6 +278,7 @@ def activate_impuesto(impuesto_id):
         # Activar el impuesto seleccionado
         impuesto.activo = True
         db.session.commit()
+        active_tax_cache.invalidate()
 
         return jsonify(impuestos_schema.dump(impuesto)), 200
     except Exception as e:
@@ -1,8 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
+from sqlalchemy.orm import joinedload, selectinload
 from ..models.modelos import Modelos
+from ..models.productos import Productos
 from ..schemas.modelos_schema import ModelosSchema
 from ..database import db
+from ..services.resumen_modelos import recalcular_resumen_modelos
+from ..services.json_stream import stream_json_list
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
@@ -50,17 +54,23 @@ modelos_schema = ModelosSchema(many=True)
 })
 def get_todos_modelos():
     """Obtener todos los modelos registrados, incluyendo el producto asociado."""
-    modelos = Modelos.query.all()
-    response = [
+    query = (
+        Modelos.query
+        .options(
+            joinedload(Modelos.producto).joinedload(Productos.categoria_producto),
+            joinedload(Modelos.producto).selectinload(Productos.imagenes)
+        )
+        .order_by(Modelos.modelo_id)
+    )
+    return stream_json_list(query, lambda lote: (
         {
             **modelo_schema.dump(modelo),
             "producto": {
                 **modelo.producto.to_dict(),
                 "producto_id": modelo.producto_id  # Incluyendo producto_id dentro del objeto producto
             }
-        } for modelo in modelos
-    ]
-    return jsonify(response), 200
+        } for modelo in lote
+    )), 200
 
 @modelos_bp.route('/<int:modelo_id>', methods=['GET'])
 @validate_origin()
@@ -212,6 +222,7 @@ def create_modelo():
         # Crear el modelo
         nuevo_modelo = modelo_schema.load(data, session=db.session)
         db.session.add(nuevo_modelo)
+        recalcular_resumen_modelos(nuevo_modelo.producto_id)
         db.session.commit()
 
         # Respuesta exitosa
@@ -279,6 +290,7 @@ def update_modelo(modelo_id):
         return jsonify({"message": "Modelo no encontrado"}), 404
 
     data = request.get_json()
+    producto_id_anterior = modelo.producto_id
 
     try:
         # Validar y actualizar los campos
@@ -297,6 +309,8 @@ def update_modelo(modelo_id):
         if 'producto_id' in data:
             modelo.producto_id = data['producto_id']
 
+        # Si el modelo cambió de producto, ambos resúmenes se recalculan
+        recalcular_resumen_modelos(producto_id_anterior, modelo.producto_id)
         db.session.commit()
 
         return jsonify({
@@ -348,6 +362,7 @@ def delete_modelo(modelo_id):
     try:
         # Eliminar el modelo
         db.session.delete(modelo)
+        recalcular_resumen_modelos(modelo.producto_id)
         db.session.commit()
 
         # Respuesta exitosa
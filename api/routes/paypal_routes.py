@@ -1,27 +1,32 @@
 import logging
 import os
 import json
-import base64
 import requests
-import pytz
-from dateutil.parser import isoparse
-from datetime import datetime
 from flask import Blueprint, request, jsonify, redirect
 from paypalserversdk.models.amount_with_breakdown import AmountWithBreakdown
 from paypalserversdk.models.checkout_payment_intent import CheckoutPaymentIntent
 from paypalserversdk.models.order_request import OrderRequest
 from paypalserversdk.models.purchase_unit_request import PurchaseUnitRequest
-from api.models.productos import Productos
-from api.models.impuestos import Impuestos
 from api.models.pedidos_usuario import PedidosUsuario
 from api.models.pedidos import Pedidos
 from api.models.usuarios import Usuarios
-from firebase_admin import db as firebase_db  # Firebase Admin SDK initialized
 from api.database import db
+from api.services.cart_pricing import price_cart, PricingError
+from api.services.cart_store import obtener_carrito, actualizar_carrito
+from api.services.cotizaciones import verificar_cotizacion
+from api.services.capturas import CaptureError, pedido_pendiente, registrar_captura
+from api.services.paypal_token import paypal_token_cache, paypal_request
+from api.services.paypal_webhooks import (
+    SUPPORTED_EVENTS,
+    WebhookVerificationError,
+    accept_webhook_event,
+    verify_webhook_signature
+)
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
 from api.middlewares.firebase_auth_middleware import firebase_auth_required
+from api.middlewares.idempotency_middleware import idempotent
 
 logger = logging.getLogger(__name__)
 
@@ -31,39 +36,9 @@ paypal_bp = Blueprint("paypal", __name__)
 # PAYPAL DIRECT CAPTURE UTILS (OFFICIAL DOC STYLE)
 # =============================================================================
 
-PAYPAL_CLIENT_ID = os.getenv('PAYPAL_CLIENT_ID')
-PAYPAL_CLIENT_SECRET = os.getenv('PAYPAL_CLIENT_SECRET')
-
-# Toggle sandbox vs production as needed. 
-# In production, set this based on an env var if you prefer.
-USE_SANDBOX = True
-
-if USE_SANDBOX:
-    PAYPAL_BASE = "https://api-m.sandbox.paypal.com"
-else:
-    PAYPAL_BASE = "https://api-m.paypal.com"
-
-
 def get_paypal_access_token() -> str:
-    """
-    Fetch an OAuth2 access token directly from PayPal (client credentials).
-    https://developer.paypal.com/docs/api/get-an-access-token-curl/
-    """
-    url = f"{PAYPAL_BASE}/v1/oauth2/token"
-    auth_header = base64.b64encode(
-        f"{PAYPAL_CLIENT_ID}:{PAYPAL_CLIENT_SECRET}".encode("utf-8")
-    ).decode("utf-8")
-
-    headers = {
-        "Authorization": f"Basic {auth_header}",
-        "Content-Type": "application/x-www-form-urlencoded",
-    }
-    data = {"grant_type": "client_credentials"}
-
-    response = requests.post(url, headers=headers, data=data)
-    response.raise_for_status()  # raise HTTPError if 4xx/5xx
-    token_info = response.json()
-    return token_info["access_token"]
+    """Return the process-wide cached PayPal access token (refreshed only near expiry)."""
+    return paypal_token_cache.get()
 
 
 def capture_order_official(order_id: str) -> dict:
@@ -72,18 +47,24 @@ def capture_order_official(order_id: str) -> dict:
     per the official PayPal docs.
     https://developer.paypal.com/docs/api/orders/v2/#orders_capture
     """
-    access_token = get_paypal_access_token()
+    # Note: the capture API can accept an empty JSON body as per docs.
+    # PayPal-Request-Id makes PayPal replay the first capture, so the call can be retried safely.
+    response = paypal_request(
+        "POST",
+        f"/v2/checkout/orders/{order_id}/capture",
+        headers={"Content-Type": "application/json", "PayPal-Request-Id": f"capture-{order_id}"},
+        json={},
+        idempotente=True
+    )
+    return response.json()  # The API returns JSON with capture details
 
-    url = f"{PAYPAL_BASE}/v2/checkout/orders/{order_id}/capture"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-    }
 
-    # Note: the capture API can accept an empty JSON body as per docs
-    response = requests.post(url, headers=headers, json={})
-    response.raise_for_status()  # raise if HTTP 4xx/5xx
-    return response.json()  # The API returns JSON with capture details
+@paypal_bp.route("/token-stats", methods=["GET"])
+@validate_origin()
+@firebase_auth_required
+def get_token_stats():
+    """Return the PayPal access token cache counters (hits, fetches, failures, invalidations)."""
+    return jsonify(paypal_token_cache.stats()), 200
 
 
 # =============================================================================
@@ -93,34 +74,53 @@ def capture_order_official(order_id: str) -> dict:
 @paypal_bp.route("/orders", methods=["POST"])
 @validate_origin()
 @firebase_auth_required
+@idempotent()
 def create_order():
-    logger.info("Creating PayPal order with dynamic cart calculation from Firebase...")
+    logger.info("Creating PayPal order with dynamic cart calculation from the stored cart...")
     request_body = request.get_json() or {}
     user_id = request_body.get('userId')
     order_id = request_body.get('orderId')
+    price_quote = request_body.get('priceQuote')
 
     if not user_id:
         return jsonify({"message": "User ID is required"}), 400
     
     if not order_id:
         return jsonify({"message": "Order ID is required"}), 400
-    
-    usuario = Usuarios.query.filter_by(firebase_uid=user_id).first()
 
-    if not usuario:
-        return jsonify({"message": "User not found"}), 404
-    
+    # Fetch user's cart from the Postgres copy (no Realtime Database round trip)
+    cart = obtener_carrito(user_id)
+
+    if not cart:
+        return jsonify({"message": "No cart found for this user"}), 404
+
+    # A valid quote signed by create_pedido already ties this pedido to the user and fixes its
+    # amounts, so neither ownership nor product prices are queried again
+    quote = verificar_cotizacion(price_quote, order_id, user_id, cart.get('items', [])) if price_quote else None
+
     pedido = Pedidos.query.get(order_id)
     if not pedido:
         return jsonify({"message": "Pedido no encontrado"}), 404
-    
-    # Validar si el pedido pertenece al usuario
-    pertenece_usuario = PedidosUsuario.query.filter_by(
-        pedido_id=order_id, usuario_id=usuario.usuario_id
-    ).first()
 
-    if not pertenece_usuario:
-        return jsonify({"message": "No tienes permiso para ver este pedido"}), 403
+    if quote is None:
+        usuario = Usuarios.query.filter_by(firebase_uid=user_id).first()
+
+        if not usuario:
+            return jsonify({"message": "User not found"}), 404
+
+        # Validar si el pedido pertenece al usuario
+        pertenece_usuario = PedidosUsuario.query.filter_by(
+            pedido_id=order_id, usuario_id=usuario.usuario_id
+        ).first()
+
+        if not pertenece_usuario:
+            return jsonify({"message": "No tienes permiso para ver este pedido"}), 403
+
+        # No quote or a stale one: price the cart again
+        try:
+            quote = price_cart(cart.get('items', []), 'databaseProductId')
+        except PricingError as e:
+            return jsonify({"message": e.message}), e.status_code
     
     address_payload = {
         "name": {
@@ -136,44 +136,6 @@ def create_order():
         }
     }
 
-    # Fetch user's cart from Firebase Realtime Database
-    cart_ref = firebase_db.reference(f'/carts/{user_id}')
-    cart = cart_ref.get()
-
-    if not cart:
-        return jsonify({"message": "No cart found for this user"}), 404
-    
-    items = cart.get('items', [])
-
-    if not items or not isinstance(items, list):
-        return jsonify({"message": "Debe proporcionar una lista válida de productos con cantidades en 'items'"}), 400
-
-    # Retrieve the active tax
-    active_tax = Impuestos.query.filter_by(activo=True).first()
-    if not active_tax:
-        return jsonify({"message": "No hay ningún impuesto activo configurado"}), 400
-
-    tax_percentage = float(active_tax.porcentaje) / 100  # Convert to fraction
-
-    subtotal = 0
-    delivery_fee = 2.00
-
-    for item in items:
-        producto_id = item.get('databaseProductId')
-        quantity = item.get('quantity', 0)
-
-        if not producto_id or not isinstance(quantity, int) or quantity <= 0:
-            return jsonify({"message": f"ID de producto o cantidad inválida en el item: {item}"}), 400
-
-        producto = Productos.query.get(producto_id)
-        if not producto:
-            return jsonify({"message": f"Producto con ID {producto_id} no encontrado"}), 404
-
-        subtotal += float(producto.precio) * quantity
-
-    calculated_tax = round(subtotal * tax_percentage, 2)
-    total = round(subtotal + calculated_tax + delivery_fee, 2)
-
     # Create PayPal order with calculated total
     try:
         # If you want to keep using paypalserversdk for creation, that's okay:
@@ -195,14 +157,16 @@ def create_order():
                     PurchaseUnitRequest(
                         amount=AmountWithBreakdown(
                             currency_code='USD',
-                            value=f"{total:.2f}",
+                            value=f"{quote.total:.2f}",
                             breakdown={
-                                "item_total": {"currency_code": "USD", "value": f"{subtotal:.2f}"},
-                                "tax_total": {"currency_code": "USD", "value": f"{calculated_tax:.2f}"},
-                                "shipping": {"currency_code": "USD", "value": f"{delivery_fee:.2f}"}
+                                "item_total": {"currency_code": "USD", "value": f"{quote.subtotal:.2f}"},
+                                "tax_total": {"currency_code": "USD", "value": f"{quote.calculated_tax:.2f}"},
+                                "shipping": {"currency_code": "USD", "value": f"{quote.delivery_fee:.2f}"}
                             }
                         ),
-                        shipping=address_payload
+                        shipping=address_payload,
+                        # Lets the webhook find the pedido without the browser redirect
+                        custom_id=str(pedido.pedido_id)
                     )
                 ],
                 application_context={
@@ -241,7 +205,7 @@ def capture_redirect():
     """
     This endpoint is triggered by PayPal's return_url after user approves.
     We do a direct REST capture using the official doc approach, then
-    update Firebase, etc.
+    mark the cart as paid (mirrored to Firebase in the background).
     """
     order_id = request.args.get('token')  # PayPal returns the order ID as 'token'
     user_id = request.args.get('userId')
@@ -254,9 +218,9 @@ def capture_redirect():
         captured_data = capture_order_official(order_id)
         logger.info(f"Order {order_id} captured successfully. Data: {captured_data}")
 
-        # Update Firebase order status
-        cart_ref = firebase_db.reference(f'/carts/{user_id}')
-        cart_ref.update({"status": "paid"})
+        # Mark the cart as paid; the change reaches Firebase after the commit
+        actualizar_carrito(user_id, {"status": "paid"})
+        db.session.commit()
 
         # Redirect to success page with order details
         return redirect(f"{os.getenv('FRONTEND_URL')}/es/payment/success?orderId={order_id}")
@@ -266,6 +230,7 @@ def capture_redirect():
         return redirect(f"{os.getenv('FRONTEND_URL')}/es/payment/error?reason=error_http")
 
     except Exception as e:
+        db.session.rollback()
         logger.error(f"Error capturing order {order_id}: {e}")
         return redirect(f"{os.getenv('FRONTEND_URL')}/es/payment/error?reason=error")
 
@@ -275,94 +240,54 @@ def capture_redirect():
 
 @paypal_bp.route("/orders/<order_id>/capture", methods=["POST"])
 @validate_origin()
+@idempotent()
 def capture_order(order_id):
     """
-    Manual capture endpoint with 'all or nothing' behavior:
-      - Capture PayPal order
-      - Delete cart in Firebase
-      - Update pedido in SQL DB
-    If anything fails, the database changes are rolled back and no partial commit occurs.
+    Manual capture endpoint. No DB transaction is open while PayPal is called:
+      1. Find the user's pending pedido (short read, connection released right after)
+      2. Capture the PayPal order
+      3. Mark the pedido as paid and delete the stored cart in one short transaction;
+         the cart row stays pending until the batched Firebase sync deletes it
+    If step 3 fails the capture already happened at PayPal; retrying the request replays it
+    (same PayPal-Request-Id) and records it.
     """
     logger.info(f"Capturing PayPal order {order_id} via direct REST call...")
     logger.info(f"RAW request.data: {request.data}")
     logger.info(f"RAW request.get_json(silent=True): {request.get_json(silent=True)}")
 
+    request_body = request.get_json(silent=True) or {}
+    user_id = request_body.get('userId')
+    if not user_id:
+        return jsonify({"error": "Missing userId in request body"}), 400
+
     try:
-        # We start a DB transaction here.
-        # Any Exception raised within this 'with' block will cause a rollback.
-        with db.session.begin():
-            # 1) Capture the order directly
-            captured_data = capture_order_official(order_id)
-            logger.info(f"Order {order_id} captured successfully. Data: {captured_data}")
-
-            # If PayPal says it's not completed, raise an error to roll back
-            if captured_data.get('status') != 'COMPLETED':
-                raise ValueError("Order not completed by PayPal")
-
-            # 2) Remove the cart from Firebase
-            request_body = request.get_json() or {}
-            user_id = request_body.get('userId')
-            if not user_id:
-                raise ValueError("Missing userId in request body")
-
-            cart_ref = firebase_db.reference(f'/carts/{user_id}')
-
-            # If cart_ref.delete() fails (network, auth, etc.), it will raise an exception
-            # which triggers the DB rollback
-            cart_ref.delete()
-
-            # 3) Find the user's 'pending' pedido
-            user = Usuarios.query.filter_by(firebase_uid=user_id).first()
-            if not user:
-                raise ValueError("User not found for firebase_uid={}".format(user_id))
-
-            usuario_id = user.usuario_id
-            pedidos_usuario = PedidosUsuario.query.filter_by(usuario_id=usuario_id).all()
-            pedido_ids = [p.pedido_id for p in pedidos_usuario]
-
-            pedido = Pedidos.query.filter(
-                Pedidos.pedido_id.in_(pedido_ids),
-                Pedidos.estado_pedido_id == 8  # 'Esperando pago'
-            ).first()
-
-            if not pedido:
-                raise ValueError(f"No pending pedido (estado=8) found for user_id={user_id}")
-
-            # Extract capture details from the PayPal response
-            captures = (captured_data
-                        .get("purchase_units", [{}])[0]
-                        .get("payments", {})
-                        .get("captures", []))
-
-            if not captures:
-                raise ValueError("No capture info found in purchase_units->payments->captures")
-
-            first_capture = captures[0]
-            payment_id = first_capture.get("id")
-            create_time_str = first_capture.get("create_time")
-            seller_receivable_breakdown = first_capture.get("seller_receivable_breakdown", {})
-            net_amount = seller_receivable_breakdown.get("net_amount", {}).get("value")
-
-            # Convert create_time from UTC -> UTC-5
-            if create_time_str:
-                parsed_utc = isoparse(create_time_str)
-                tz_utc5 = pytz.timezone("Etc/GMT+5")
-                local_time = parsed_utc.astimezone(tz_utc5)
-                pedido.fecha_pago = local_time
-            else:
-                # fallback to "now"
-                pedido.fecha_pago = datetime.now(pytz.timezone("Etc/GMT+5"))
-
-            pedido.pago_id = payment_id
-            pedido.detalles_pago = captured_data
-            pedido.estado_pedido_id = 4  # Pagado
-            pedido.ingreso_neto = net_amount
-
-            # When we leave the 'with db.session.begin()' block successfully, DB changes commit
-
-        # If we reach here, both the DB commit succeeded AND the Firebase delete succeeded
+        # 1) Fail before charging anything if there is no order waiting for payment
+        pedido_id = pedido_pendiente(user_id).pedido_id
+        db.session.rollback()  # read only; returns the connection to the pool
+
+        # 2) Capture the order directly
+        captured_data = capture_order_official(order_id)
+        logger.info(f"Order {order_id} captured successfully. Data: {captured_data}")
+
+        if captured_data.get('status') != 'COMPLETED':
+            raise CaptureError("Order not completed by PayPal")
+
+        # 3) Short transaction: pedido paid + cart emptied (synced to Firebase in the background)
+        try:
+            registrar_captura(pedido_id, user_id, captured_data)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.critical(f"PayPal order {order_id} was captured but pedido {pedido_id} was not updated")
+            raise
+
         return jsonify({"message": "Order captured successfully", "status": captured_data.get('status')}), 200
 
+    except CaptureError as e:
+        db.session.rollback()
+        logger.error(f"Error capturing order {order_id}: {e.message}")
+        return jsonify({"error": e.message}), e.status_code
+
     except requests.HTTPError as http_err:
         # PayPal returned 4xx/5xx
         logger.error(f"PayPal HTTP error capturing order {order_id}: {http_err.response.text}")
@@ -370,6 +295,47 @@ def capture_order(order_id):
 
     except Exception as e:
         # Any other error -> logs + 500
+        db.session.rollback()
         logger.error(f"Error capturing order {order_id}: {e}")
         return jsonify({"error": str(e)}), 500
 
+
+
+# =============================================================================
+# WEBHOOK (PAYMENT.CAPTURE.*)
+# =============================================================================
+
+@paypal_bp.route("/webhook", methods=["POST"])
+def paypal_webhook():
+    """
+    PayPal webhook receiver. Called by PayPal, so there is no origin or Firebase check: the
+    signature is verified locally with the cached PayPal certificate. A verified event is only
+    written to the outbox and acknowledged; the pedido is updated by the outbox worker.
+    Redeliveries of the same event id are acknowledged without being queued again.
+    """
+    raw_body = request.get_data()
+    try:
+        verify_webhook_signature(request.headers, raw_body)
+    except WebhookVerificationError as e:
+        logger.warning(f"Rejected PayPal webhook: {e.message}")
+        return jsonify({"error": e.message}), 400
+
+    try:
+        event = json.loads(raw_body)
+    except ValueError:
+        return jsonify({"error": "Invalid JSON body"}), 400
+
+    if not isinstance(event, dict) or event.get("event_type") not in SUPPORTED_EVENTS:
+        return jsonify({"message": "ignored"}), 200
+
+    try:
+        accepted = accept_webhook_event(event)
+        db.session.commit()
+        logger.info(f"PayPal webhook {event.get('id')} ({event.get('event_type')}) "
+                    f"{'queued' if accepted else 'already received'}")
+        return jsonify({"message": "accepted"}), 200
+    except Exception as e:
+        # A non-2xx answer makes PayPal deliver the event again later
+        db.session.rollback()
+        logger.error(f"Error queuing PayPal webhook {event.get('id')}: {e}")
+        return jsonify({"error": str(e)}), 500
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flasgger import swag_from
-from firebase_admin import db as firebase_db
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import joinedload, selectinload, undefer
 from datetime import datetime
 import pytz
 from datetime import datetime
@@ -9,27 +9,29 @@ from ..models.pedidos import Pedidos
 from ..models.pedidos_usuario import PedidosUsuario
 from ..models.productos_pedidos import ProductosPedidos
 from ..models.direcciones import Direcciones
-from ..models.impuestos import Impuestos
 from ..models.productos import Productos
 from ..schemas.pedidos_schema import PedidosSchema
 from ..models.usuarios import Usuarios
-from ..models.imagenes_ranpulamps import ImagenesRanpulamps
-from ..models.colores import Colores
 from ..database import db
+from ..services.keyset import encode_cursor, decode_cursor, keyset_page
+from ..services.cart_pricing import price_cart, PricingError
+from ..services.json_stream import stream_json_list
+from ..services.resumen_pedidos import actualizar_resumen_pedidos
+from ..services.cart_store import obtener_carrito
+from ..services.cotizaciones import firmar_cotizacion
+from ..services.transiciones_pedidos import transicionar_pedidos, TransicionError
+from ..services.signed_urls import signed_url_cache
+from ..services.pedido_lineas import lineas_desde_carrito, lineas_de_pedidos, insertar_lineas_pedido, reemplazar_lineas_pedido
+from ..services.detalles_pago import buscar_pagos
+from ..services.archivo_pagos import leer_detalles_pago_lote
+from ..models.resumen_pedidos_usuario import ResumenPedidosUsuario
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
 from api.middlewares.firebase_auth_middleware import firebase_auth_required
+from api.middlewares.idempotency_middleware import idempotent
 
-ECUADOR_TZ = pytz.timezone("America/Guayaquil")
-MONTHS_ES = [
-    "enero", "febrero", "marzo", "abril", "mayo", "junio",
-    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
-]
-MONTHS_EN = [
-    "January", "February", "March", "April", "May", "June",
-    "July", "August", "September", "October", "November", "December"
-]
+MAX_PEDIDOS_POR_PAGINA = 100
 
 # Crear el Blueprint para pedidos
 pedidos_bp = Blueprint('pedidos', __name__)
@@ -38,46 +40,31 @@ pedidos_bp = Blueprint('pedidos', __name__)
 pedido_schema = PedidosSchema()
 multiple_pedidos_schema = PedidosSchema(many=True)
 
-def format_date_spanish(dt: datetime) -> str:
-    """Example output: 15 de noviembre, 2023."""
-    if dt is None:
-        return ""
-
-    # 1) Interpret dt as UTC (attach tzinfo=UTC)
-    dt_utc = dt.replace(tzinfo=pytz.utc)
-    # 2) Convert to Ecuador time (UTC-5)
-    local_dt = dt_utc.astimezone(ECUADOR_TZ)
-
-    day = local_dt.day
-    month = MONTHS_ES[local_dt.month - 1]
-    year = local_dt.year
-    return f"{day} de {month}, {year}"
-
-def format_date_english(dt: datetime) -> str:
-    """Example output: November 15, 2023."""
-    if dt is None:
-        return ""
-
-    # 1) Interpret dt as UTC
-    dt_utc = dt.replace(tzinfo=pytz.utc)
-    # 2) Convert to Ecuador time (UTC-5)
-    local_dt = dt_utc.astimezone(ECUADOR_TZ)
-
-    day = local_dt.day
-    month = MONTHS_EN[local_dt.month - 1]
-    year = local_dt.year
-    return f"{month} {day}, {year}"
-
 @pedidos_bp.route('/', methods=['GET'])
 @validate_origin()
 @firebase_auth_required
 @swag_from({
     'tags': ['Pedidos'],
     'summary': 'Obtener todos los pedidos',
-    'description': 'Obtiene una lista de todos los pedidos, incluyendo detalles de estado, dirección, impuesto, productos relacionados y usuario asociado.',
+    'description': (
+        'Obtiene los pedidos, incluyendo detalles de estado, dirección, impuesto, productos relacionados y usuario asociado, '
+        'del más reciente al más antiguo. Sin page ni per_page devuelve la lista completa (en streaming); con alguno de ellos '
+        'devuelve un objeto paginado {pedidos, total_items, total_pages, current_page, per_page}.'
+    ),
+    'parameters': [
+        {'name': 'estado_pedido_id', 'in': 'query', 'type': 'string', 'required': False, 'description': 'ID de estado, o varios separados por comas (p. ej. 4,5)'},
+        {'name': 'start_date', 'in': 'query', 'type': 'string', 'required': False, 'description': 'Fecha mínima (ISO) de pago, o de creación si no se ha pagado'},
+        {'name': 'end_date', 'in': 'query', 'type': 'string', 'required': False, 'description': 'Fecha máxima (ISO) de pago, o de creación si no se ha pagado'},
+        {'name': 'usuario_id', 'in': 'query', 'type': 'integer', 'required': False, 'description': 'Filtrar por ID interno del usuario'},
+        {'name': 'firebase_uid', 'in': 'query', 'type': 'string', 'required': False, 'description': 'Filtrar por UID de Firebase del usuario'},
+        {'name': 'page', 'in': 'query', 'type': 'integer', 'required': False, 'description': 'Número de página (activa la paginación)'},
+        {'name': 'per_page', 'in': 'query', 'type': 'integer', 'required': False, 'description': 'Pedidos por página (máximo 100, por defecto 20)'},
+        {'name': 'incluir_detalles_pago', 'in': 'query', 'type': 'boolean', 'required': False, 'default': False, 'description': 'Incluir el JSON completo de la captura de PayPal (detalles_pago), también el de los pedidos ya archivados en Cloud Storage'}
+    ],
     'responses': {
+        400: {'description': 'Filtro inválido'},
         200: {
-            'description': 'Lista de pedidos',
+            'description': 'Lista de pedidos (o página de pedidos si se usa page / per_page)',
             'schema': {
                 'type': 'array',
                 'items': {
@@ -120,6 +107,10 @@ def format_date_english(dt: datetime) -> str:
                         },
                         'usuario_id': {'type': 'integer', 'example': 1},
                         'pago_id': {'type': 'string', 'example': 'PAY123'},
+                        'paypal_capture_id': {'type': 'string', 'example': '3C679366HH908993F'},
+                        'paypal_payer_id': {'type': 'string', 'example': 'QYR5Z8XDVJNXQ'},
+                        'paypal_status': {'type': 'string', 'example': 'COMPLETED'},
+                        'detalles_pago_archivado': {'type': 'boolean', 'example': False},
                         'precio': {'type': 'string', 'example': '100.00'},
                         'precio_final': {'type': 'string', 'example': '112.00'},
                         'productos': {
@@ -141,21 +132,119 @@ def format_date_english(dt: datetime) -> str:
 })
 def get_todos_pedidos():
     """Obtener todos los pedidos, incluyendo detalles, productos relacionados y usuario asociado."""
-    pedidos = Pedidos.query.all()
-    response = []
-    for pedido in pedidos:
-        productos_pedidos = [
-            {
-                "producto_id": item.producto.producto_id,
-                "nombre": item.producto.nombre,
-                "cantidad": item.cantidad
-            } for item in ProductosPedidos.query.filter_by(pedido_id=pedido.pedido_id).all()
-        ]
+    try:
+        query = _filtrar_pedidos_admin(
+            Pedidos.query.options(
+                joinedload(Pedidos.estado_pedido),
+                joinedload(Pedidos.direcciones),
+                joinedload(Pedidos.impuesto)
+            )
+        )
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Más recientes primero (índice ix_pedidos_fecha_efectiva)
+    query = query.order_by(func.coalesce(Pedidos.fecha_pago, Pedidos.fecha_creacion).desc(), Pedidos.pedido_id.desc())
+
+    # El JSON de la captura es diferido; solo se lee si se pide explícitamente
+    incluir_detalles_pago = request.args.get('incluir_detalles_pago', 'false').lower() == 'true'
+    if incluir_detalles_pago:
+        query = query.options(undefer(Pedidos.detalles_pago))
+
+    def serializar_lote(pedidos):
+        return _serializar_lote_pedidos(pedidos, incluir_detalles_pago)
+
+    if 'page' not in request.args and 'per_page' not in request.args:
+        # Sin paginación se mantiene la lista completa, enviada por lotes
+        return stream_json_list(query, serializar_lote), 200
+
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), MAX_PEDIDOS_POR_PAGINA)
+    paginated_pedidos = query.paginate(page=page, per_page=per_page, error_out=False)
+
+    return jsonify({
+        "pedidos": list(serializar_lote(paginated_pedidos.items)) if paginated_pedidos.items else [],
+        "total_items": paginated_pedidos.total,
+        "total_pages": paginated_pedidos.pages,
+        "current_page": paginated_pedidos.page,
+        "per_page": paginated_pedidos.per_page
+    }), 200
+
+def _filtrar_pedidos_admin(query):
+    """
+    Aplicar los filtros del listado de administración: estado_pedido_id (uno o varios separados
+    por comas), start_date / end_date sobre la fecha efectiva (fecha_pago, o fecha_creacion si
+    no se ha pagado), y usuario_id o firebase_uid. Lanza ValueError si un filtro es inválido.
+    """
+    estados = request.args.get('estado_pedido_id')
+    if estados:
+        try:
+            estado_ids = [int(estado) for estado in estados.split(',') if estado.strip()]
+        except ValueError:
+            raise ValueError("estado_pedido_id debe ser un entero o una lista de enteros separados por comas")
+        query = query.filter(Pedidos.estado_pedido_id.in_(estado_ids))
+
+    fecha_efectiva = func.coalesce(Pedidos.fecha_pago, Pedidos.fecha_creacion)
+    start_date = _fecha_parametro('start_date')
+    end_date = _fecha_parametro('end_date')
+    if start_date:
+        query = query.filter(fecha_efectiva >= start_date)
+    if end_date:
+        query = query.filter(fecha_efectiva <= end_date)
+
+    usuario_id = request.args.get('usuario_id', type=int)
+    firebase_uid = request.args.get('firebase_uid')
+    if usuario_id is not None or firebase_uid:
+        query = query.join(PedidosUsuario, PedidosUsuario.pedido_id == Pedidos.pedido_id)
+        if usuario_id is not None:
+            query = query.filter(PedidosUsuario.usuario_id == usuario_id)
+        if firebase_uid:
+            query = query.join(Usuarios, Usuarios.usuario_id == PedidosUsuario.usuario_id).filter(
+                Usuarios.firebase_uid == firebase_uid
+            )
+
+    return query
+
+def _fecha_parametro(parametro):
+    valor = request.args.get(parametro)
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        raise ValueError(f"{parametro} debe tener formato ISO (YYYY-MM-DD)")
+
+def _serializar_lote_pedidos(pedidos, incluir_detalles_pago=False):
+    """Serializar un lote de pedidos cargando productos y usuarios de todo el lote con dos consultas."""
+    pedido_ids = [pedido.pedido_id for pedido in pedidos]
+
+    productos_por_pedido = {}
+    filas = (
+        db.session.query(ProductosPedidos.pedido_id, Productos.producto_id, Productos.nombre, ProductosPedidos.cantidad)
+        .join(Productos, ProductosPedidos.producto_id == Productos.producto_id)
+        .filter(lineas_de_pedidos(pedidos))
+        .order_by(ProductosPedidos.producto_pedido_id)
+    )
+    for fila in filas:
+        productos_por_pedido.setdefault(fila.pedido_id, []).append({
+            "producto_id": fila.producto_id,
+            "nombre": fila.nombre,
+            "cantidad": fila.cantidad
+        })
+
+    usuarios_por_pedido = dict(
+        db.session.query(PedidosUsuario.pedido_id, PedidosUsuario.usuario_id)
+        .filter(PedidosUsuario.pedido_id.in_(pedido_ids))
+        .all()
+    )
 
-        usuario_pedido = PedidosUsuario.query.filter_by(pedido_id=pedido.pedido_id).first()
-        usuario_id = usuario_pedido.usuario_id if usuario_pedido else None
+    # Los JSON ya archivados se traen de Cloud Storage
+    detalles_pago = leer_detalles_pago_lote(pedidos) if incluir_detalles_pago else {}
 
+    for pedido in pedidos:
         pedido_dict = pedido.to_dict()
+        if incluir_detalles_pago:
+            pedido_dict["detalles_pago"] = detalles_pago.get(pedido.pedido_id)
         pedido_dict.pop("estado_pedido_id", None)
         pedido_dict.pop("direccion_id", None)
         pedido_dict.pop("impuesto_id", None)
@@ -163,12 +252,10 @@ def get_todos_pedidos():
         pedido_dict["estado_pedido"] = pedido.estado_pedido.to_dict() if pedido.estado_pedido else None
         pedido_dict["direccion"] = pedido.direcciones.to_dict() if pedido.direcciones else None
         pedido_dict["impuesto"] = pedido.impuesto.to_dict() if pedido.impuesto else None
-        pedido_dict["productos"] = productos_pedidos
-        pedido_dict["usuario_id"] = usuario_id
+        pedido_dict["productos"] = productos_por_pedido.get(pedido.pedido_id, [])
+        pedido_dict["usuario_id"] = usuarios_por_pedido.get(pedido.pedido_id)
 
-        response.append(pedido_dict)
-
-    return jsonify(response), 200
+        yield pedido_dict
 
 @pedidos_bp.route('/<int:pedido_id>', methods=['GET'])
 @validate_origin()
@@ -261,6 +348,11 @@ def get_todos_pedidos():
                                         'https://example.com/ranpu3.jpg',
                                         'https://example.com/ranpu4.jpg'
                                     ]
+                                },
+                                'imagenes_ranpulamps_firmadas': {
+                                    'type': 'array',
+                                    'items': {'type': 'string'},
+                                    'description': 'URLs firmadas (15 minutos) de imagenes_ranpulamps, en el mismo orden; null si no se pudo firmar'
                                 }
                             }
                         }
@@ -292,7 +384,19 @@ def get_pedido_por_id(pedido_id):
     if not usuario:
         return jsonify({"message": "Usuario no encontrado"}), 404
 
-    pedido = Pedidos.query.get(pedido_id)
+    # Pedido con dirección, estado, impuesto y líneas (producto, categoría, imágenes, color e
+    # imágenes de ranpulamp) en un número fijo de consultas
+    pedido = Pedidos.query.options(
+        joinedload(Pedidos.estado_pedido),
+        joinedload(Pedidos.impuesto),
+        joinedload(Pedidos.direcciones),
+        selectinload(Pedidos.productos_pedidos_list).options(
+            joinedload(ProductosPedidos.color),
+            joinedload(ProductosPedidos.producto).joinedload(Productos.categoria_producto),
+            joinedload(ProductosPedidos.producto).selectinload(Productos.imagenes),
+            selectinload(ProductosPedidos.imagenes)
+        )
+    ).filter(Pedidos.pedido_id == pedido_id).first()
     if not pedido:
         return jsonify({"message": "Pedido no encontrado"}), 404
     
@@ -304,48 +408,48 @@ def get_pedido_por_id(pedido_id):
     if not pertenece_usuario:
         return jsonify({"message": "No tienes permiso para ver este pedido"}), 403
 
-    # Obtener productos del pedido
-    productos_pedidos = ProductosPedidos.query.filter_by(pedido_id=pedido.pedido_id).all()
+    lineas = sorted(pedido.productos_pedidos_list, key=lambda item: item.producto_pedido_id)
+
+    # Firmar todas las imágenes de ranpulamp del pedido en una sola pasada (en paralelo y con caché)
+    urls_firmadas = signed_url_cache.firmar(
+        imagen.imagen_url
+        for item in lineas if item.producto_id == 1
+        for imagen in item.imagenes
+    )
 
     productos = []
-    for item in productos_pedidos:
-        producto = item.producto.to_dict()
+    for item in lineas:
+        producto = item.producto
         producto_relevante = {
-            "producto_id": producto["producto_id"],
-            "nombre": producto["nombre"],
-            "precio": producto["precio"],
-            "categoria_producto": producto["categoria_producto"],
-            "categoria_producto_id": producto["categoria_producto_id"],
-            "alto": producto["alto"],
-            "ancho": producto["ancho"],
-            "largo": producto["largo"],
-            "gbl": producto["gbl"],
+            "producto_id": producto.producto_id,
+            "nombre": producto.nombre,
+            "precio": str(producto.precio),
+            "categoria_producto": producto.categoria_producto.nombre,
+            "categoria_producto_id": producto.categoria_producto_id,
+            "alto": str(producto.alto),
+            "ancho": str(producto.ancho),
+            "largo": str(producto.largo),
+            "gbl": producto.gbl,
         }
         producto_relevante["cantidad"] = item.cantidad
-        producto_relevante["subtotal"] = f"{float(producto['precio']) * item.cantidad:.2f}"
-        thumbnail = next(
-            (
-                img.ubicacion
-                for img in item.producto.imagenes
-                if img.is_thumbnail
-            ),
+        producto_relevante["subtotal"] = f"{float(producto.precio) * item.cantidad:.2f}"
+        producto_relevante["thumbnail"] = next(
+            (img.ubicacion for img in producto.imagenes if img.is_thumbnail),
             None,
         )
-        producto_relevante["thumbnail"] = thumbnail
 
         # Return color object
-        colorObj = Colores.query.filter_by(color_id=item.color_id).first()
-        producto_relevante["color"] = colorObj.to_dict() if colorObj else None
+        producto_relevante["color"] = item.color.to_dict() if item.color else None
 
-        # Si es una ranpulamp, obtener las 4 imágenes
+        # Si es una ranpulamp, devolver sus 4 imágenes y sus URLs firmadas
         if item.producto_id == 1:  # 1 es el id de RanpuLamp
-            imagenes_ranpulamps = ImagenesRanpulamps.query.filter_by(
-                producto_pedido_id=item.producto_pedido_id
-            ).all()
+            imagenes_ranpulamps = sorted(item.imagenes, key=lambda imagen: imagen.imagenes_ranpulamps_id)
             producto_relevante["imagenes_ranpulamps"] = [
                 imagen.imagen_url for imagen in imagenes_ranpulamps
             ]
-            
+            producto_relevante["imagenes_ranpulamps_firmadas"] = [
+                urls_firmadas.get(imagen.imagen_url) for imagen in imagenes_ranpulamps
+            ]
 
         productos.append(producto_relevante)
 
@@ -399,7 +503,9 @@ def get_pedido_por_id(pedido_id):
     'description': (
         'Obtiene una lista de pedidos asociados a un usuario específico. '
         'Permite filtrar por fechas de creación (start_date, end_date) y estado del pedido (estado_pedido_id). '
-        'Los resultados se paginan y se pueden controlar mediante los parámetros page y per_page.'
+        'Los resultados se paginan y se pueden controlar mediante los parámetros page y per_page. '
+        'Si se envía el parámetro cursor (vacío para la primera página) se usa paginación por cursor: '
+        'la respuesta incluye next_cursor y el total solo se calcula con include_total=true.'
     ),
     'parameters': [
         {
@@ -440,6 +546,18 @@ def get_pedido_por_id(pedido_id):
             'in': 'query',
             'type': 'integer',
             'description': 'Cantidad de elementos por página. El valor predeterminado es 10.'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Cursor opaco devuelto como next_cursor en la página anterior. Vacío para iniciar la paginación por cursor.'
+        },
+        {
+            'name': 'include_total',
+            'in': 'query',
+            'type': 'boolean',
+            'description': 'En modo cursor, incluir total_items (ejecuta un COUNT adicional). Por defecto es false.'
         }
     ],
     'responses': {
@@ -512,10 +630,17 @@ def get_pedido_por_id(pedido_id):
                     'per_page': {
                         'type': 'integer',
                         'example': 10
+                    },
+                    'next_cursor': {
+                        'type': 'string',
+                        'example': 'eyJrIjpbeyIkZHQiOiIyMDI1LTAxLTIwVDE1OjMyOjAwIn0sMTIzXX0'
                     }
                 }
             }
         },
+        400: {
+            'description': 'Cursor inválido'
+        },
         404: {
             'description': 'Usuario no encontrado o sin pedidos'
         }
@@ -535,81 +660,60 @@ def get_pedidos_por_usuario(usuario_id):
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
 
-    # Base query for pedidos_usuario
-    query = Pedidos.query.join(PedidosUsuario).filter(
-        PedidosUsuario.usuario_id == user.usuario_id
+    # Base query over the denormalized order summaries (one indexed range scan per page)
+    query = ResumenPedidosUsuario.query.options(joinedload(ResumenPedidosUsuario.estado_pedido)).filter(
+        ResumenPedidosUsuario.usuario_id == user.usuario_id
     )
 
-    # Apply filters conditionally
+    # Apply filters conditionally; fecha_efectiva = fecha_pago, or fecha_creacion when unpaid
     filters = []
     if start_date:
-        filters.append(or_(Pedidos.fecha_pago >= start_date, and_(Pedidos.fecha_pago == None, Pedidos.fecha_creacion >= start_date)))
+        filters.append(ResumenPedidosUsuario.fecha_efectiva >= start_date)
     if end_date:
-        filters.append(or_(Pedidos.fecha_pago <= end_date, and_(Pedidos.fecha_pago == None, Pedidos.fecha_creacion <= end_date)))
+        filters.append(ResumenPedidosUsuario.fecha_efectiva <= end_date)
     if estado_pedido_id:
-        filters.append(Pedidos.estado_pedido_id == estado_pedido_id)
+        filters.append(ResumenPedidosUsuario.estado_pedido_id == estado_pedido_id)
 
     # Apply all filters to the query
     if filters:
         query = query.filter(and_(*filters))
 
-    # Paginate the query
-    paginated_pedidos = query.paginate(page=page, per_page=per_page, error_out=False)
-    pedidos = paginated_pedidos.items
-
-    if not pedidos:
-        return jsonify({"pedidos": []}), 200
-
-    # Build response
-    response = []
-    for pedido in pedidos:
-        pp_items = ProductosPedidos.query.filter_by(pedido_id=pedido.pedido_id).all()
-
-        product_names = []
-        total_cantidad = 0
-        thumbnail = None
-
-        for idx, pp_item in enumerate(pp_items):
-            product_names.append(pp_item.producto.nombre)
-            total_cantidad += pp_item.cantidad
-
-            if idx == 0:
-                # Find the thumbnail image
-                thumb_image = next(
-                    (img for img in pp_item.producto.imagenes if img.is_thumbnail),
-                    None
-                )
-                thumbnail = thumb_image.ubicacion if thumb_image else (
-                    pp_item.producto.imagenes[0].ubicacion if pp_item.producto.imagenes else None
-                )
+    if 'cursor' in request.args:
+        # Keyset pagination ordered by the effective date, newest first
+        cursor = request.args.get('cursor', '')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        try:
+            after_values = decode_cursor(cursor).get('k') if cursor else None
+            resumenes, next_values = keyset_page(
+                query,
+                [(ResumenPedidosUsuario.fecha_efectiva, True), (ResumenPedidosUsuario.pedido_id, True)],
+                after_values,
+                per_page
+            )
+        except ValueError:
+            return jsonify({"message": "Cursor inválido"}), 400
 
-        product_names_str = ", ".join(product_names)
-
-        fecha_creacion = pedido.fecha_pago or pedido.fecha_creacion
-        fecha_creacion_es = format_date_spanish(fecha_creacion)
-        fecha_creacion_en = format_date_english(fecha_creacion)
-
-        pedido_dict = {
-            "pedido_id": pedido.pedido_id,
-            "fecha_creacion": fecha_creacion.isoformat(),
-            "fecha_creacion_es": fecha_creacion_es,
-            "fecha_creacion_en": fecha_creacion_en,
-            "estado": {
-                "nombre": pedido.estado_pedido.nombre,
-                "nombre_ingles": pedido.estado_pedido.nombre_ingles
-            },
-            "productos_nombres": product_names_str,
-            "cantidad_total": total_cantidad,
-            "thumbnail": thumbnail,
+        response_body = {
+            "pedidos": [resumen.to_dict() for resumen in resumenes],
+            "per_page": per_page,
+            "next_cursor": encode_cursor({"k": next_values}) if next_values else None
         }
-        response.append(pedido_dict)
+        if include_total:
+            response_body["total_items"] = query.order_by(None).count()
+        return jsonify(response_body), 200
 
-    # Order response by fecha_creacion from newest to latest
-    response.sort(key=lambda x: x["fecha_creacion"], reverse=True)
+    # Paginate the query, ordered in SQL by the effective date from newest to oldest
+    paginated_pedidos = query.order_by(
+        ResumenPedidosUsuario.fecha_efectiva.desc(), ResumenPedidosUsuario.pedido_id.desc()
+    ).paginate(page=page, per_page=per_page, error_out=False)
+    resumenes = paginated_pedidos.items
+
+    if not resumenes:
+        return jsonify({"pedidos": []}), 200
 
     # Return paginated response with metadata
     return jsonify({
-        "pedidos": response,
+        "pedidos": [resumen.to_dict() for resumen in resumenes],
         "total_items": paginated_pedidos.total,
         "total_pages": paginated_pedidos.pages,
         "current_page": paginated_pedidos.page,
@@ -619,11 +723,19 @@ def get_pedidos_por_usuario(usuario_id):
 @pedidos_bp.route('', methods=['POST'], strict_slashes=False)
 @validate_origin()
 @firebase_auth_required
+@idempotent()
 @swag_from({
     'tags': ['Pedidos'],
     'summary': 'Crear un nuevo pedido con dirección y usuario',
-    'description': 'Crea un nuevo pedido, obteniendo impuestos activos y carrito del usuario desde Firebase.',
+    'description': 'Crea un nuevo pedido, obteniendo impuestos activos y el carrito del usuario guardado en el servidor. Con el encabezado Idempotency-Key, los reintentos devuelven la respuesta guardada sin volver a crear el pedido.',
     'parameters': [
+        {
+            'name': 'Idempotency-Key',
+            'in': 'header',
+            'type': 'string',
+            'required': False,
+            'description': 'Clave única por intento de checkout (p. ej. un UUID); válida 24 horas'
+        },
         {
             'name': 'body',
             'in': 'body',
@@ -665,10 +777,16 @@ def get_pedidos_por_usuario(usuario_id):
                     'pedido_id': {'type': 'integer', 'example': 1},
                     'direccion_id': {'type': 'integer', 'example': 1},
                     'usuario_id': {'type': 'integer', 'example': 1},
-                    'message': {'type': 'string', 'example': 'Pedido creado exitosamente'}
+                    'message': {'type': 'string', 'example': 'Pedido creado exitosamente'},
+                    'cotizacion': {
+                        'type': 'string',
+                        'description': 'Cotización firmada del pedido (15 minutos); enviarla como priceQuote al crear la orden de PayPal. Es null cuando el pedido ya existía.'
+                    }
                 }
             }
         },
+        409: {'description': 'Otra petición con la misma Idempotency-Key sigue en proceso'},
+        422: {'description': 'La Idempotency-Key ya se usó con otro cuerpo'},
         500: {'description': 'Error interno del servidor'}
     }
 })
@@ -694,12 +812,8 @@ def create_pedido():
             db.session.flush()  # Get the user ID without committing yet
             user = new_user
 
-        pedido_usuario = PedidosUsuario.query.filter_by(usuario_id=user.usuario_id).all()
-        pedido_ids = [p.pedido_id for p in pedido_usuario]
-
-        # 2. Recuperar el carrito del usuario desde Firebase
-        cart_ref = firebase_db.reference(f'/carts/{usuario_id}')
-        cart_snapshot = cart_ref.get()
+        # 2. Recuperar el carrito del usuario (copia local en Postgres, sin ir a Firebase)
+        cart_snapshot = obtener_carrito(usuario_id)
 
         if not cart_snapshot or 'items' not in cart_snapshot or not cart_snapshot['items']:
             return jsonify({"message": "El carrito está vacío o no existe"}), 400
@@ -707,15 +821,24 @@ def create_pedido():
         cart_items = cart_snapshot['items']
         temporal_cart_id = cart_snapshot.get('temporalId')
 
-        # 3. Descartar que se quiera guardar un pedido exactamente igual a uno existente, pero actualizando la dirección de todas maneras
-        existing_pedido = Pedidos.query.filter(
-            Pedidos.pedido_id.in_(pedido_ids),
-            Pedidos.temporal_cart_id == temporal_cart_id
-        ).first()
+        # 3. Traer en una sola consulta los pedidos del usuario con este temporal_cart_id o 'Esperando pago'
+        pedidos_candidatos = (
+            Pedidos.query.options(joinedload(Pedidos.direcciones))
+            .join(PedidosUsuario, PedidosUsuario.pedido_id == Pedidos.pedido_id)
+            .filter(
+                PedidosUsuario.usuario_id == user.usuario_id,
+                or_(Pedidos.temporal_cart_id == temporal_cart_id, Pedidos.estado_pedido_id == 8)
+            )
+            .order_by(Pedidos.pedido_id)
+            .all()
+        )
+
+        # Descartar que se quiera guardar un pedido exactamente igual a uno existente, pero actualizando la dirección de todas maneras
+        existing_pedido = next((p for p in pedidos_candidatos if p.temporal_cart_id == temporal_cart_id), None)
 
         if existing_pedido:
 
-            direccion_existente = Direcciones.query.get(existing_pedido.direccion_id)
+            direccion_existente = existing_pedido.direcciones
             
             if direccion_existente:
                 direccion_existente.cedula = direccion_data['cedula']
@@ -728,53 +851,33 @@ def create_pedido():
                 direccion_existente.numeracion = direccion_data.get('numeracion')
                 direccion_existente.referencia = direccion_data.get('referencia')
                 direccion_existente.codigo_postal = direccion_data.get('codigo_postal')
-                db.session.flush()
                 db.session.commit()
 
 
             return jsonify({
                 "message": "Pedido ya existe con este temporal_cart_id, dirección actualizada",
-                "pedido_id": existing_pedido.pedido_id
+                "pedido_id": existing_pedido.pedido_id,
+                # Sin cotización: no se volvió a cotizar, create_order cotiza el carrito
+                "cotizacion": None
             }), 201
 
-        # 4. Calcular el precio total del carrito
-        subtotal = 0
+        # 4. Calcular el precio total del carrito (una consulta de precios e impuesto activo cacheado)
+        try:
+            quote = price_cart(cart_items, 'databaseProductId')
+        except PricingError as e:
+            return jsonify({"message": e.message}), e.status_code
 
-        for item in cart_items:
-            producto_id = item.get('databaseProductId')  # Use the correct key
-            quantity = item.get('quantity', 0)
-
-            if not producto_id or not isinstance(quantity, int) or quantity <= 0:
-                return jsonify({"message": f"ID de producto o cantidad inválida en el item: {item}"}), 400
-
-            producto = Productos.query.get(producto_id)
-            if not producto:
-                return jsonify({"message": f"Producto con ID {producto_id} no encontrado"}), 404
-
-            # Multiply price by quantity and accumulate in the subtotal
-            subtotal += float(producto.precio) * quantity
-        
-        # 5. Obtener el impuesto activo
-        active_tax = Impuestos.query.filter_by(activo=True).first()
-        if not active_tax:
-            return jsonify({"message": "No hay impuesto activo configurado"}), 400
-
-        tax_percentage = float(active_tax.porcentaje) / 100
-        calculated_tax = subtotal * tax_percentage
-        shipping_fee = 2.00
-        total_price = subtotal + calculated_tax + shipping_fee
+        subtotal = quote.subtotal
+        total_price = quote.total
 
         # 6. Verificar si ya existe un pedido con el estado 'Esperando pago'
-        existing_pending_pedido = Pedidos.query.filter(
-            Pedidos.pedido_id.in_(pedido_ids),
-            Pedidos.estado_pedido_id == 8  # 'Esperando pago'
-        ).first()
+        existing_pending_pedido = next((p for p in pedidos_candidatos if p.estado_pedido_id == 8), None)  # 'Esperando pago'
 
         if existing_pending_pedido:
             # Sobreescribir el pedido existente
             
             # 7. Actualizar la dirección existente
-            direccion_existente = Direcciones.query.get(existing_pending_pedido.direccion_id)
+            direccion_existente = existing_pending_pedido.direcciones
             
             if direccion_existente:
                 direccion_existente.cedula = direccion_data['cedula']
@@ -787,7 +890,6 @@ def create_pedido():
                 direccion_existente.numeracion = direccion_data.get('numeracion')
                 direccion_existente.referencia = direccion_data.get('referencia')
                 direccion_existente.codigo_postal = direccion_data.get('codigo_postal')
-                db.session.flush()
             else:
                 nueva_direccion = Direcciones(
                     cedula=direccion_data['cedula'],
@@ -801,52 +903,27 @@ def create_pedido():
                     referencia=direccion_data.get('referencia'),
                     codigo_postal=direccion_data.get('codigo_postal')
                 )
-                db.session.add(nueva_direccion)
-                db.session.flush()
-                existing_pending_pedido.direccion_id = nueva_direccion.direccion_id
+                existing_pending_pedido.direcciones = nueva_direccion
 
             # 8. Actualizar el pedido existente
             existing_pending_pedido.precio = subtotal
             existing_pending_pedido.precio_final = total_price
-            existing_pending_pedido.impuesto_id = active_tax.impuesto_id
+            existing_pending_pedido.impuesto_id = quote.impuesto_id
             existing_pending_pedido.temporal_cart_id = temporal_cart_id  # Actualizar temporal ID
-            db.session.flush()
-
-            # 9. Eliminar productos previos y agregar los nuevos
-            ProductosPedidos.query.filter_by(pedido_id=existing_pending_pedido.pedido_id).delete()
 
-            for item in cart_items:
-                producto_pedido = ProductosPedidos(
-                    pedido_id=existing_pending_pedido.pedido_id,
-                    producto_id=item['databaseProductId'],
-                    color_id=item['color']['color_id'] if item.get('color') and 'color_id' in item['color'] else None,
-                    cantidad=item['quantity']
-                )
-                db.session.add(producto_pedido)
-                db.session.flush()
-
-                # Check if the product type is 'ranpulamp' and has cropped images
-                if item.get('productType') == 'ranpulamp' and 'croppedImages' in item:
-                    cropped_images = item['croppedImages']
-                    
-                    # Delete existing images for this producto_pedido_id to avoid duplicates
-                    ImagenesRanpulamps.query.filter_by(producto_pedido_id=producto_pedido.producto_pedido_id).delete()
-
-                    # Limit to 4 images as required
-                    for image_url in cropped_images[:4]:
-                        new_image = ImagenesRanpulamps(
-                            imagen_url=image_url,
-                            producto_pedido_id=producto_pedido.producto_pedido_id
-                        )
-                        db.session.add(new_image)
+            # 9. Eliminar productos previos y agregar los nuevos con inserciones en lote
+            # (el primer DELETE vuelca antes los cambios de dirección y pedido)
+            reemplazar_lineas_pedido(existing_pending_pedido, lineas_desde_carrito(cart_items))
 
+            actualizar_resumen_pedidos(existing_pending_pedido.pedido_id)
             db.session.commit()
 
             return jsonify({
                 "pedido_id": existing_pending_pedido.pedido_id,
                 "direccion_id": existing_pending_pedido.direccion_id,
                 "usuario_id": user.usuario_id,
-                "message": "Pedido actualizado exitosamente"
+                "message": "Pedido actualizado exitosamente",
+                "cotizacion": firmar_cotizacion(existing_pending_pedido.pedido_id, usuario_id, cart_items, quote)
             }), 201
 
         else:
@@ -863,59 +940,35 @@ def create_pedido():
                 referencia=direccion_data.get('referencia'),
                 codigo_postal=direccion_data.get('codigo_postal')
             )
-            db.session.add(nueva_direccion)
-            db.session.flush()
 
             nuevo_pedido = Pedidos(
                 fecha_envio=None,
                 fecha_entrega=None,
                 fecha_pago=None,
                 estado_pedido_id=8,
-                direccion_id=nueva_direccion.direccion_id,
-                impuesto_id=active_tax.impuesto_id,
+                direcciones=nueva_direccion,
+                impuesto_id=quote.impuesto_id,
                 precio=subtotal,
                 precio_final=total_price,
                 pago_id=None,
                 temporal_cart_id=temporal_cart_id
             )
-            db.session.add(nuevo_pedido)
+
+            # Dirección, pedido y relación con el usuario se insertan en un solo flush
+            db.session.add(PedidosUsuario(pedido=nuevo_pedido, usuario=user))
             db.session.flush()
 
-            usuario_pedido = PedidosUsuario(
-                pedido_id=nuevo_pedido.pedido_id,
-                usuario_id=user.usuario_id
-            )
-            db.session.add(usuario_pedido)
-
-            for item in cart_items:
-                producto_pedido = ProductosPedidos(
-                    pedido_id=nuevo_pedido.pedido_id,
-                    producto_id=item['databaseProductId'],
-                    color_id=item['color']['color_id'] if item.get('color') and 'color_id' in item['color'] else None,
-                    cantidad=item['quantity']
-                )
-                db.session.add(producto_pedido)
-                db.session.flush()
-
-                # If product is a 'ranpulamp' and has images
-                if item.get('productType') == 'ranpulamp' and 'croppedImages' in item:
-                    cropped_images = item['croppedImages']
-                    
-                    # Insert up to 4 images into imagenes_ranpulamps table
-                    for image_url in cropped_images[:4]:
-                        new_image = ImagenesRanpulamps(
-                            imagen_url=image_url,
-                            producto_pedido_id=producto_pedido.producto_pedido_id
-                        )
-                        db.session.add(new_image)
+            insertar_lineas_pedido(nuevo_pedido, lineas_desde_carrito(cart_items))
 
+            actualizar_resumen_pedidos(nuevo_pedido.pedido_id)
             db.session.commit()
 
             return jsonify({
                 "pedido_id": nuevo_pedido.pedido_id,
                 "direccion_id": nueva_direccion.direccion_id,
                 "usuario_id": user.usuario_id,
-                "message": "Pedido creado exitosamente"
+                "message": "Pedido creado exitosamente",
+                "cotizacion": firmar_cotizacion(nuevo_pedido.pedido_id, usuario_id, cart_items, quote)
             }), 201
 
 
@@ -1050,7 +1103,7 @@ def update_pedido(pedido_id):
 
         # Actualizar productos del pedido
         nuevos_productos = data['productos']
-        productos_existentes = ProductosPedidos.query.filter_by(pedido_id=pedido_id).all()
+        productos_existentes = ProductosPedidos.query.filter_by(pedido_id=pedido_id, fecha_pedido=pedido.fecha_creacion).all()
 
         # Eliminar productos que ya no están en la solicitud
         productos_a_eliminar = [
@@ -1070,11 +1123,13 @@ def update_pedido(pedido_id):
             else:
                 nuevo_producto_pedido = ProductosPedidos(
                     pedido_id=pedido_id,
+                    fecha_pedido=pedido.fecha_creacion,
                     producto_id=nuevo_producto['producto_id'],
                     cantidad=nuevo_producto['cantidad']
                 )
                 db.session.add(nuevo_producto_pedido)
 
+        actualizar_resumen_pedidos(pedido_id)
         db.session.commit()
 
         # Respuesta exitosa
@@ -1087,6 +1142,167 @@ def update_pedido(pedido_id):
         db.session.rollback()
         return jsonify({"message": "Error al actualizar el pedido", "error": str(e)}), 500
 
+@pedidos_bp.route('/transiciones', methods=['POST'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Pedidos'],
+    'summary': 'Cambiar el estado de varios pedidos',
+    'description': (
+        'Mueve hasta 1000 pedidos al estado indicado con una sola actualización y registra una fila por pedido '
+        'en transiciones_pedidos. Solo se permiten avances según EstadosPedidos.orden, o el paso a un estado sin '
+        'orden (p. ej. cancelado). Los pedidos que no existen o cuyo estado no lo permite se devuelven en "rechazados".'
+    ),
+    'parameters': [
+        {
+            'name': 'body',
+            'in': 'body',
+            'required': True,
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'pedido_ids': {'type': 'array', 'items': {'type': 'integer'}, 'example': [101, 102, 103]},
+                    'estado_pedido_id': {'type': 'integer', 'example': 5}
+                },
+                'required': ['pedido_ids', 'estado_pedido_id']
+            }
+        }
+    ],
+    'responses': {
+        200: {
+            'description': 'Resultado de la transición',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'estado_pedido_id': {'type': 'integer', 'example': 5},
+                    'movidos': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'pedido_id': {'type': 'integer', 'example': 101},
+                                'estado_anterior_id': {'type': 'integer', 'example': 4}
+                            }
+                        }
+                    },
+                    'rechazados': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'pedido_id': {'type': 'integer', 'example': 103},
+                                'motivo': {'type': 'string', 'example': 'No se permite pasar del estado 8 al estado 5'}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {'description': 'Datos inválidos'},
+        404: {'description': 'Estado de pedido no encontrado'},
+        500: {'description': 'Error interno del servidor'}
+    }
+})
+def transicionar_estado_pedidos():
+    """Mover varios pedidos a un nuevo estado con una sola actualización."""
+    data = request.get_json(silent=True) or {}
+    pedido_ids = data.get('pedido_ids')
+    estado_pedido_id = data.get('estado_pedido_id')
+
+    if (
+        not isinstance(pedido_ids, list)
+        or not all(isinstance(pedido_id, int) and not isinstance(pedido_id, bool) for pedido_id in pedido_ids)
+        or not isinstance(estado_pedido_id, int)
+    ):
+        return jsonify({"message": "pedido_ids debe ser una lista de enteros y estado_pedido_id un entero"}), 400
+
+    try:
+        movidos, rechazados = transicionar_pedidos(
+            pedido_ids, estado_pedido_id, (getattr(request, 'user', None) or {}).get('uid')
+        )
+        db.session.commit()
+    except TransicionError as e:
+        db.session.rollback()
+        return jsonify({"message": e.message}), e.status_code
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": "Error al cambiar el estado de los pedidos", "error": str(e)}), 500
+
+    return jsonify({
+        "estado_pedido_id": estado_pedido_id,
+        "movidos": movidos,
+        "rechazados": [{"pedido_id": pedido_id, "motivo": motivo} for pedido_id, motivo in rechazados.items()]
+    }), 200
+
+@pedidos_bp.route('/pagos', methods=['GET'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Pedidos'],
+    'summary': 'Buscar pedidos por datos del pago de PayPal',
+    'description': (
+        'Búsqueda para soporte. capture_id, payer_id y status usan columnas indexadas extraídas de la captura; '
+        'payer_email busca dentro del JSON de la captura (índice GIN) y no encuentra pagos cuyo JSON ya fue archivado. '
+        'Devuelve como máximo 50 pedidos, del más reciente al más antiguo.'
+    ),
+    'parameters': [
+        {'name': 'capture_id', 'in': 'query', 'type': 'string', 'required': False, 'description': 'ID de la captura de PayPal'},
+        {'name': 'payer_id', 'in': 'query', 'type': 'string', 'required': False, 'description': 'ID del pagador en PayPal'},
+        {'name': 'status', 'in': 'query', 'type': 'string', 'required': False, 'description': 'Estado de la orden en PayPal (p. ej. COMPLETED)'},
+        {'name': 'payer_email', 'in': 'query', 'type': 'string', 'required': False, 'description': 'Correo del pagador en PayPal'},
+        {'name': 'incluir_detalles_pago', 'in': 'query', 'type': 'boolean', 'required': False, 'default': False, 'description': 'Incluir el JSON completo de la captura (también si ya se archivó en Cloud Storage)'}
+    ],
+    'responses': {
+        200: {
+            'description': 'Pedidos encontrados',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'pedidos': {
+                        'type': 'array',
+                        'items': {
+                            'type': 'object',
+                            'properties': {
+                                'pedido_id': {'type': 'integer', 'example': 101},
+                                'paypal_capture_id': {'type': 'string', 'example': '3C679366HH908993F'},
+                                'paypal_payer_id': {'type': 'string', 'example': 'QYR5Z8XDVJNXQ'},
+                                'paypal_status': {'type': 'string', 'example': 'COMPLETED'},
+                                'detalles_pago_archivado': {'type': 'boolean', 'example': False}
+                            }
+                        }
+                    }
+                }
+            }
+        },
+        400: {'description': 'No se indicó ningún criterio de búsqueda'},
+        500: {'description': 'Error interno del servidor'}
+    }
+})
+def buscar_pedidos_por_pago():
+    """Buscar pedidos por capture id, payer id, status o correo del pagador de PayPal."""
+    criterios = {
+        campo: request.args.get(campo, '').strip() or None
+        for campo in ('capture_id', 'payer_id', 'status', 'payer_email')
+    }
+    if not any(criterios.values()):
+        return jsonify({"message": "Indique capture_id, payer_id, status o payer_email"}), 400
+
+    incluir_detalles_pago = request.args.get('incluir_detalles_pago', 'false').lower() == 'true'
+    try:
+        query = buscar_pagos(**criterios)
+        if incluir_detalles_pago:
+            query = query.options(undefer(Pedidos.detalles_pago))
+        pedidos = query.all()
+        resultado = [pedido.to_dict() for pedido in pedidos]
+        if incluir_detalles_pago:
+            # Los JSON ya archivados se traen de Cloud Storage
+            detalles_pago = leer_detalles_pago_lote(pedidos)
+            for pedido, pedido_dict in zip(pedidos, resultado):
+                pedido_dict["detalles_pago"] = detalles_pago.get(pedido.pedido_id)
+        return jsonify({"pedidos": resultado}), 200
+    except Exception as e:
+        return jsonify({"message": "Error al buscar pedidos por pago", "error": str(e)}), 500
+
 @pedidos_bp.route('/<int:pedido_id>', methods=['DELETE'])
 @validate_origin()
 @firebase_auth_required
@@ -1127,7 +1343,7 @@ def delete_pedido(pedido_id):
 
     try:
         # Eliminar productos relacionados con el pedido
-        productos_pedidos = ProductosPedidos.query.filter_by(pedido_id=pedido_id).all()
+        productos_pedidos = ProductosPedidos.query.filter_by(pedido_id=pedido_id, fecha_pedido=pedido.fecha_creacion).all()
         for producto in productos_pedidos:
             db.session.delete(producto)
 
@@ -1162,7 +1378,7 @@ def delete_pedido(pedido_id):
 @swag_from({
     'tags': ['Pedidos'],
     'summary': 'Actualizar productos de un pedido pendiente',
-    'description': 'Actualiza los productos de un pedido pendiente, incluyendo imágenes relacionadas a productos tipo ranpulamp. Obtiene los productos desde Firebase.',
+    'description': 'Actualiza los productos de un pedido pendiente, incluyendo imágenes relacionadas a productos tipo ranpulamp. Obtiene los productos del carrito guardado en el servidor.',
     'parameters': [
         {
             'name': 'body',
@@ -1188,7 +1404,7 @@ def delete_pedido(pedido_id):
                 }
             }
         },
-        404: {'description': 'Pedido pendiente no encontrado'},
+        404: {'description': 'Pedido pendiente o producto no encontrado'},
         400: {'description': 'Datos inválidos'},
         500: {'description': 'Error interno del servidor'}
     }
@@ -1210,28 +1426,27 @@ def update_order_products():
             return jsonify({"message": "Usuario no encontrado"}), 404
 
         # Find the pending order (estado_pedido_id == 8)
-        pending_order = Pedidos.query.filter(
-            Pedidos.pedido_id.in_(
-                [pu.pedido_id for pu in PedidosUsuario.query.filter_by(usuario_id=user.usuario_id).all()]
-            ),
-            Pedidos.estado_pedido_id == 8  # 'Esperando pago'
-        ).first()
+        pending_order = (
+            Pedidos.query.join(PedidosUsuario, PedidosUsuario.pedido_id == Pedidos.pedido_id)
+            .filter(
+                PedidosUsuario.usuario_id == user.usuario_id,
+                Pedidos.estado_pedido_id == 8  # 'Esperando pago'
+            )
+            .first()
+        )
 
         if not pending_order:
             return jsonify({"message": "No se encontró un pedido pendiente para este usuario"}), 404
 
-        # Fetch the cart from Firebase
-        cart_ref = firebase_db.reference(f'/carts/{usuario_id}')
-        cart_snapshot = cart_ref.get()
+        # Fetch the cart from the local Postgres copy
+        cart_snapshot = obtener_carrito(usuario_id)
 
         if not cart_snapshot or 'items' not in cart_snapshot or not cart_snapshot['items']:
             return jsonify({"message": "El carrito está vacío o no existe"}), 400
 
         cart_items = cart_snapshot['items']
 
-        # Update products in the pending order
-        ProductosPedidos.query.filter_by(pedido_id=pending_order.pedido_id).delete()
-
+        # Validate every line before touching the order
         for item in cart_items:
             producto_id = item.get('databaseProductId')
             quantity = item.get('quantity')
@@ -1239,30 +1454,21 @@ def update_order_products():
             if not producto_id or not isinstance(quantity, int) or quantity <= 0:
                 return jsonify({"message": f"ID de producto o cantidad inválida: {item}"}), 400
 
-            producto_pedido = ProductosPedidos(
-                pedido_id=pending_order.pedido_id,
-                producto_id=producto_id,
-                cantidad=quantity
-            )
-            db.session.add(producto_pedido)
-            db.session.flush()
-
-            # Handle ranpulamp images if the product type is ranpulamp
-            if item.get('productType') == 'ranpulamp' and 'croppedImages' in item:
-                cropped_images = item['croppedImages']
-
-                # Delete existing images for this producto_pedido_id
-                ImagenesRanpulamps.query.filter_by(producto_pedido_id=producto_pedido.producto_pedido_id).delete()
+        # All products in one IN query
+        producto_ids = {item['databaseProductId'] for item in cart_items}
+        existentes = {
+            producto_id for (producto_id,) in
+            db.session.query(Productos.producto_id).filter(Productos.producto_id.in_(producto_ids))
+        }
+        faltantes = producto_ids - existentes
+        if faltantes:
+            return jsonify({"message": f"Producto con ID {sorted(faltantes)[0]} no encontrado"}), 404
 
-                # Add up to 4 new images
-                for image_url in cropped_images[:4]:
-                    new_image = ImagenesRanpulamps(
-                        imagen_url=image_url,
-                        producto_pedido_id=producto_pedido.producto_pedido_id
-                    )
-                    db.session.add(new_image)
+        # Replace the order lines and ranpulamp images with batched statements
+        reemplazar_lineas_pedido(pending_order, lineas_desde_carrito(cart_items, con_color=False))
 
-        # Commit the changes
+        # Refresh the "Mis pedidos" summary and commit the changes
+        actualizar_resumen_pedidos(pending_order.pedido_id)
         db.session.commit()
 
         return jsonify({
@@ -1,21 +1,76 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flasgger import swag_from
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload, selectinload
 from ..models.productos import Productos
 from ..models.categorias_productos import CategoriasProductos
 from ..models.detalles_catalogo import DetallesCatalogo
 from ..models.detalles_lamparas_ranpu import DetallesLamparasRanpu
 from ..models.detalles_productos_ia import DetallesProductosIA
 from ..models.imagenes_productos import ImagenesProductos
-from ..models.impuestos import Impuestos
-from ..models.modelos import Modelos
 from ..database import db
+from ..services.productos_projection import (
+    productos_query,
+    get_producto_proyectado,
+    serializar_producto,
+    DETALLES_IA_CAMPOS_ESCALA,
+    DETALLES_IA_CAMPOS_COMPLETOS
+)
+from ..services.catalog_cache import catalog_cache
+from ..services.cart_pricing import price_cart, PricingError
+from ..services.resumen_modelos import get_resumen_modelos
+from ..services.json_stream import stream_json_list
+from ..services.image_variants import derivar_imagenes_en_segundo_plano, validar_ubicacion, UbicacionInvalida
+from ..json_provider import dumps_bytes
+from ..services.catalog_search import (
+    paginar_busqueda,
+    keyset_busqueda,
+    filtrar_texto_completo,
+    filtrar_similitud,
+    MODO_TEXTO_COMPLETO,
+    MODO_SIMILITUD
+)
+from ..services.keyset import encode_cursor, decode_cursor, keyset_page
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
 from api.middlewares.firebase_auth_middleware import firebase_auth_required
+from api.middlewares.conditional_get_middleware import conditional_get, table_versions
 
 productos_bp = Blueprint('productos', __name__)
 
+def _validar_imagenes(imagenes, existentes=frozenset()):
+    """
+    Rechazar (400) imágenes fuera de nuestro bucket o Firebase Storage antes de guardar nada.
+    Las ubicaciones en `existentes` (ya guardadas en el producto) no se validan.
+    """
+    for imagen in imagenes or []:
+        ubicacion = imagen.get('ubicacion') if isinstance(imagen, dict) else None
+        if ubicacion is not None and ubicacion in existentes:
+            continue
+        try:
+            validar_ubicacion(ubicacion)
+        except UbicacionInvalida as e:
+            return jsonify({"message": e.message}), e.status_code
+    return None
+
+
+def _validadores_productos():
+    """Validadores del listado: cambian si se crea, modifica o elimina un producto o una categoría."""
+    productos = db.session.query(func.max(Productos.updated_at)).scalar()
+    categorias = db.session.query(func.max(CategoriasProductos.updated_at)).scalar()
+    return (productos, categorias, *table_versions("productos", "categorias_productos"))
+
+def _validadores_producto(producto_id):
+    """Validadores de un producto; los triggers de migrations/003 y 018 suben su versión al cambiar imágenes, detalles o modelos."""
+    fila = (
+        db.session.query(Productos.updated_at, Productos.version, CategoriasProductos.updated_at, CategoriasProductos.version)
+        .join(CategoriasProductos, Productos.categoria_producto_id == CategoriasProductos.categoria_producto_id)
+        .filter(Productos.producto_id == producto_id)
+        .first()
+    )
+    return tuple(fila) if fila else None
+
 @productos_bp.route('/', methods=['GET'])
 @validate_origin()
 @swag_from({
@@ -73,7 +128,7 @@ productos_bp = Blueprint('productos', __name__)
                                 'properties': {
                                     'imagen_producto_id': {'type': 'integer', 'example': 1},
                                     'descripcion': {'type': 'string', 'example': 'Vista frontal'},
-                                    'ubicacion': {'type': 'string', 'example': '/images/product1_front.jpg'},
+                                    'ubicacion': {'type': 'string', 'example': 'https://storage.googleapis.com/ranpuimagesbucket/images/1/product1_front.jpg'},
                                     'producto_id': {'type': 'integer', 'example': 1}
                                 }
                             }
@@ -81,44 +136,17 @@ productos_bp = Blueprint('productos', __name__)
                     }
                 }
             }
-        }
+        },
+        304: {'description': 'No modificado desde la versión indicada en If-None-Match / If-Modified-Since'}
     }
 })
+@conditional_get(_validadores_productos)
 def get_productos():
     """Obtener todos los productos, incluyendo detalles y categoría."""
-    productos = Productos.query.all()
-    resultado = []
-
-    for producto in productos:
-        detalles_catalogo = DetallesCatalogo.query.filter_by(producto_id=producto.producto_id).first()
-        detalles_lamparas = DetallesLamparasRanpu.query.filter_by(producto_id=producto.producto_id).first()
-        detalles_ia = DetallesProductosIA.query.filter_by(producto_id=producto.producto_id).first()
-
-        producto_dict = producto.to_dict()
-        producto_dict["categoria_producto"] = (
-            producto.categoria_producto.to_dict()
-            if producto.categoria_producto else {"categoria_producto_id": producto.categoria_producto_id, "nombre": None}
-        )
-        producto_dict["detalles_catalogo"] = (
-            {"producto_id": producto.producto_id, "detalles": detalles_catalogo.detalles}
-            if detalles_catalogo else {"producto_id": producto.producto_id, "detalles": None}
-        )
-        producto_dict["detalles_lamparas_ranpu"] = (
-            {"producto_id": producto.producto_id, "detalles": detalles_lamparas.detalles}
-            if detalles_lamparas else {"producto_id": producto.producto_id, "detalles": None}
-        )
-        producto_dict["detalles_productos_ia"] = (
-            {"producto_id": producto.producto_id, "detalles": detalles_ia.detalles}
-            if detalles_ia else {"producto_id": producto.producto_id, "detalles": None}
-        )
-
-        producto_dict["imagenes"] = [
-            imagen.to_dict() for imagen in producto.imagenes
-        ]
-
-        resultado.append(producto_dict)
-
-    return jsonify(resultado), 200
+    return stream_json_list(
+        productos_query().order_by(Productos.producto_id),
+        lambda lote: (serializar_producto(producto) for producto in lote)
+    ), 200
 
 @productos_bp.route('/<int:producto_id>', methods=['GET'])
 @validate_origin()
@@ -184,33 +212,42 @@ def get_productos():
                             'properties': {
                                 'imagen_producto_id': {'type': 'integer', 'example': 1},
                                 'descripcion': {'type': 'string', 'example': 'Vista frontal'},
-                                'ubicacion': {'type': 'string', 'example': '/images/product1_front.jpg'},
-                                'producto_id': {'type': 'integer', 'example': 1}
+                                'ubicacion': {'type': 'string', 'example': 'https://storage.googleapis.com/ranpuimagesbucket/images/1/product1_front.jpg'},
+                                'producto_id': {'type': 'integer', 'example': 1},
+                                'variantes': {
+                                    'type': 'object',
+                                    'description': 'Versiones redimensionadas (thumbnail 160px, card 480px, detail 1200px); vacío si aún no se generaron',
+                                    'example': {
+                                        'thumbnail': {
+                                            'width': 160,
+                                            'height': 120,
+                                            'webp': 'https://storage.googleapis.com/ranpuimagesbucket/images/1/front__thumbnail_3f2a9c1b7e.webp',
+                                            'jpeg': 'https://storage.googleapis.com/ranpuimagesbucket/images/1/front__thumbnail_3f2a9c1b7e.jpg'
+                                        }
+                                    }
+                                }
                             }
                         }
                     }
                 }
             }
         },
+        304: {'description': 'No modificado desde la versión indicada en If-None-Match / If-Modified-Since'},
         404: {'description': 'Producto no encontrado'}
     }
 })
+@conditional_get(_validadores_producto)
 def get_producto_por_id(producto_id):
     """Obtener un producto por su ID, incluyendo detalles y categoría."""
-    producto = Productos.query.get(producto_id)
+    producto = get_producto_proyectado(producto_id)
     if not producto:
         return jsonify({"message": "Producto no encontrado"}), 404
 
-    detalles_catalogo = DetallesCatalogo.query.filter_by(producto_id=producto_id).first()
-    detalles_lamparas = DetallesLamparasRanpu.query.filter_by(producto_id=producto_id).first()
-    detalles_ia = DetallesProductosIA.query.filter_by(producto_id=producto_id).first()
-    modelos = Modelos.query.filter_by(producto_id=producto_id).all()
-    
-    response = producto.to_dict()
-    if modelos:
-        tiempo_estimado_impresion = sum(
-            modelo.tiempo_estimado.total_seconds() for modelo in modelos if modelo.tiempo_estimado is not None
-        )
+    resumen = get_resumen_modelos(producto_id)
+
+    response = serializar_producto(producto, DETALLES_IA_CAMPOS_COMPLETOS)
+    if resumen:
+        tiempo_estimado_impresion = resumen.tiempo_estimado_total.total_seconds()
         days, remainder = divmod(tiempo_estimado_impresion, 86400)
         hours, remainder = divmod(remainder, 3600)
         minutes, seconds = divmod(remainder, 60)
@@ -224,43 +261,9 @@ def get_producto_por_id(producto_id):
             tiempo_estimado_str += f"{int(minutes)}m"
 
         response["tiempo_estimado_impresion"] = tiempo_estimado_str.strip()
-
-        peso_estimado_gramos = sum(
-            modelo.peso_estimado_gramos or 0 for modelo in modelos
-        )
-        response["peso_estimado"] = peso_estimado_gramos
-
-    response["categoria_producto"] = (
-        producto.categoria_producto.to_dict()
-        if producto.categoria_producto else {"categoria_producto_id": producto.categoria_producto_id, "nombre": None}
-    )
-    response["detalles_catalogo"] = (
-        {"producto_id": producto_id, "detalles": detalles_catalogo.detalles}
-        if detalles_catalogo else {"producto_id": producto_id, "detalles": None}
-    )
-    response["detalles_lamparas_ranpu"] = (
-        {"producto_id": producto_id, "detalles": detalles_lamparas.detalles}
-        if detalles_lamparas else {"producto_id": producto_id, "detalles": None}
-    )
-    response["detalles_productos_ia"] = (
-        {   "producto_id": producto_id, 
-            "detalles": detalles_ia.detalles, 
-            "scale": detalles_ia.scale,
-            "obj_downloadable_url": detalles_ia.obj_downloadable_url,
-            "url_expiring_date": detalles_ia.url_expiring_date
-        }
-        if detalles_ia else {
-            "producto_id": producto_id, 
-            "detalles": None, 
-            "scale": None,
-            "obj_downloadable_url": None,
-            "url_expiring_date": None
-        }
-    )
-
-    response["imagenes"] = [
-        imagen.to_dict() for imagen in producto.imagenes
-    ]
+        response["peso_estimado"] = resumen.peso_estimado_gramos_total or 0
+        response["cantidad_modelos"] = resumen.cantidad_modelos
+        response["stock_minimo"] = resumen.stock_minimo
 
     return jsonify(response), 200
 
@@ -310,7 +313,7 @@ def get_producto_por_id(producto_id):
                         'items': {
                             'type': 'object',
                             'properties': {
-                                'ubicacion': {'type': 'string', 'example': '/images/product1_front.jpg'},
+                                'ubicacion': {'type': 'string', 'example': 'https://storage.googleapis.com/ranpuimagesbucket/images/1/product1_front.jpg'},
                                 'descripcion': {'type': 'string', 'example': 'Vista frontal'}
                             }
                         }
@@ -333,7 +336,7 @@ def get_producto_por_id(producto_id):
                         'items': {
                             'type': 'object',
                             'properties': {
-                                'ubicacion': {'type': 'string', 'example': '/images/product1_front.jpg'},
+                                'ubicacion': {'type': 'string', 'example': 'https://storage.googleapis.com/ranpuimagesbucket/images/1/product1_front.jpg'},
                                 'descripcion': {'type': 'string', 'example': 'Vista frontal'}
                             }
                         }
@@ -354,6 +357,10 @@ def create_producto():
         if field not in data:
             return jsonify({"message": f"El campo '{field}' es obligatorio"}), 400
 
+    error = _validar_imagenes(data.get('imagenes'))
+    if error:
+        return error
+
     try:
         # Crear producto
         nuevo_producto = Productos(
@@ -392,6 +399,7 @@ def create_producto():
             db.session.add(detalles_productos_ia)
 
         # Crear imágenes
+        nuevas_imagenes = []
         if 'imagenes' in data:
             for imagen_data in data['imagenes']:
                 nueva_imagen = ImagenesProductos(
@@ -400,8 +408,15 @@ def create_producto():
                     descripcion=imagen_data['descripcion']
                 )
                 db.session.add(nueva_imagen)
+                nuevas_imagenes.append(nueva_imagen)
 
         db.session.commit()
+        catalog_cache.bump_version()
+
+        # Las variantes redimensionadas se generan fuera de la petición
+        derivar_imagenes_en_segundo_plano(
+            current_app._get_current_object(), [imagen.imagen_producto_id for imagen in nuevas_imagenes]
+        )
 
         # Respuesta exitosa
         response = nuevo_producto.to_dict()
@@ -504,7 +519,7 @@ def create_producto():
                                 'properties': {
                                     'imagen_producto_id': {'type': 'integer', 'example': 1},
                                     'descripcion': {'type': 'string', 'example': 'Vista frontal'},
-                                    'ubicacion': {'type': 'string', 'example': '/images/product1_front.jpg'},
+                                    'ubicacion': {'type': 'string', 'example': 'https://storage.googleapis.com/ranpuimagesbucket/images/1/product1_front.jpg'},
                                     'producto_id': {'type': 'integer', 'example': 1}
                                 }
                             }
@@ -525,8 +540,8 @@ def get_productos_por_ids():
     if not product_ids or not isinstance(product_ids, list):
         return jsonify({"message": "Debe proporcionar una lista de IDs de productos válida en 'productIds'"}), 400
 
-    # Query all products at once
-    productos = Productos.query.filter(Productos.producto_id.in_(product_ids)).all()
+    # Query all products at once, with their relations preloaded
+    productos = productos_query().filter(Productos.producto_id.in_(product_ids)).all()
 
     if not productos:
         return jsonify({"message": "No se encontraron productos para los IDs proporcionados"}), 404
@@ -540,32 +555,7 @@ def get_productos_por_ids():
         if not producto:
             continue
 
-        detalles_catalogo = DetallesCatalogo.query.filter_by(producto_id=product_id).first()
-        detalles_lamparas = DetallesLamparasRanpu.query.filter_by(producto_id=product_id).first()
-        detalles_ia = DetallesProductosIA.query.filter_by(producto_id=product_id).first()
-
-        producto_dict = producto.to_dict()
-        producto_dict["categoria_producto"] = (
-            producto.categoria_producto.to_dict()
-            if producto.categoria_producto else {"categoria_producto_id": producto.categoria_producto_id, "nombre": None}
-        )
-        producto_dict["detalles_catalogo"] = (
-            {"producto_id": product_id, "detalles": detalles_catalogo.detalles}
-            if detalles_catalogo else {"producto_id": product_id, "detalles": None}
-        )
-        producto_dict["detalles_lamparas_ranpu"] = (
-            {"producto_id": product_id, "detalles": detalles_lamparas.detalles}
-            if detalles_lamparas else {"producto_id": product_id, "detalles": None}
-        )
-        producto_dict["detalles_productos_ia"] = (
-            {"producto_id": product_id, "detalles": detalles_ia.detalles}
-            if detalles_ia else {"producto_id": product_id, "detalles": None}
-        )
-        producto_dict["imagenes"] = [
-            imagen.to_dict() for imagen in producto.imagenes
-        ]
-
-        resultado.append(producto_dict)
+        resultado.append(serializar_producto(producto))
 
     return jsonify(resultado), 200
 
@@ -619,49 +609,19 @@ def get_productos_por_ids():
 })
 def calculate_total():
     """Calcular el total de una transacción, incluyendo impuestos y tarifa de envío."""
-    data = request.get_json()
-    items = data.get('items', [])
-
-    if not items or not isinstance(items, list):
-        return jsonify({"message": "Debe proporcionar una lista válida de productos con cantidades en 'items'"}), 400
-
-    # Retrieve the active tax
-    active_tax = Impuestos.query.filter_by(activo=True).first()
-    if not active_tax:
-        return jsonify({"message": "No hay ningún impuesto activo configurado"}), 400
-
-    tax_percentage = float(active_tax.porcentaje) / 100  # Convert to percentage
-    tax_value = active_tax.porcentaje
-
-    subtotal = 0
-    delivery_fee = 2.00
-
-    for item in items:
-        producto_id = item.get('producto_id')
-        quantity = item.get('quantity', 0)
-
-        if not producto_id or not isinstance(quantity, int) or quantity <= 0:
-            return jsonify({"message": f"ID de producto o cantidad inválida en el item: {item}"}), 400
-
-        producto = Productos.query.get(producto_id)
-        if not producto:
-            return jsonify({"message": f"Producto con ID {producto_id} no encontrado"}), 404
-
-        # Multiply price by quantity and accumulate in the subtotal
-        subtotal += float(producto.precio) * quantity
-
-    # Calculate tax
-    calculated_tax = subtotal * tax_percentage
+    data = request.get_json() or {}
 
-    # Calculate total
-    total = subtotal + calculated_tax + delivery_fee
+    try:
+        quote = price_cart(data.get('items', []), 'producto_id')
+    except PricingError as e:
+        return jsonify({"message": e.message}), e.status_code
 
     return jsonify({
-        "Subtotal": f"{subtotal:.2f}",
-        "TaxValue": f"{tax_value:.2f}",
-        "CalculatedTax": f"{calculated_tax:.2f}",
-        "DeliveryFee": f"{delivery_fee:.2f}",
-        "Total": f"{total:.2f}"
+        "Subtotal": f"{quote.subtotal:.2f}",
+        "TaxValue": f"{quote.tax_percentage:.2f}",
+        "CalculatedTax": f"{quote.calculated_tax:.2f}",
+        "DeliveryFee": f"{quote.delivery_fee:.2f}",
+        "Total": f"{quote.total:.2f}"
     }), 200
 
 @productos_bp.route('/<int:producto_id>', methods=['PUT'])
@@ -700,7 +660,7 @@ def calculate_total():
                             'type': 'object',
                             'properties': {
                                 'descripcion': {'type': 'string', 'example': 'Vista frontal'},
-                                'ubicacion': {'type': 'string', 'example': '/images/product1_front.jpg'}
+                                'ubicacion': {'type': 'string', 'example': 'https://storage.googleapis.com/ranpuimagesbucket/images/1/product1_front.jpg'}
                             }
                         }
                     },
@@ -737,12 +697,19 @@ def calculate_total():
 })
 def update_producto(producto_id):
     """Actualizar un producto existente, eliminando imágenes y detalles si no se envían."""
-    producto = Productos.query.get(producto_id)
+    producto = get_producto_proyectado(producto_id)
     if not producto:
         return jsonify({"message": "Producto no encontrado"}), 404
 
     data = request.get_json()
 
+    # Las imágenes que el producto ya tiene (incluidas las antiguas de otros hosts) se conservan
+    # tal cual: solo se validan y descargan para variantes las ubicaciones nuevas
+    ubicaciones_existentes = {imagen.ubicacion for imagen in producto.imagenes}
+    error = _validar_imagenes(data.get('imagenes'), ubicaciones_existentes)
+    if error:
+        return error
+
     try:
         # Actualizar los campos básicos del producto
         for field in ['nombre', 'descripcion', 'alto', 'ancho', 'largo', 'gbl', 'precio', 'categoria_producto_id']:
@@ -750,7 +717,10 @@ def update_producto(producto_id):
                 setattr(producto, field, data[field])
 
         # Manejar imágenes
+        nuevas_imagenes = []
         if 'imagenes' in data:
+            # Conservar las variantes ya generadas de las imágenes que se mantienen
+            variantes_existentes = {imagen.ubicacion: imagen.variantes for imagen in producto.imagenes}
             # Eliminar imágenes existentes
             ImagenesProductos.query.filter_by(producto_id=producto_id).delete()
             # Agregar nuevas imágenes
@@ -758,14 +728,16 @@ def update_producto(producto_id):
                 nueva_imagen = ImagenesProductos(
                     producto_id=producto_id,
                     descripcion=imagen['descripcion'],
-                    ubicacion=imagen['ubicacion']
+                    ubicacion=imagen['ubicacion'],
+                    variantes=variantes_existentes.get(imagen['ubicacion'])
                 )
                 db.session.add(nueva_imagen)
+                nuevas_imagenes.append(nueva_imagen)
         else:
             # Si no se envían imágenes, eliminarlas todas
             ImagenesProductos.query.filter_by(producto_id=producto_id).delete()
 
-        # Manejar detalles (catálogo, lámparas Ranpu, IA)
+        # Manejar detalles (catálogo, lámparas Ranpu, IA); ya vienen precargados con el producto
         detalle_models = [
             (DetallesCatalogo, 'detalles_catalogo'),
             (DetallesLamparasRanpu, 'detalles_lamparas_ranpu'),
@@ -773,7 +745,7 @@ def update_producto(producto_id):
         ]
 
         for model, key in detalle_models:
-            detalle = model.query.filter_by(producto_id=producto_id).first()
+            detalle = getattr(producto, key)
             if key in data and data[key].get('detalles'):
                 if detalle:
                     detalle.detalles = data[key]['detalles']
@@ -788,26 +760,16 @@ def update_producto(producto_id):
                 db.session.delete(detalle)
 
         db.session.commit()
+        catalog_cache.bump_version()
 
-        # Respuesta
-        response = producto.to_dict()
-        response["categoria_producto"] = producto.categoria_producto.to_dict() if producto.categoria_producto else None
-        response["imagenes"] = [imagen.to_dict() for imagen in producto.imagenes]
-        response["detalles_catalogo"] = {
-            "producto_id": producto.producto_id,
-            "detalles": DetallesCatalogo.query.filter_by(producto_id=producto_id).first().detalles
-            if DetallesCatalogo.query.filter_by(producto_id=producto_id).first() else None
-        }
-        response["detalles_lamparas_ranpu"] = {
-            "producto_id": producto.producto_id,
-            "detalles": DetallesLamparasRanpu.query.filter_by(producto_id=producto_id).first().detalles
-            if DetallesLamparasRanpu.query.filter_by(producto_id=producto_id).first() else None
-        }
-        response["detalles_productos_ia"] = {
-            "producto_id": producto.producto_id,
-            "detalles": DetallesProductosIA.query.filter_by(producto_id=producto_id).first().detalles
-            if DetallesProductosIA.query.filter_by(producto_id=producto_id).first() else None
-        }
+        derivar_imagenes_en_segundo_plano(
+            current_app._get_current_object(),
+            [imagen.imagen_producto_id for imagen in nuevas_imagenes if imagen.ubicacion not in ubicaciones_existentes]
+        )
+
+        # Respuesta (se recarga el producto con sus relaciones en un número fijo de consultas)
+        producto = get_producto_proyectado(producto_id)
+        response = serializar_producto(producto)
 
         return jsonify(response), 200
 
@@ -855,6 +817,7 @@ def delete_producto(producto_id):
         # Eliminar el producto
         db.session.delete(producto)
         db.session.commit()
+        catalog_cache.bump_version()
 
         return jsonify({"message": "Producto eliminado exitosamente"}), 200
 
@@ -927,14 +890,11 @@ def update_scale(producto_id):
     precio = data.get('precio')
 
     try:
-        # Buscar el producto en detalles_productos_ia
-        detalles_producto = DetallesProductosIA.query.filter_by(producto_id=producto_id).first()
+        # Buscar el producto junto con sus detalles_productos_ia
+        producto = get_producto_proyectado(producto_id)
+        detalles_producto = producto.detalles_productos_ia if producto else None
         if not detalles_producto:
             return jsonify({"message": "Detalles de producto ia no encontrados."}), 404
-        
-        producto = Productos.query.filter_by(producto_id=producto_id).first()
-        if not producto:
-            return jsonify({"message": "Producto no encontrado."}), 404
 
         # Actualizar escala y otros valores si son proporcionados
         detalles_producto.scale = scale
@@ -952,31 +912,10 @@ def update_scale(producto_id):
                 producto.precio = f"{float(precio):.2f}"
 
             db.session.commit()
+            catalog_cache.bump_version()
 
-            detalles_catalogo = DetallesCatalogo.query.filter_by(producto_id=producto_id).first()
-            detalles_lamparas = DetallesLamparasRanpu.query.filter_by(producto_id=producto_id).first()
-            detalles_ia = DetallesProductosIA.query.filter_by(producto_id=producto_id).first()
-
-            response = producto.to_dict()
-            response["categoria_producto"] = (
-                producto.categoria_producto.to_dict()
-                if producto.categoria_producto else {"categoria_producto_id": producto.categoria_producto_id, "nombre": None}
-            )
-            response["detalles_catalogo"] = (
-                {"producto_id": producto_id, "detalles": detalles_catalogo.detalles}
-                if detalles_catalogo else {"producto_id": producto_id, "detalles": None}
-            )
-            response["detalles_lamparas_ranpu"] = (
-                {"producto_id": producto_id, "detalles": detalles_lamparas.detalles}
-                if detalles_lamparas else {"producto_id": producto_id, "detalles": None}
-            )
-            response["detalles_productos_ia"] = (
-                {"producto_id": producto_id, "detalles": detalles_ia.detalles, "scale": detalles_ia.scale}
-                if detalles_ia else {"producto_id": producto_id, "detalles": None, "scale": None}
-            )
-            response["imagenes"] = [
-                imagen.to_dict() for imagen in producto.imagenes
-            ]
+            producto = get_producto_proyectado(producto_id)
+            response = serializar_producto(producto, DETALLES_IA_CAMPOS_ESCALA)
 
             return jsonify(response), 200
         else:
@@ -984,6 +923,7 @@ def update_scale(producto_id):
             detalles_producto.is_rescaling = True
 
             db.session.commit()
+            catalog_cache.bump_version()
 
             return jsonify({
                 "message": "Solo la escala fue actualizada, corriendo función de rescalado",
@@ -1001,7 +941,10 @@ def update_scale(producto_id):
     'summary': 'Fetch catalog products with search and pagination',
     'description': (
         'Returns a list of catalog products (categoria_producto_id = 4) with optional filters for search (name/description) '
-        'and pagination (page and per_page).'
+        'and pagination (page and per_page). Searches use PostgreSQL full-text search (Spanish) ordered by relevance, '
+        'and fall back to trigram similarity on the product name when there are no full-text matches. '
+        'Passing the `cursor` parameter (empty for the first page) switches to keyset pagination: the response '
+        'carries `next_cursor` instead of page numbers and the total count is only computed when `include_total=true`.'
     ),
     'parameters': [
         {
@@ -1021,6 +964,18 @@ def update_scale(producto_id):
             'in': 'query',
             'type': 'integer',
             'description': 'Number of products per page. Defaults to 10.'
+        },
+        {
+            'name': 'cursor',
+            'in': 'query',
+            'type': 'string',
+            'description': 'Opaque cursor returned as `next_cursor` by the previous page. Send it empty to start cursor pagination.'
+        },
+        {
+            'name': 'include_total',
+            'in': 'query',
+            'type': 'boolean',
+            'description': 'In cursor mode, also return `total_items` (runs an extra COUNT). Defaults to false.'
         }
     ],
     'responses': {
@@ -1050,7 +1005,7 @@ def update_scale(producto_id):
                                         'properties': {
                                             'imagen_producto_id': {'type': 'integer', 'example': 1},
                                             'descripcion': {'type': 'string', 'example': 'Front view'},
-                                            'ubicacion': {'type': 'string', 'example': '/images/product1_front.jpg'}
+                                            'ubicacion': {'type': 'string', 'example': 'https://storage.googleapis.com/ranpuimagesbucket/images/1/product1_front.jpg'}
                                         }
                                     }
                                 }
@@ -1060,49 +1015,132 @@ def update_scale(producto_id):
                     'total_items': {'type': 'integer', 'example': 100},
                     'total_pages': {'type': 'integer', 'example': 10},
                     'current_page': {'type': 'integer', 'example': 1},
-                    'per_page': {'type': 'integer', 'example': 10}
+                    'per_page': {'type': 'integer', 'example': 10},
+                    'next_cursor': {'type': 'string', 'example': 'eyJtIjoiaWQiLCJrIjpbNDJdfQ'}
                 }
             }
-        }
+        },
+        400: {'description': 'Invalid cursor'}
     }
 })
 def get_catalog_products():
     """Fetch catalog products with optional search and pagination."""
     search = request.args.get('search', '').strip()
-    page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
-
-    query = Productos.query.filter(Productos.categoria_producto_id == 4)
-
+    cursor_mode = 'cursor' in request.args
+
+    if cursor_mode:
+        cursor = request.args.get('cursor', '')
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        page_key = ('cursor', search.lower(), cursor, per_page, include_total)
+    else:
+        page = request.args.get('page', 1, type=int)
+        page_key = ('page', search.lower(), page, per_page)
+
+    # Serve repeated page views straight from the in-process cache
+    cached_body = catalog_cache.get(page_key)
+    if cached_body is not None:
+        return current_app.response_class(cached_body, status=200, mimetype=current_app.json.mimetype)
+
+    # Remember the version this page is computed against, so a concurrent edit invalidates it
+    version = catalog_cache.version
+
+    query = Productos.query.options(
+        joinedload(Productos.categoria_producto),
+        selectinload(Productos.imagenes)
+    ).filter(Productos.categoria_producto_id == 4)
+
+    if cursor_mode:
+        try:
+            payload = _catalog_cursor_page(query, search, cursor, per_page, include_total)
+        except ValueError:
+            return jsonify({"message": "Invalid cursor"}), 400
+    else:
+        payload = _catalog_numbered_page(query, search, page, per_page)
+
+    body = dumps_bytes(payload)
+    catalog_cache.set(page_key, body, version)
+
+    return current_app.response_class(body, status=200, mimetype=current_app.json.mimetype)
+
+def _catalog_numbered_page(query, search, page, per_page):
+    """Classic page-number pagination (OFFSET/LIMIT plus COUNT)."""
     if search:
-        query = query.filter(
-            db.or_(
-                Productos.nombre.ilike(f"%{search}%"),
-                Productos.descripcion.ilike(f"%{search}%")
-            )
-        )
-
-    paginated_products = query.paginate(page=page, per_page=per_page, error_out=False)
+        # Full-text search ranked by relevance, falling back to trigram similarity for typos
+        paginated_products = paginar_busqueda(query, search, page, per_page)
+    else:
+        paginated_products = query.paginate(page=page, per_page=per_page, error_out=False)
     products = paginated_products.items
 
     if not products:
-        return jsonify({
+        return {
             "products": [],
             "total_items": 0,
             "total_pages": 0,
             "current_page": page,
             "per_page": per_page
-        }), 200
-
-    result = []
-    for product in products:
-        result.append(product.to_dict())
+        }
 
-    return jsonify({
-        "products": result,
+    return {
+        "products": [product.to_dict() for product in products],
         "total_items": paginated_products.total,
         "total_pages": paginated_products.pages,
         "current_page": paginated_products.page,
         "per_page": paginated_products.per_page
-    }), 200
+    }
+
+def _catalog_cursor_page(query, search, cursor, per_page, include_total):
+    """Keyset pagination: products after the cursor, without OFFSET and with an optional COUNT."""
+    state = decode_cursor(cursor) if cursor else {}
+    mode = state.get('m')
+    after_values = state.get('k')
+    if cursor and mode not in ((MODO_TEXTO_COMPLETO, MODO_SIMILITUD) if search else ('id',)):
+        raise ValueError("Invalid cursor")
+
+    if search:
+        products, next_values, mode = keyset_busqueda(query, search, mode, after_values, per_page)
+    else:
+        mode = 'id'
+        products, next_values = keyset_page(query, [(Productos.producto_id, False)], after_values, per_page)
+
+    payload = {
+        "products": [product.to_dict() for product in products],
+        "per_page": per_page,
+        "next_cursor": encode_cursor({"m": mode, "k": next_values}) if next_values else None
+    }
+
+    if include_total:
+        if search:
+            total_query = filtrar_similitud(query, search) if mode == MODO_SIMILITUD else filtrar_texto_completo(query, search)
+        else:
+            total_query = query
+        payload["total_items"] = total_query.order_by(None).count()
+
+    return payload
 
+@productos_bp.route('/catalog/cache-stats', methods=['GET'])
+@validate_origin()
+@firebase_auth_required
+@swag_from({
+    'tags': ['Productos'],
+    'summary': 'Catalog cache statistics',
+    'description': 'Returns the hit/miss counters, size and current version of the in-process catalog cache.',
+    'responses': {
+        200: {
+            'description': 'Cache statistics',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'version': {'type': 'integer', 'example': 3},
+                    'entries': {'type': 'integer', 'example': 12},
+                    'max_entries': {'type': 'integer', 'example': 256},
+                    'hits': {'type': 'integer', 'example': 140},
+                    'misses': {'type': 'integer', 'example': 15}
+                }
+            }
+        }
+    }
+})
+def get_catalog_cache_stats():
+    """Return the catalog cache counters."""
+    return jsonify(catalog_cache.stats()), 200
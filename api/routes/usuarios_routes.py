@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 from ..models.usuarios import Usuarios
 from ..schemas.usuarios_schema import UsuariosSchema
 from ..database import db
+from ..services.json_stream import stream_json_list
 
 # Middleware protections
 from api.middlewares.origin_middleware import validate_origin
@@ -40,8 +41,7 @@ usuarios_schema = UsuariosSchema(many=True)
 })
 def get_usuarios():
     """Obtener todos los usuarios"""
-    usuarios = Usuarios.query.all()
-    return jsonify(usuarios_schema.dump(usuarios)), 200
+    return stream_json_list(Usuarios.query.order_by(Usuarios.usuario_id), usuarios_schema.dump), 200
 
 @usuarios_bp.route('/', methods=['POST'])
 @validate_origin()
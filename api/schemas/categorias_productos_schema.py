@@ -5,3 +5,4 @@ class CategoriasProductosSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = CategoriasProductos
         load_instance = True
+        exclude = ("updated_at", "version")
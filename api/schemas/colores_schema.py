@@ -5,3 +5,4 @@ class ColoresSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = Colores
         load_instance = True
+        exclude = ("updated_at", "version")
@@ -8,6 +8,7 @@ class FilamentosSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = Filamentos
         load_instance = True
+        exclude = ("updated_at", "version")
 
     categoria_filamento_id = fields.Integer(required=True)  # Asegúrate de que este campo exista
     color = fields.Nested("ColoresSchema", dump_only=True)
@@ -5,3 +5,4 @@ class ImpuestosSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = Impuestos
         load_instance = True
+        exclude = ("updated_at", "version")
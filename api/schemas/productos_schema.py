@@ -5,3 +5,4 @@ class ProductosSchema(SQLAlchemyAutoSchema):
     class Meta:
         model = Productos
         load_instance = True
+        exclude = ("updated_at", "version")
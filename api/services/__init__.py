@@ -0,0 +1,72 @@
+from .productos_projection import (
+    productos_query,
+    get_producto_proyectado,
+    serializar_producto,
+    DETALLES_IA_CAMPOS_ESCALA,
+    DETALLES_IA_CAMPOS_COMPLETOS
+)
+from .catalog_cache import CatalogCache, catalog_cache
+from .catalog_search import filtrar_texto_completo, filtrar_similitud, paginar_busqueda, keyset_busqueda
+from .keyset import encode_cursor, decode_cursor, check_cursor_values, keyset_predicate, keyset_page
+from .cart_pricing import (
+    CartQuote,
+    PricingError,
+    ActiveTaxCache,
+    active_tax_cache,
+    cart_quantities,
+    price_lines,
+    price_cart,
+    DELIVERY_FEE
+)
+from .resumen_modelos import recalcular_resumen_modelos, get_resumen_modelos
+from .json_stream import stream_json_list
+from .image_variants import (
+    generar_variantes,
+    subir_variantes,
+    derivar_imagenes,
+    derivar_imagenes_en_segundo_plano,
+    validar_ubicacion,
+    UbicacionInvalida
+)
+from .resumen_pedidos import actualizar_resumen_pedidos, format_date_spanish, format_date_english
+from .pedido_lineas import lineas_desde_carrito, lineas_de_pedidos, insertar_lineas_pedido, reemplazar_lineas_pedido
+from .cart_store import (
+    LocalRealtimeDatabase,
+    FirebaseCartSync,
+    cart_sync,
+    init_cart_sync,
+    obtener_carrito,
+    guardar_carrito,
+    actualizar_carrito,
+    eliminar_carrito
+)
+from .transiciones_pedidos import (
+    TransicionError,
+    EstadosGraphCache,
+    estados_graph,
+    transicionar_pedidos,
+    MAX_PEDIDOS_POR_TRANSICION
+)
+from .signed_urls import SignedUrlCache, signed_url_cache, ruta_objeto
+from .analytics import refrescar_vistas, init_analytics, ventas_diarias, productos_mas_vendidos, pedidos_por_estado
+from .archivo_pagos import archivar_detalles_pago, crear_particiones, leer_detalles_pago, leer_detalles_pago_lote, ejecutar_mantenimiento, init_archivo_pagos
+from .detalles_pago import campos_detalles_pago, asignar_detalles_pago, buscar_pagos, MAX_RESULTADOS_BUSQUEDA_PAGOS
+from .paypal_token import PayPalTokenCache, paypal_token_cache, paypal_request, fetch_paypal_access_token
+from .http_client import HttpClient, http_client, TIMEOUTS
+from .outbox import manejador_outbox, encolar_evento, procesar_outbox, purgar_outbox, init_outbox
+from .capturas import CaptureError, pedido_pendiente, registrar_captura
+from .paypal_webhooks import (
+    WebhookVerificationError,
+    PayPalCertCache,
+    paypal_cert_cache,
+    verify_webhook_signature,
+    accept_webhook_event,
+    LocalPayPalWebhooks
+)
+from .cotizaciones import firmar_cotizacion, verificar_cotizacion, PRICE_QUOTE_TTL_SECONDS
+from .paypal_reconciliation import (
+    iter_paypal_captures,
+    reconcile_paypal,
+    LocalPayPalTransactions,
+    init_paypal_reconciliation
+)
@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+import time
+from sqlalchemy import text
+from ..database import db
+
+logger = logging.getLogger(__name__)
+
+# Vistas de migrations/011_analytics_views.sql, en el orden en que se refrescan
+VISTAS_ANALITICA = ("mv_ventas_diarias", "mv_productos_vendidos_diarios", "mv_pedidos_por_estado")
+ANALYTICS_REFRESH_SECONDS = int(os.getenv("ANALYTICS_REFRESH_SECONDS", "600"))
+# Clave del advisory lock que asegura que un solo worker refresca a la vez
+_REFRESH_LOCK_ID = 7301701
+
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def refrescar_vistas():
+    """
+    Refrescar las vistas de analítica con REFRESH MATERIALIZED VIEW CONCURRENTLY.
+
+    Las lecturas siguen viendo los datos anteriores mientras se recalculan. Si otro proceso ya
+    está refrescando (advisory lock tomado) no hace nada y devuelve False.
+    """
+    with db.engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": _REFRESH_LOCK_ID}).scalar():
+            return False
+        try:
+            for vista in VISTAS_ANALITICA:
+                inicio = time.perf_counter()
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {vista}"))
+                logger.info(f"Vista {vista} refrescada en {time.perf_counter() - inicio:.2f}s")
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _REFRESH_LOCK_ID})
+    return True
+
+
+def init_analytics(app, intervalo=ANALYTICS_REFRESH_SECONDS):
+    """Refrescar las vistas cada `intervalo` segundos en un hilo del proceso (0 lo desactiva)."""
+    global _scheduler
+    if intervalo <= 0:
+        return None
+
+    def refrescar_periodicamente():
+        while True:
+            time.sleep(intervalo)
+            with app.app_context():
+                try:
+                    refrescar_vistas()
+                except Exception as e:
+                    logger.error(f"No se pudieron refrescar las vistas de analítica: {e}")
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=refrescar_periodicamente, name="analytics-refresh", daemon=True)
+            _scheduler.start()
+    return _scheduler
+
+
+def ventas_diarias(desde, hasta):
+    """Pedidos, subtotal, ingresos e ingreso neto por día (hora de Ecuador) entre dos fechas."""
+    filas = db.session.execute(
+        text(
+            "SELECT dia, pedidos, subtotal, ingresos, ingreso_neto FROM mv_ventas_diarias "
+            "WHERE dia BETWEEN :desde AND :hasta ORDER BY dia"
+        ),
+        {"desde": desde, "hasta": hasta}
+    )
+    return [
+        {
+            "dia": fila.dia.isoformat(),
+            "pedidos": fila.pedidos,
+            "subtotal": str(fila.subtotal),
+            "ingresos": str(fila.ingresos),
+            "ingreso_neto": str(fila.ingreso_neto)
+        }
+        for fila in filas
+    ]
+
+
+def productos_mas_vendidos(desde, hasta, limite=10):
+    """Productos con más unidades vendidas entre dos fechas."""
+    filas = db.session.execute(
+        text(
+            "SELECT top.producto_id, pr.nombre, top.unidades, top.pedidos FROM ("
+            "    SELECT producto_id, sum(unidades) AS unidades, sum(pedidos) AS pedidos"
+            "    FROM mv_productos_vendidos_diarios WHERE dia BETWEEN :desde AND :hasta"
+            "    GROUP BY producto_id ORDER BY unidades DESC, producto_id LIMIT :limite"
+            ") top JOIN productos pr ON pr.producto_id = top.producto_id "
+            "ORDER BY top.unidades DESC, top.producto_id"
+        ),
+        {"desde": desde, "hasta": hasta, "limite": limite}
+    )
+    return [
+        {
+            "producto_id": fila.producto_id,
+            "nombre": fila.nombre,
+            "unidades": int(fila.unidades),
+            "pedidos": int(fila.pedidos)
+        }
+        for fila in filas
+    ]
+
+
+def pedidos_por_estado():
+    """Cantidad de pedidos y monto total por estado."""
+    filas = db.session.execute(
+        text(
+            "SELECT v.estado_pedido_id, e.nombre, e.nombre_ingles, v.pedidos, v.total "
+            "FROM mv_pedidos_por_estado v JOIN estados_pedidos e ON e.estado_pedido_id = v.estado_pedido_id "
+            "ORDER BY e.orden NULLS LAST, v.estado_pedido_id"
+        )
+    )
+    return [
+        {
+            "estado_pedido_id": fila.estado_pedido_id,
+            "nombre": fila.nombre,
+            "nombre_ingles": fila.nombre_ingles,
+            "pedidos": fila.pedidos,
+            "total": str(fila.total)
+        }
+        for fila in filas
+    ]
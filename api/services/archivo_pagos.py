@@ -0,0 +1,194 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, text
+from ..database import db
+from ..google_storage_config import GoogleCloudStorageConfig
+from ..models.pedidos import Pedidos
+
+logger = logging.getLogger(__name__)
+
+# Bucket de Cloud Storage para los JSON de captura archivados; sin él no se archiva
+PAYMENT_ARCHIVE_BUCKET = os.getenv("PAYMENT_ARCHIVE_BUCKET")
+PAYMENT_ARCHIVE_DAYS = int(os.getenv("PAYMENT_ARCHIVE_DAYS", "180"))
+PAYMENT_ARCHIVE_INTERVAL_SECONDS = int(os.getenv("PAYMENT_ARCHIVE_INTERVAL_SECONDS", "86400"))
+PEDIDOS_POR_LOTE = 200
+# Meses por delante con partición creada en productos_pedidos e imagenes_ranpulamps
+MESES_PARTICIONES_ADELANTE = 3
+# Clave del advisory lock que asegura que un solo worker archiva a la vez
+_ARCHIVO_LOCK_ID = 7301702
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="archivo-pagos")
+_gcs_lock = threading.Lock()
+_gcs_bucket = None
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def _bucket():
+    global _gcs_bucket
+    with _gcs_lock:
+        if _gcs_bucket is None:
+            _gcs_bucket = GoogleCloudStorageConfig().get_bucket(PAYMENT_ARCHIVE_BUCKET)
+        return _gcs_bucket
+
+
+def _ruta_archivo(pedido_id, fecha_pago):
+    return f"pagos/{fecha_pago:%Y/%m}/{pedido_id}.json.gz"
+
+
+def _subir(bucket, ruta, detalles_pago):
+    contenido = gzip.compress(json.dumps(detalles_pago, separators=(",", ":")).encode("utf-8"))
+    blob = bucket.blob(ruta)
+    blob.content_encoding = "gzip"
+    blob.upload_from_string(contenido, content_type="application/json")
+    return f"gs://{bucket.name}/{ruta}"
+
+
+def archivar_detalles_pago(antiguedad_dias=PAYMENT_ARCHIVE_DAYS, lote=PEDIDOS_POR_LOTE):
+    """
+    Mover a Cloud Storage el JSON de captura de los pedidos pagados hace más de `antiguedad_dias`.
+
+    Cada JSON se sube comprimido a pagos/AAAA/MM/<pedido_id>.json.gz y en la fila queda solo la
+    URI (detalles_pago_archivo). Se procesa por lotes de `lote` pedidos con un commit por lote,
+    así que una ejecución interrumpida retoma donde quedó. Devuelve la cantidad archivada.
+    """
+    bucket = _bucket()
+    limite = datetime.utcnow() - timedelta(days=antiguedad_dias)
+    archivados = 0
+    ultimo_id = 0
+
+    while True:
+        candidatos = db.session.execute(
+            select(Pedidos.pedido_id, Pedidos.fecha_pago, Pedidos.detalles_pago)
+            .where(
+                Pedidos.detalles_pago.isnot(None),
+                Pedidos.detalles_pago_archivo.is_(None),
+                Pedidos.fecha_pago < limite,
+                Pedidos.pedido_id > ultimo_id
+            )
+            .order_by(Pedidos.pedido_id)
+            .limit(lote)
+        ).all()
+        if not candidatos:
+            break
+        ultimo_id = candidatos[-1].pedido_id
+
+        # La lectura termina aquí: las subidas no retienen una transacción abierta
+        db.session.rollback()
+
+        # Un JSON 'null' no se sube: solo se limpia para que deje de ser candidato
+        con_datos = [fila for fila in candidatos if fila.detalles_pago is not None]
+        uris = list(_executor.map(
+            lambda fila: _subir(bucket, _ruta_archivo(fila.pedido_id, fila.fecha_pago), fila.detalles_pago),
+            con_datos
+        ))
+        referencias = dict(zip((fila.pedido_id for fila in con_datos), uris))
+
+        ahora = datetime.utcnow()
+        try:
+            for fila in candidatos:
+                db.session.execute(
+                    update(Pedidos)
+                    .where(Pedidos.pedido_id == fila.pedido_id, Pedidos.detalles_pago_archivo.is_(None))
+                    .values(
+                        detalles_pago=db.null(),
+                        detalles_pago_archivo=referencias.get(fila.pedido_id),
+                        detalles_pago_archivado_en=ahora if fila.pedido_id in referencias else None
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        archivados += len(referencias)
+        logger.info(f"Archivados {len(referencias)} detalles de pago (hasta el pedido {ultimo_id})")
+
+    return archivados
+
+
+def leer_detalles_pago(pedido):
+    """Devolver el JSON de captura de un pedido, descargándolo de Cloud Storage si ya se archivó."""
+    if pedido.detalles_pago_archivo is None:
+        return pedido.detalles_pago
+    ruta = pedido.detalles_pago_archivo.split("/", 3)[3]
+    contenido = _bucket().blob(ruta).download_as_bytes(raw_download=True)
+    return json.loads(gzip.decompress(contenido))
+
+
+def leer_detalles_pago_lote(pedidos):
+    """
+    Devolver {pedido_id: JSON de captura} de un lote de pedidos. Los archivados se descargan
+    de Cloud Storage en paralelo; los demás usan detalles_pago (conviene cargarlo con undefer()).
+    """
+    archivados = [pedido for pedido in pedidos if pedido.detalles_pago_archivo is not None]
+    detalles = {pedido.pedido_id: pedido.detalles_pago for pedido in pedidos if pedido.detalles_pago_archivo is None}
+    if archivados:
+        detalles.update(zip((pedido.pedido_id for pedido in archivados), _executor.map(leer_detalles_pago, archivados)))
+    return detalles
+
+
+def crear_particiones(meses=MESES_PARTICIONES_ADELANTE):
+    """
+    Crear las particiones mensuales de las líneas de pedido desde el mes actual hasta `meses`
+    meses adelante (migrations/021_particiones_lineas_pedido.sql). Las que ya existen se omiten.
+    """
+    try:
+        db.session.execute(
+            text("SELECT crear_particiones_lineas_pedido(CAST(timezone('utc', now()) AS date), :meses)"),
+            {"meses": meses}
+        )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def ejecutar_mantenimiento():
+    """
+    Crear las particiones de los próximos meses y archivar detalles de pago (si hay
+    PAYMENT_ARCHIVE_BUCKET), si ningún otro worker lo está haciendo.
+
+    Devuelve la cantidad de pagos archivados, o None si otro proceso tiene el advisory lock.
+    """
+    with db.engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": _ARCHIVO_LOCK_ID}).scalar():
+            return None
+        try:
+            crear_particiones()
+            return archivar_detalles_pago() if PAYMENT_ARCHIVE_BUCKET else 0
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _ARCHIVO_LOCK_ID})
+
+
+def init_archivo_pagos(app, intervalo=PAYMENT_ARCHIVE_INTERVAL_SECONDS):
+    """
+    Ejecutar el mantenimiento cada `intervalo` segundos en un hilo del proceso (0 lo desactiva).
+    """
+    global _scheduler
+    if intervalo <= 0:
+        return None
+
+    def mantener_periodicamente():
+        while True:
+            time.sleep(intervalo)
+            with app.app_context():
+                try:
+                    ejecutar_mantenimiento()
+                except Exception as e:
+                    logger.error(f"Falló el mantenimiento de pedidos: {e}")
+                finally:
+                    db.session.remove()
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=mantener_periodicamente, name="archivo-pagos", daemon=True)
+            _scheduler.start()
+    return _scheduler
@@ -0,0 +1,87 @@
+import pytz
+from datetime import datetime
+from dateutil.parser import isoparse
+from ..models.pedidos import Pedidos
+from ..models.pedidos_usuario import PedidosUsuario
+from ..models.usuarios import Usuarios
+from .cart_store import eliminar_carrito
+from .detalles_pago import asignar_detalles_pago, campos_detalles_pago
+from .resumen_pedidos import actualizar_resumen_pedidos
+
+ESTADO_ESPERANDO_PAGO = 8
+ESTADO_PAGADO = 4
+
+
+class CaptureError(Exception):
+    """A capture that cannot be recorded; `status_code` is the suggested HTTP response."""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def pedido_pendiente(firebase_uid):
+    """Return the user's pedido waiting for payment (estado 8), or raise CaptureError."""
+    user = Usuarios.query.filter_by(firebase_uid=firebase_uid).first()
+    if not user:
+        raise CaptureError(f"User not found for firebase_uid={firebase_uid}", 404)
+
+    pedido = (
+        Pedidos.query
+        .join(PedidosUsuario, PedidosUsuario.pedido_id == Pedidos.pedido_id)
+        .filter(PedidosUsuario.usuario_id == user.usuario_id, Pedidos.estado_pedido_id == ESTADO_ESPERANDO_PAGO)
+        .first()
+    )
+    if not pedido:
+        raise CaptureError(f"No pending pedido (estado=8) found for user_id={firebase_uid}", 404)
+    return pedido
+
+
+def registrar_captura(pedido_id, firebase_uid, captured_data):
+    """
+    Record a completed PayPal capture on the pedido, in the current transaction.
+
+    The pedido row is locked so two captures of the same order cannot both apply. If the pedido
+    already holds this same capture (a replayed request) nothing changes. The stored cart is
+    emptied and stays pending until the batched Firebase sync deletes it, retrying in the background.
+    """
+    pedido = Pedidos.query.filter_by(pedido_id=pedido_id).with_for_update().one()
+    capture_id = campos_detalles_pago(captured_data)["paypal_capture_id"]
+
+    if pedido.estado_pedido_id != ESTADO_ESPERANDO_PAGO:
+        if capture_id and pedido.paypal_capture_id == capture_id:
+            return pedido
+        raise CaptureError(f"Pedido {pedido_id} is no longer waiting for payment", 409)
+
+    # Extract capture details from the PayPal response
+    captures = (captured_data
+                .get("purchase_units", [{}])[0]
+                .get("payments", {})
+                .get("captures", []))
+
+    if not captures:
+        raise CaptureError("No capture info found in purchase_units->payments->captures")
+
+    first_capture = captures[0]
+    create_time_str = first_capture.get("create_time")
+    seller_receivable_breakdown = first_capture.get("seller_receivable_breakdown", {})
+    net_amount = seller_receivable_breakdown.get("net_amount", {}).get("value")
+
+    # Convert create_time from UTC -> UTC-5
+    tz_utc5 = pytz.timezone("Etc/GMT+5")
+    if create_time_str:
+        pedido.fecha_pago = isoparse(create_time_str).astimezone(tz_utc5)
+    else:
+        # fallback to "now"
+        pedido.fecha_pago = datetime.now(tz_utc5)
+
+    pedido.pago_id = first_capture.get("id")
+    asignar_detalles_pago(pedido, captured_data)
+    pedido.estado_pedido_id = ESTADO_PAGADO
+    pedido.ingreso_neto = net_amount
+
+    if firebase_uid:
+        eliminar_carrito(firebase_uid)
+    actualizar_resumen_pedidos(pedido.pedido_id)
+    return pedido
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+from ..database import db
+from ..models.productos import Productos
+from ..models.impuestos import Impuestos
+
+DELIVERY_FEE = Decimal("2.00")
+CENTAVO = Decimal("0.01")
+
+# Resultado de cotizar un carrito; todos los montos son Decimal con dos decimales
+CartQuote = namedtuple(
+    "CartQuote",
+    ["subtotal", "tax_percentage", "calculated_tax", "delivery_fee", "total", "impuesto_id"]
+)
+
+
+class PricingError(Exception):
+    """Carrito inválido o imposible de cotizar; `status_code` es la respuesta HTTP sugerida."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class ActiveTaxCache:
+    """
+    Caché en memoria del impuesto activo como (impuesto_id, porcentaje).
+
+    Las rutas de impuestos llaman a `invalidate()` después de cada cambio; el TTL acota
+    el tiempo que otros workers de gunicorn pueden seguir usando un impuesto desactivado.
+    """
+
+    def __init__(self, ttl_seconds=60):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires_at = 0.0
+
+    def get(self):
+        """Devolver (impuesto_id, porcentaje) del impuesto activo, o None si no hay ninguno."""
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires_at:
+                return self._value
+
+        fila = (
+            db.session.query(Impuestos.impuesto_id, Impuestos.porcentaje)
+            .filter(Impuestos.activo.is_(True))
+            .first()
+        )
+        if fila is None:
+            # No se cachea la ausencia: el primer impuesto que se active se ve de inmediato
+            return None
+
+        with self._lock:
+            self._value = (fila.impuesto_id, Decimal(fila.porcentaje))
+            self._expires_at = time.monotonic() + self.ttl_seconds
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._expires_at = 0.0
+
+
+active_tax_cache = ActiveTaxCache()
+
+
+def cart_quantities(items, product_key):
+    """
+    Validar los items del carrito y sumar las cantidades por producto.
+
+    `product_key` es la clave del id en cada item ('producto_id' en calculate_total,
+    'databaseProductId' en los carritos de Firebase). Devuelve {producto_id: cantidad}
+    conservando el orden de aparición.
+    """
+    cantidades = {}
+    for item in items:
+        producto_id = item.get(product_key) if isinstance(item, dict) else None
+        quantity = item.get('quantity', 0) if isinstance(item, dict) else None
+
+        if not producto_id or not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            raise PricingError(f"ID de producto o cantidad inválida en el item: {item}")
+        try:
+            producto_id = int(producto_id)
+        except (TypeError, ValueError):
+            raise PricingError(f"ID de producto o cantidad inválida en el item: {item}")
+
+        cantidades[producto_id] = cantidades.get(producto_id, 0) + quantity
+    return cantidades
+
+
+def price_lines(cantidades, precios, tax_percentage, impuesto_id=None):
+    """
+    Calcular subtotal, impuesto, envío y total a partir de cantidades y precios ya cargados.
+
+    El impuesto se redondea a centavos (mitad hacia arriba) antes de sumarlo, de modo que
+    subtotal + impuesto + envío coincide exactamente con el total enviado a PayPal.
+    """
+    subtotal = Decimal("0.00")
+    for producto_id, quantity in cantidades.items():
+        precio = precios.get(producto_id)
+        if precio is None:
+            raise PricingError(f"Producto con ID {producto_id} no encontrado", 404)
+        subtotal += precio * quantity
+
+    subtotal = subtotal.quantize(CENTAVO, rounding=ROUND_HALF_UP)
+    calculated_tax = (subtotal * tax_percentage / 100).quantize(CENTAVO, rounding=ROUND_HALF_UP)
+    total = subtotal + calculated_tax + DELIVERY_FEE
+
+    return CartQuote(
+        subtotal=subtotal,
+        tax_percentage=tax_percentage.quantize(CENTAVO),
+        calculated_tax=calculated_tax,
+        delivery_fee=DELIVERY_FEE,
+        total=total,
+        impuesto_id=impuesto_id
+    )
+
+
+def price_cart(items, product_key='producto_id'):
+    """
+    Cotizar un carrito completo con una sola consulta de precios (producto_id IN (...)).
+
+    Lanza PricingError si el carrito está vacío, algún item es inválido, falta un producto
+    o no hay un impuesto activo configurado.
+    """
+    if not items or not isinstance(items, list):
+        raise PricingError("Debe proporcionar una lista válida de productos con cantidades en 'items'")
+
+    cantidades = cart_quantities(items, product_key)
+
+    active_tax = active_tax_cache.get()
+    if active_tax is None:
+        raise PricingError("No hay ningún impuesto activo configurado")
+    impuesto_id, tax_percentage = active_tax
+
+    precios = dict(
+        db.session.query(Productos.producto_id, Productos.precio)
+        .filter(Productos.producto_id.in_(list(cantidades)))
+        .all()
+    )
+    return price_lines(cantidades, precios, tax_percentage, impuesto_id)
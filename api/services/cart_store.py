@@ -0,0 +1,422 @@
+import copy
+import logging
+import os
+import threading
+import time
+from firebase_admin import db as firebase_db
+from sqlalchemy import and_, bindparam, cast, event, func, select, update
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.orm import Session
+from ..database import db
+from ..models.carritos import Carritos
+from .outbox import manejador_outbox
+
+logger = logging.getLogger(__name__)
+
+CARTS_PATH = '/carts'
+# Segundos que se acumulan cambios antes de enviarlos a Firebase en una sola escritura
+CART_SYNC_INTERVAL = float(os.getenv("CART_SYNC_INTERVAL", "0.5"))
+# Cada cuánto se buscan carritos pendientes aunque nadie avise (p. ej. tras reiniciar el proceso)
+CART_SYNC_POLL_SECONDS = float(os.getenv("CART_SYNC_POLL_SECONDS", "30"))
+MAX_CAMBIOS_POR_LOTE = 500
+LOTE_IMPORTACION = 500
+# Bloqueo consultivo de Postgres que elige al único proceso que escucha /carts en Firebase
+LISTENER_LOCK_ID = 7310514
+LISTENER_CHECK_SECONDS = 60
+_SESSION_KEY = 'carritos_por_sincronizar'
+# Eventos del outbox encolados por la versión anterior de la réplica (uno por escritura)
+EVENTO_SINCRONIZAR_CARRITO = 'carrito.sincronizar_firebase'
+
+
+class LocalRealtimeDatabase:
+    """
+    Sustituto en memoria de firebase_admin.db para desarrollo local y pruebas.
+
+    Implementa lo que usa el backend: reference(path) con get, set, update (multi-ruta, None
+    borra), delete y listen (eventos 'put'/'patch' como los de Firebase, con un 'put' inicial).
+    Cuenta las escrituras en `escrituras` para comprobar el agrupamiento.
+    Se activa con CART_SYNC_BACKEND=local.
+    """
+
+    def __init__(self, datos=None):
+        self._datos = copy.deepcopy(datos) if datos else {}
+        self._lock = threading.Lock()
+        self._oyentes = []
+        self.escrituras = 0
+
+    def reference(self, path='/'):
+        return _ReferenciaLocal(self, _partes(path))
+
+    def _leer(self, partes):
+        with self._lock:
+            nodo = self._datos
+            for parte in partes:
+                if not isinstance(nodo, dict) or parte not in nodo:
+                    return None
+                nodo = nodo[parte]
+            return copy.deepcopy(nodo)
+
+    def _escribir(self, partes, cambios, tipo, datos):
+        with self._lock:
+            self.escrituras += 1
+            for subpartes, valor in cambios:
+                self._asignar(partes + subpartes, copy.deepcopy(valor))
+        self._notificar(partes, tipo, datos)
+
+    def _asignar(self, partes, valor):
+        if not partes:
+            self._datos = valor if isinstance(valor, dict) else {}
+            return
+        nodo = self._datos
+        for parte in partes[:-1]:
+            if not isinstance(nodo.get(parte), dict):
+                if valor is None:
+                    return
+                nodo[parte] = {}
+            nodo = nodo[parte]
+        if valor is None:
+            nodo.pop(partes[-1], None)
+        else:
+            nodo[partes[-1]] = valor
+
+    def _escuchar(self, partes, callback):
+        oyente = (partes, callback)
+        with self._lock:
+            self._oyentes.append(oyente)
+        callback(_EventoLocal('put', '/', self._leer(partes)))
+        return _RegistroLocal(self, oyente)
+
+    def _notificar(self, partes, tipo, datos):
+        with self._lock:
+            oyentes = list(self._oyentes)
+        for partes_oyente, callback in oyentes:
+            if partes[:len(partes_oyente)] == partes_oyente:
+                ruta = '/' + '/'.join(partes[len(partes_oyente):])
+                callback(_EventoLocal(tipo, ruta, copy.deepcopy(datos)))
+            elif partes_oyente[:len(partes)] == partes:
+                # Escritura por encima de la ruta escuchada: Firebase envía su nuevo valor completo
+                callback(_EventoLocal('put', '/', self._leer(partes_oyente)))
+
+
+class _ReferenciaLocal:
+    def __init__(self, base, partes):
+        self._base = base
+        self._partes = partes
+
+    def get(self):
+        return self._base._leer(self._partes)
+
+    def set(self, value):
+        self._base._escribir(self._partes, [([], value)], 'put', value)
+
+    def update(self, value):
+        if not value or not isinstance(value, dict):
+            raise ValueError('Value argument must be a non-empty dictionary.')
+        cambios = [(_partes(clave), valor) for clave, valor in value.items()]
+        self._base._escribir(self._partes, cambios, 'patch', value)
+
+    def delete(self):
+        self._base._escribir(self._partes, [([], None)], 'put', None)
+
+    def listen(self, callback):
+        return self._base._escuchar(self._partes, callback)
+
+
+class _EventoLocal:
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class _RegistroLocal:
+    def __init__(self, base, oyente):
+        self._base = base
+        self._oyente = oyente
+
+    def close(self):
+        with self._base._lock:
+            if self._oyente in self._base._oyentes:
+                self._base._oyentes.remove(self._oyente)
+
+
+def _partes(path):
+    return [parte for parte in str(path).split('/') if parte]
+
+
+class FirebaseCartSync:
+    """
+    Réplica de los carritos de Postgres hacia Firebase Realtime Database, por lotes.
+
+    Las escrituras locales marcan la fila como pendiente_firebase en la misma transacción, así
+    que la cola es la propia tabla y sobrevive a un reinicio. Un hilo en segundo plano espera
+    `intervalo` segundos tras cada aviso para acumular cambios y envía hasta
+    MAX_CAMBIOS_POR_LOTE carritos en una sola actualización multi-ruta sobre /carts (un carrito
+    vacío se borra). Un carrito que cambió varias veces solo se envía en su último estado. Si
+    Firebase falla, las filas siguen pendientes y se reintenta con espera creciente.
+    """
+
+    def __init__(self, rtdb=None, intervalo=CART_SYNC_INTERVAL):
+        self._rtdb = rtdb
+        self._intervalo = intervalo
+        self._despertar = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    @property
+    def rtdb(self):
+        return self._rtdb or firebase_db
+
+    def despertar(self):
+        self._despertar.set()
+
+    def enviar_pendientes(self, lote=MAX_CAMBIOS_POR_LOTE):
+        """
+        Enviar a Firebase un lote de carritos pendientes; devuelve cuántos se enviaron.
+
+        No hay transacción abierta durante la llamada a Firebase. Cada fila solo se marca como
+        replicada si su versión no cambió mientras tanto; si cambió, sale en el próximo lote.
+        """
+        try:
+            filas = db.session.execute(
+                select(Carritos.firebase_uid, Carritos.contenido, Carritos.version)
+                .where(Carritos.pendiente_firebase.is_(True))
+                .order_by(Carritos.updated_at)
+                .limit(lote)
+            ).all()
+        finally:
+            db.session.rollback()
+        if not filas:
+            return 0
+
+        self.rtdb.reference(CARTS_PATH).update({fila.firebase_uid: fila.contenido or None for fila in filas})
+
+        tabla = Carritos.__table__
+        try:
+            db.session.execute(
+                update(tabla)
+                .where(tabla.c.firebase_uid == bindparam('uid'), tabla.c.version == bindparam('version_enviada'))
+                .values(pendiente_firebase=False),
+                [{'uid': fila.firebase_uid, 'version_enviada': fila.version} for fila in filas]
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(filas)
+
+    def iniciar(self, app, intervalo_sondeo=CART_SYNC_POLL_SECONDS):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(
+                    target=self._trabajar, args=(app, intervalo_sondeo), name="firebase-cart-sync", daemon=True
+                )
+                self._hilo.start()
+        return self._hilo
+
+    def _trabajar(self, app, intervalo_sondeo):
+        espera = self._intervalo
+        while True:
+            self._despertar.wait(intervalo_sondeo)
+            self._despertar.clear()
+            time.sleep(espera)
+            with app.app_context():
+                try:
+                    while self.enviar_pendientes() == MAX_CAMBIOS_POR_LOTE:
+                        pass
+                    espera = self._intervalo
+                except Exception as e:
+                    # Si Firebase falla se espera cada vez más (hasta 30 s) antes de reintentar
+                    logger.error(f"No se pudieron sincronizar los carritos con Firebase: {e}")
+                    espera = min(max(espera, 0.5) * 2, 30)
+                    self._despertar.set()
+                finally:
+                    db.session.remove()
+
+
+cart_sync = FirebaseCartSync(LocalRealtimeDatabase() if os.getenv("CART_SYNC_BACKEND") == "local" else None)
+
+
+@event.listens_for(Session, "after_commit")
+def _sincronizar_despues_del_commit(session):
+    if session.info.pop(_SESSION_KEY, None):
+        cart_sync.despertar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_despues_del_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def obtener_carrito(firebase_uid):
+    """
+    Leer el carrito desde Postgres; devuelve None si no hay carrito.
+
+    No se consulta Firebase: los cambios que la tienda hace directamente en /carts llegan por
+    el listener (`escuchar_firebase`) y las escrituras locales son la versión más reciente.
+    """
+    contenido = db.session.execute(
+        select(Carritos.contenido).where(Carritos.firebase_uid == firebase_uid)
+    ).scalar()
+    return contenido or None
+
+
+def guardar_carrito(firebase_uid, contenido):
+    """Guardar el carrito en la transacción actual; se replica en Firebase después del commit."""
+    stmt = insert(Carritos).values(firebase_uid=firebase_uid, contenido=contenido, pendiente_firebase=True)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[Carritos.firebase_uid],
+            set_={"contenido": stmt.excluded.contenido, "pendiente_firebase": True, "version": Carritos.version + 1}
+        )
+    )
+    db.session.info[_SESSION_KEY] = True
+
+
+def actualizar_carrito(firebase_uid, cambios):
+    """Combinar `cambios` con el carrito actual (p. ej. {"status": "paid"}) y guardarlo."""
+    contenido = dict(obtener_carrito(firebase_uid) or {})
+    contenido.update(cambios)
+    guardar_carrito(firebase_uid, contenido)
+    return contenido
+
+
+def eliminar_carrito(firebase_uid):
+    """
+    Vaciar el carrito en la transacción actual; se borra de Firebase después del commit.
+
+    La fila queda vacía (y pendiente) hasta que el borrado llega a Firebase, para que el
+    listener no vuelva a importar el carrito anterior mientras tanto.
+    """
+    guardar_carrito(firebase_uid, {})
+
+
+def importar_carritos(carritos):
+    """
+    Guardar en Postgres, en la transacción actual, {firebase_uid: contenido | None} leído de
+    Firebase. No pisa los carritos con cambios locales sin replicar ni reescribe los que no cambiaron.
+    """
+    filas = [{"firebase_uid": uid, "contenido": contenido or {}} for uid, contenido in carritos.items()]
+    for inicio in range(0, len(filas), LOTE_IMPORTACION):
+        stmt = insert(Carritos).values(filas[inicio:inicio + LOTE_IMPORTACION])
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[Carritos.firebase_uid],
+                set_={"contenido": stmt.excluded.contenido},
+                where=and_(
+                    Carritos.pendiente_firebase.is_(False),
+                    cast(Carritos.contenido, JSONB) != cast(stmt.excluded.contenido, JSONB)
+                )
+            )
+        )
+
+
+def aplicar_evento_firebase(evento, rtdb=None):
+    """
+    Aplicar en Postgres un evento del listener de /carts (en la transacción actual).
+
+    - 'put' en la raíz: contenido completo de /carts (al conectar y en cada reconexión); los
+      carritos que ya no están se vacían.
+    - 'put' de un carrito completo o 'patch' en la raíz con carritos completos: se importan.
+    - Cambios dentro de un carrito (p. ej. /<uid>/items/0): se vuelve a leer ese carrito,
+      fuera de cualquier petición.
+    """
+    rtdb = rtdb or cart_sync.rtdb
+    partes = _partes(evento.path)
+    carritos = {}
+    releer = set()
+
+    if not partes and evento.event_type == 'put':
+        completos = evento.data if isinstance(evento.data, dict) else {}
+        importar_carritos(completos)
+        db.session.execute(
+            update(Carritos)
+            .where(
+                Carritos.pendiente_firebase.is_(False),
+                Carritos.firebase_uid.notin_(list(completos)),
+                cast(Carritos.contenido, JSONB) != cast({}, JSONB)
+            )
+            .values(contenido={})
+            .execution_options(synchronize_session=False)
+        )
+        return
+    if not partes:
+        for clave, valor in (evento.data or {}).items():
+            subpartes = _partes(clave)
+            if len(subpartes) == 1:
+                carritos[subpartes[0]] = valor
+            elif subpartes:
+                releer.add(subpartes[0])
+    elif len(partes) == 1 and evento.event_type == 'put':
+        carritos[partes[0]] = evento.data
+    else:
+        releer.add(partes[0])
+
+    for firebase_uid in releer - set(carritos):
+        carritos[firebase_uid] = rtdb.reference(f'{CARTS_PATH}/{firebase_uid}').get()
+    importar_carritos(carritos)
+
+
+def escuchar_firebase(app, rtdb=None):
+    """
+    Mantener la copia de Postgres al día con los cambios que la tienda escribe en /carts.
+
+    Solo escucha el proceso que obtiene el bloqueo consultivo LISTENER_LOCK_ID (lo retiene su
+    propia conexión); los demás reintentan cada LISTENER_CHECK_SECONDS por si ese proceso cae.
+    Bloquea el hilo que la llama.
+    """
+    rtdb = rtdb or cart_sync.rtdb
+
+    def aplicar(evento):
+        with app.app_context():
+            try:
+                aplicar_evento_firebase(evento, rtdb)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"No se pudo aplicar un cambio de Firebase en {CARTS_PATH}{evento.path}: {e}")
+            finally:
+                db.session.remove()
+
+    while True:
+        registro = None
+        try:
+            with app.app_context(), db.engine.connect() as conexion:
+                elegido = conexion.execute(select(func.pg_try_advisory_lock(LISTENER_LOCK_ID))).scalar()
+                conexion.commit()
+                if elegido:
+                    logger.info(f"Escuchando {CARTS_PATH} en Firebase")
+                    registro = rtdb.reference(CARTS_PATH).listen(aplicar)
+                    while True:
+                        time.sleep(LISTENER_CHECK_SECONDS)
+                        # Si se pierde la conexión se pierde el bloqueo: dejar de escuchar y volver a competir
+                        conexion.execute(select(1))
+                        conexion.commit()
+        except Exception as e:
+            logger.error(f"El listener de carritos de Firebase se detuvo: {e}")
+        finally:
+            if registro is not None:
+                registro.close()
+        time.sleep(LISTENER_CHECK_SECONDS)
+
+
+def init_cart_sync(app, intervalo_sondeo=CART_SYNC_POLL_SECONDS, escuchar=None):
+    """
+    Arrancar la réplica por lotes hacia Firebase y, con CART_LISTENER_ENABLED (por defecto sí),
+    el listener de /carts. `intervalo_sondeo` <= 0 desactiva ambos.
+    """
+    if intervalo_sondeo <= 0:
+        return None
+    if escuchar is None:
+        escuchar = os.getenv("CART_LISTENER_ENABLED", "true").lower() == "true"
+
+    cart_sync.iniciar(app, intervalo_sondeo)
+    if escuchar:
+        threading.Thread(target=escuchar_firebase, args=(app,), name="firebase-cart-listener", daemon=True).start()
+    return cart_sync
+
+
+@manejador_outbox(EVENTO_SINCRONIZAR_CARRITO)
+def _sincronizar_carrito_en_firebase(payload):
+    # Eventos de la versión anterior: la fila sigue marcada como pendiente, basta con avisar al hilo
+    cart_sync.despertar()
@@ -0,0 +1,73 @@
+import threading
+from collections import OrderedDict
+
+
+class CatalogCache:
+    """
+    Caché LRU en memoria para las páginas serializadas de GET /api/productos/catalog.
+
+    Cada entrada se indexa por (versión, clave de la página) y guarda los bytes
+    JSON ya serializados. Cualquier cambio de productos incrementa la versión global y
+    vacía la caché; la versión también evita guardar una página que se calculó antes
+    del cambio. La versión vive en el proceso: cada worker de gunicorn tiene su caché.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def get(self, page_key):
+        """
+        Devolver los bytes cacheados de la página, o None si no existen.
+
+        `page_key` es una tupla con los parámetros que identifican la página,
+        p. ej. ("page", search, page, per_page).
+        """
+        with self._lock:
+            key = (self._version, page_key)
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, page_key, body, version):
+        """Guardar una página serializada calculada con la versión `version`."""
+        with self._lock:
+            # Si el catálogo cambió mientras se calculaba la página, no se guarda
+            if version != self._version:
+                return
+            key = (self._version, page_key)
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def bump_version(self):
+        """Invalidar todas las páginas cacheadas tras un cambio en los productos."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self._version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,85 @@
+from sqlalchemy import Float, func, literal_column
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from ..models.productos import Productos
+from .keyset import keyset_page
+
+# Configuración de texto de PostgreSQL usada por productos.search_vector (ver migrations/001_productos_search.sql)
+TEXT_SEARCH_CONFIG = 'spanish'
+
+# Columna generada en la base de datos; no se mapea en el modelo para no cargarla en cada SELECT
+search_vector = literal_column('productos.search_vector', type_=TSVECTOR)
+
+
+def _ts_query(search):
+    return func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, search)
+
+
+def filtrar_texto_completo(query, search):
+    """
+    Filtrar y ordenar por relevancia usando el índice GIN sobre search_vector.
+
+    El término se interpreta con websearch_to_tsquery, por lo que acepta frases entre
+    comillas y el operador "-" sin lanzar errores de sintaxis.
+    """
+    ts_query = _ts_query(search)
+    return (
+        query
+        .filter(search_vector.op('@@')(ts_query))
+        .order_by(func.ts_rank_cd(search_vector, ts_query).desc(), Productos.producto_id)
+    )
+
+
+def filtrar_similitud(query, search):
+    """
+    Búsqueda tolerante a errores de escritura con pg_trgm sobre el nombre del producto.
+
+    El operador % usa el índice de trigramas y el umbral pg_trgm.similarity_threshold.
+    """
+    return (
+        query
+        .filter(Productos.nombre.op('%')(search))
+        .order_by(func.similarity(Productos.nombre, search).desc(), Productos.producto_id)
+    )
+
+
+def paginar_busqueda(query, search, page, per_page):
+    """
+    Paginar los resultados de la búsqueda de texto completo y, si no hay ninguna
+    coincidencia, repetir la búsqueda por similitud de trigramas.
+    """
+    paginated = filtrar_texto_completo(query, search).paginate(page=page, per_page=per_page, error_out=False)
+    if paginated.total:
+        return paginated
+    return filtrar_similitud(query, search).paginate(page=page, per_page=per_page, error_out=False)
+
+
+# Modos de búsqueda guardados en el cursor, para que las páginas siguientes no cambien de estrategia
+MODO_TEXTO_COMPLETO = 'fts'
+MODO_SIMILITUD = 'trgm'
+
+
+def keyset_busqueda(query, search, modo, after_values, per_page):
+    """
+    Página por cursor de una búsqueda, ordenada por (relevancia DESC, producto_id ASC).
+
+    Sin modo (primera página) se intenta primero el texto completo y, si no hay resultados,
+    la similitud de trigramas. Devuelve (productos, next_values, modo).
+    """
+    if modo in (None, MODO_TEXTO_COMPLETO):
+        ts_query = _ts_query(search)
+        items, next_values = keyset_page(
+            query.filter(search_vector.op('@@')(ts_query)),
+            [(func.ts_rank_cd(search_vector, ts_query, type_=Float), True), (Productos.producto_id, False)],
+            after_values,
+            per_page
+        )
+        if items or modo == MODO_TEXTO_COMPLETO:
+            return items, next_values, MODO_TEXTO_COMPLETO
+
+    items, next_values = keyset_page(
+        query.filter(Productos.nombre.op('%')(search)),
+        [(func.similarity(Productos.nombre, search, type_=Float), True), (Productos.producto_id, False)],
+        after_values,
+        per_page
+    )
+    return items, next_values, MODO_SIMILITUD
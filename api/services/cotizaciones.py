@@ -0,0 +1,105 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from decimal import Decimal
+from .cart_pricing import CartQuote, PricingError, active_tax_cache, cart_quantities
+
+logger = logging.getLogger(__name__)
+
+PRICE_QUOTE_TTL_SECONDS = int(os.getenv("PRICE_QUOTE_TTL_SECONDS", "900"))
+_SECRETO = os.getenv("PRICE_QUOTE_SECRET", "").encode("utf-8")
+if not _SECRETO:
+    # Sin secreto compartido cada worker firma con el suyo: una cotización emitida por otro
+    # worker no verifica y create_order vuelve a cotizar, que sigue siendo correcto
+    logger.warning("PRICE_QUOTE_SECRET no está configurado; las cotizaciones solo valen en este proceso")
+    _SECRETO = secrets.token_bytes(32)
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(datos).rstrip(b"=").decode("ascii")
+
+
+def _desde_b64(texto):
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+def _firma(carga):
+    return hmac.new(_SECRETO, carga, hashlib.sha256).digest()
+
+
+def _lineas(cantidades):
+    # Forma canónica: el orden de los items en el carrito no cambia la firma
+    return sorted([producto_id, cantidad] for producto_id, cantidad in cantidades.items())
+
+
+def firmar_cotizacion(pedido_id, firebase_uid, cart_items, quote, ttl=PRICE_QUOTE_TTL_SECONDS):
+    """
+    Emitir una cotización firmada (HMAC-SHA256) del pedido: pedido, usuario, líneas
+    {producto_id: cantidad}, montos e impuesto, válida por `ttl` segundos.
+
+    El resultado es un texto opaco "<carga>.<firma>" para devolver al cliente.
+    """
+    carga = json.dumps({
+        "pedido_id": pedido_id,
+        "uid": firebase_uid,
+        "lineas": _lineas(cart_quantities(cart_items, 'databaseProductId')),
+        "subtotal": str(quote.subtotal),
+        "porcentaje_impuesto": str(quote.tax_percentage),
+        "impuesto": str(quote.calculated_tax),
+        "envio": str(quote.delivery_fee),
+        "total": str(quote.total),
+        "impuesto_id": quote.impuesto_id,
+        "vence": int(time.time()) + ttl
+    }, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return f"{_b64(carga)}.{_b64(_firma(carga))}"
+
+
+def verificar_cotizacion(cotizacion, pedido_id, firebase_uid, cart_items):
+    """
+    Devolver el CartQuote de una cotización firmada si sigue vigente, o None para volver a cotizar.
+
+    La firma se compara en tiempo constante y no se consulta ningún producto. La cotización
+    deja de valer si venció, es de otro pedido o usuario, el carrito ya no tiene las mismas
+    líneas o el impuesto activo cambió.
+    """
+    try:
+        carga_b64, firma_b64 = cotizacion.split(".")
+        carga = _desde_b64(carga_b64)
+        if not hmac.compare_digest(_firma(carga), _desde_b64(firma_b64)):
+            logger.warning(f"Cotización con firma inválida para el pedido {pedido_id}")
+            return None
+        datos = json.loads(carga)
+    except (AttributeError, ValueError):
+        return None
+
+    if datos["vence"] < time.time():
+        motivo = "vencida"
+    elif str(datos["pedido_id"]) != str(pedido_id) or datos["uid"] != firebase_uid:
+        motivo = "de otro pedido o usuario"
+    else:
+        try:
+            lineas = _lineas(cart_quantities(cart_items, 'databaseProductId'))
+        except PricingError:
+            lineas = None
+        impuesto_activo = active_tax_cache.get()
+        if lineas != datos["lineas"]:
+            motivo = "el carrito cambió"
+        elif impuesto_activo is None or impuesto_activo[0] != datos["impuesto_id"]:
+            motivo = "el impuesto activo cambió"
+        else:
+            return CartQuote(
+                subtotal=Decimal(datos["subtotal"]),
+                tax_percentage=Decimal(datos["porcentaje_impuesto"]),
+                calculated_tax=Decimal(datos["impuesto"]),
+                delivery_fee=Decimal(datos["envio"]),
+                total=Decimal(datos["total"]),
+                impuesto_id=datos["impuesto_id"]
+            )
+
+    logger.info(f"Cotización del pedido {pedido_id} no vigente ({motivo}); se vuelve a cotizar")
+    return None
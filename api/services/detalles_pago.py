@@ -0,0 +1,46 @@
+from sqlalchemy import or_
+from ..models.pedidos import Pedidos
+
+MAX_RESULTADOS_BUSQUEDA_PAGOS = 50
+
+
+def campos_detalles_pago(detalles_pago):
+    """Extraer capture id, payer id y status de la respuesta de captura de PayPal."""
+    detalles_pago = detalles_pago or {}
+    unidades = detalles_pago.get("purchase_units") or [{}]
+    capturas = (unidades[0].get("payments") or {}).get("captures") or [{}]
+    return {
+        "paypal_capture_id": capturas[0].get("id"),
+        "paypal_payer_id": (detalles_pago.get("payer") or {}).get("payer_id"),
+        "paypal_status": detalles_pago.get("status")
+    }
+
+
+def asignar_detalles_pago(pedido, detalles_pago):
+    """Guardar la respuesta de captura en el pedido junto con sus columnas extraídas."""
+    pedido.detalles_pago = detalles_pago
+    for campo, valor in campos_detalles_pago(detalles_pago).items():
+        setattr(pedido, campo, valor)
+
+
+def buscar_pagos(capture_id=None, payer_id=None, status=None, payer_email=None, limite=MAX_RESULTADOS_BUSQUEDA_PAGOS):
+    """
+    Query de pedidos por datos del pago, para soporte.
+
+    capture_id, payer_id y status usan sus columnas indexadas. payer_email se busca con
+    contención JSONB (índice GIN) en el JSON de la captura y en el del pagador de la unidad de
+    compra; no encuentra pagos cuyo JSON ya se archivó (api/services/archivo_pagos.py).
+    """
+    query = Pedidos.query
+    if capture_id:
+        query = query.filter(Pedidos.paypal_capture_id == capture_id)
+    if payer_id:
+        query = query.filter(Pedidos.paypal_payer_id == payer_id)
+    if status:
+        query = query.filter(Pedidos.paypal_status == status.upper())
+    if payer_email:
+        query = query.filter(or_(
+            Pedidos.detalles_pago.contains({"payer": {"email_address": payer_email}}),
+            Pedidos.detalles_pago.contains({"payment_source": {"paypal": {"email_address": payer_email}}})
+        ))
+    return query.order_by(Pedidos.pedido_id.desc()).limit(limite)
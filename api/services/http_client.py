@@ -0,0 +1,136 @@
+import logging
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# (connect, read) en segundos por dependencia externa; toda llamada debe indicar una
+TIMEOUTS = {
+    "paypal": (5, 30),
+    "meshy": (5, 60),
+    # Descargas de archivos generados (GLB, thumbnails) e imágenes de productos
+    "descargas": (5, 120),
+}
+METODOS_IDEMPOTENTES = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+STATUS_REINTENTABLES = frozenset({429, 502, 503, 504})
+MAX_REINTENTOS = 2
+BACKOFF_BASE_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 4.0
+# Muestras de latencia por host que se guardan para calcular percentiles
+MUESTRAS_POR_HOST = 500
+
+
+class _MetricasHost:
+    def __init__(self):
+        self.solicitudes = 0
+        self.errores = 0
+        self.reintentos = 0
+        self.por_status = {}
+        self.latencias = deque(maxlen=MUESTRAS_POR_HOST)
+
+    def resumen(self):
+        latencias = sorted(self.latencias)
+
+        def percentil(p):
+            return round(latencias[min(len(latencias) - 1, int(len(latencias) * p))], 1) if latencias else None
+
+        return {
+            "solicitudes": self.solicitudes,
+            "errores": self.errores,
+            "reintentos": self.reintentos,
+            "por_status": dict(self.por_status),
+            "latencia_ms_p50": percentil(0.50),
+            "latencia_ms_p95": percentil(0.95),
+            "latencia_ms_max": round(latencias[-1], 1) if latencias else None
+        }
+
+
+class HttpClient:
+    """
+    Cliente HTTP compartido para las integraciones externas (PayPal, Meshy, descargas).
+
+    Una sola `requests.Session` mantiene un pool keep-alive por host, así que las llamadas
+    reutilizan conexiones TLS en lugar de abrir una nueva cada vez. Cada llamada indica su
+    dependencia, que fija el timeout. Los métodos idempotentes (o las llamadas marcadas con
+    `idempotente=True`, p. ej. un POST con PayPal-Request-Id) se reintentan ante errores de
+    conexión, timeouts y 429/502/503/504 con backoff exponencial con jitter. Latencia, status
+    y errores se registran por host; `stats()` los resume.
+    """
+
+    def __init__(self, timeouts=TIMEOUTS, max_reintentos=MAX_REINTENTOS, pool_maxsize=20):
+        self.timeouts = dict(timeouts)
+        self.max_reintentos = max_reintentos
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # El hook también mide las llamadas que hace el SDK de PayPal con esta sesión
+        self.session.hooks["response"].append(self._registrar_respuesta)
+        self._lock = threading.Lock()
+        self._metricas = {}
+
+    def request(self, dependencia, method, url, idempotente=None, **kwargs):
+        if dependencia not in self.timeouts:
+            raise ValueError(f"Dependencia HTTP desconocida: {dependencia}")
+        kwargs.setdefault("timeout", self.timeouts[dependencia])
+        method = method.upper()
+        if idempotente is None:
+            idempotente = method in METODOS_IDEMPOTENTES
+        reintentos = self.max_reintentos if idempotente else 0
+        host = urlparse(url).netloc
+
+        for intento in range(reintentos + 1):
+            response = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._metrica(host, "errores")
+                if intento == reintentos:
+                    raise
+                logger.warning(f"{method} {host} falló ({e.__class__.__name__}); reintento {intento + 1}")
+            else:
+                if response.status_code not in STATUS_REINTENTABLES or intento == reintentos:
+                    return response
+                logger.warning(f"{method} {host} respondió {response.status_code}; reintento {intento + 1}")
+                response.close()
+            self._metrica(host, "reintentos")
+            time.sleep(self._espera(intento, response))
+
+    def get(self, dependencia, url, **kwargs):
+        return self.request(dependencia, "GET", url, **kwargs)
+
+    def post(self, dependencia, url, **kwargs):
+        return self.request(dependencia, "POST", url, **kwargs)
+
+    def _espera(self, intento, response=None):
+        """Backoff exponencial con jitter completo; respeta Retry-After si PayPal/Meshy lo envían."""
+        espera = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** intento))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            espera = max(espera, min(BACKOFF_MAX_SECONDS, int(retry_after)))
+        return espera
+
+    def _registrar_respuesta(self, response, *args, **kwargs):
+        host = urlparse(response.url).netloc
+        with self._lock:
+            metricas = self._metricas.setdefault(host, _MetricasHost())
+            metricas.solicitudes += 1
+            metricas.por_status[response.status_code] = metricas.por_status.get(response.status_code, 0) + 1
+            metricas.latencias.append(response.elapsed.total_seconds() * 1000)
+
+    def _metrica(self, host, campo):
+        with self._lock:
+            metricas = self._metricas.setdefault(host, _MetricasHost())
+            setattr(metricas, campo, getattr(metricas, campo) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {host: metricas.resumen() for host, metricas in sorted(self._metricas.items())}
+
+
+http_client = HttpClient()
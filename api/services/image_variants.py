@@ -0,0 +1,205 @@
+import hashlib
+import io
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, unquote
+
+from .http_client import http_client
+from PIL import Image, ImageOps
+
+from ..database import db
+from ..google_storage_config import GoogleCloudStorageConfig
+from ..models.imagenes_productos import ImagenesProductos
+
+logger = logging.getLogger(__name__)
+
+IMAGES_BUCKET = 'ranpuimagesbucket'
+
+# Lado mayor (px) de cada variante; nunca se amplía una imagen más pequeña
+VARIANTES = {
+    "thumbnail": 160,
+    "card": 480,
+    "detail": 1200,
+}
+FORMATOS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# Los nombres llevan un hash del original, así que las variantes nunca cambian de contenido
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+MAX_ORIGINAL_BYTES = 20 * 1024 * 1024
+# Únicos orígenes de imágenes que el servidor descarga: nuestro bucket y Firebase Storage
+FIREBASE_STORAGE_HOSTS = frozenset({"firebasestorage.googleapis.com"})
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-variants")
+_gcs_lock = threading.Lock()
+_gcs_bucket = None
+
+
+def _bucket():
+    global _gcs_bucket
+    with _gcs_lock:
+        if _gcs_bucket is None:
+            _gcs_bucket = GoogleCloudStorageConfig().get_bucket(IMAGES_BUCKET)
+        return _gcs_bucket
+
+
+def generar_variantes(contenido):
+    """
+    Redimensionar una imagen a cada variante en WebP y JPEG.
+
+    Devuelve {variante: {"width", "height", "webp": bytes, "jpeg": bytes}}. Se respeta la
+    orientación EXIF; el JPEG se aplana sobre fondo blanco si el original tiene transparencia.
+    """
+    with Image.open(io.BytesIO(contenido)) as original:
+        original = ImageOps.exif_transpose(original)
+        tiene_alpha = original.mode in ("RGBA", "LA") or (original.mode == "P" and "transparency" in original.info)
+        base = original.convert("RGBA" if tiene_alpha else "RGB")
+
+    resultado = {}
+    for variante, lado in VARIANTES.items():
+        imagen = base.copy()
+        imagen.thumbnail((lado, lado), Image.LANCZOS)
+
+        if tiene_alpha:
+            opaca = Image.new("RGB", imagen.size, (255, 255, 255))
+            opaca.paste(imagen, mask=imagen.getchannel("A"))
+        else:
+            opaca = imagen
+
+        archivos = {}
+        for formato, (pil_format, _, opciones) in FORMATOS.items():
+            salida = io.BytesIO()
+            (imagen if formato == "webp" else opaca).save(salida, pil_format, **opciones)
+            archivos[formato] = salida.getvalue()
+
+        resultado[variante] = {"width": imagen.width, "height": imagen.height, **archivos}
+    return resultado
+
+
+def _ruta_base(ubicacion, producto_id):
+    """Carpeta y nombre base de las variantes: junto al original si está en nuestro bucket."""
+    url = urlparse(ubicacion or "")
+    ruta = unquote(url.path).lstrip("/")
+    prefijo = f"{IMAGES_BUCKET}/"
+    if url.netloc == "storage.googleapis.com" and ruta.startswith(prefijo):
+        ruta = ruta[len(prefijo):]
+    else:
+        ruta = f"images/{producto_id}/{posixpath.basename(ruta) or 'imagen'}"
+    carpeta, nombre = posixpath.split(ruta)
+    return carpeta, posixpath.splitext(nombre)[0]
+
+
+def subir_variantes(contenido, ubicacion, producto_id):
+    """
+    Generar y subir las variantes de una imagen a GCS; devuelve el dict que se guarda en
+    ImagenesProductos.variantes: {variante: {"width", "height", "webp": url, "jpeg": url}}.
+    """
+    carpeta, nombre = _ruta_base(ubicacion, producto_id)
+    huella = hashlib.sha1(contenido).hexdigest()[:10]
+    bucket = _bucket()
+
+    variantes = {}
+    for variante, archivos in generar_variantes(contenido).items():
+        urls = {"width": archivos["width"], "height": archivos["height"]}
+        for formato, (_, content_type, _) in FORMATOS.items():
+            extension = "jpg" if formato == "jpeg" else formato
+            blob = bucket.blob(f"{carpeta}/{nombre}__{variante}_{huella}.{extension}")
+            blob.cache_control = CACHE_CONTROL
+            blob.upload_from_string(archivos[formato], content_type=content_type)
+            urls[formato] = blob.public_url
+        variantes[variante] = urls
+    return variantes
+
+
+class UbicacionInvalida(Exception):
+    """La ubicación de una imagen no es un origen permitido; `status_code` es la respuesta HTTP sugerida."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def validar_ubicacion(ubicacion):
+    """
+    Aceptar solo URLs https de nuestro bucket (storage.googleapis.com/ranpuimagesbucket/...) o de
+    Firebase Storage. Cualquier otra lanza UbicacionInvalida: el servidor descarga estas URLs para
+    generar las variantes, así que no puede pedir direcciones arbitrarias (red interna, metadata).
+    """
+    try:
+        url = urlparse(ubicacion)
+        puerto = url.port
+    except (AttributeError, TypeError, ValueError):
+        raise UbicacionInvalida(f"Ubicación de imagen inválida: {ubicacion}")
+
+    permitido = url.scheme == "https" and not url.username and not url.password and puerto in (None, 443) and (
+        (url.hostname == "storage.googleapis.com" and url.path.startswith(f"/{IMAGES_BUCKET}/"))
+        or url.hostname in FIREBASE_STORAGE_HOSTS
+    )
+    if not permitido:
+        raise UbicacionInvalida(
+            f"La imagen debe estar en el bucket {IMAGES_BUCKET} o en Firebase Storage (https): {ubicacion}"
+        )
+    return url
+
+
+def descargar_original(ubicacion):
+    """Descargar la imagen original; los objetos de nuestro bucket se leen directamente de GCS."""
+    url = validar_ubicacion(ubicacion)
+    prefijo = f"/{IMAGES_BUCKET}/"
+    if url.hostname == "storage.googleapis.com" and url.path.startswith(prefijo):
+        return _bucket().blob(unquote(url.path[len(prefijo):])).download_as_bytes()
+
+    # Sin seguir redirecciones: el destino final también tiene que ser Firebase Storage
+    with http_client.get("descargas", ubicacion, timeout=(5, 30), stream=True, allow_redirects=False) as response:
+        response.raise_for_status()
+        if response.is_redirect:
+            raise ValueError(f"La imagen redirige fuera de Firebase Storage: {ubicacion}")
+        contenido = response.raw.read(MAX_ORIGINAL_BYTES + 1, decode_content=True)
+    if len(contenido) > MAX_ORIGINAL_BYTES:
+        raise ValueError(f"La imagen supera {MAX_ORIGINAL_BYTES} bytes: {ubicacion}")
+    return contenido
+
+
+def derivar_imagenes(imagen_ids):
+    """
+    Generar las variantes de imágenes ya registradas que todavía no las tienen.
+
+    Un error en una imagen se registra en el log y no afecta a las demás; la imagen queda
+    sin variantes y los clientes siguen usando `ubicacion`.
+    """
+    from .catalog_cache import catalog_cache
+
+    actualizadas = 0
+    for imagen_id in imagen_ids:
+        imagen = db.session.get(ImagenesProductos, imagen_id)
+        if imagen is None or imagen.variantes:
+            continue
+        try:
+            contenido = descargar_original(imagen.ubicacion)
+            imagen.variantes = subir_variantes(contenido, imagen.ubicacion, imagen.producto_id)
+            db.session.commit()
+            actualizadas += 1
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"No se pudieron generar las variantes de la imagen {imagen_id}: {e}")
+
+    if actualizadas:
+        catalog_cache.bump_version()
+    return actualizadas
+
+
+def derivar_imagenes_en_segundo_plano(app, imagen_ids):
+    """Encolar `derivar_imagenes` fuera de la petición (después del commit que creó las imágenes)."""
+    imagen_ids = list(imagen_ids)
+    if not imagen_ids:
+        return None
+
+    def tarea():
+        with app.app_context():
+            return derivar_imagenes(imagen_ids)
+
+    return _executor.submit(tarea)
@@ -0,0 +1,33 @@
+from itertools import islice
+from flask import current_app, stream_with_context
+from ..json_provider import dumps_bytes
+
+
+def stream_json_list(query, serializar_lote, batch_size=500):
+    """
+    Responder un arreglo JSON generado por lotes desde un cursor del servidor.
+
+    `query` se recorre con yield_per(batch_size), así que PostgreSQL entrega las filas de
+    a `batch_size` y solo un lote vive en memoria. `serializar_lote(lote)` recibe la lista
+    de entidades del lote (para cargar relaciones de todo el lote con una sola consulta) y
+    devuelve los diccionarios a escribir. Las relaciones de colección deben precargarse con
+    selectinload; joinedload solo sirve para relaciones many-to-one con yield_per.
+    """
+    def generar():
+        filas = iter(query.yield_per(batch_size))
+        yield b"["
+        primero = True
+        while True:
+            lote = list(islice(filas, batch_size))
+            if not lote:
+                break
+            fragmentos = [dumps_bytes(item) for item in serializar_lote(lote)]
+            if fragmentos:
+                yield (b"" if primero else b",") + b",".join(fragmentos)
+                primero = False
+        yield b"]\n"
+
+    return current_app.response_class(
+        stream_with_context(generar()),
+        mimetype=current_app.json.mimetype
+    )
@@ -0,0 +1,117 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_, tuple_
+
+
+def encode_cursor(payload):
+    """Serialize a cursor payload into an opaque URL-safe string."""
+    def default(value):
+        if isinstance(value, datetime):
+            return {"$dt": value.isoformat()}
+        raise TypeError(f"Unsupported cursor value: {value!r}")
+
+    raw = json.dumps(payload, default=default, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a cursor created by `encode_cursor`. Raises ValueError if it is malformed."""
+    def object_hook(value):
+        if set(value) == {"$dt"}:
+            return datetime.fromisoformat(value["$dt"])
+        return value
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")), object_hook=object_hook)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor")
+    return payload
+
+
+def _check_value(expression, value):
+    """Return `value` if it fits the SQL type of `expression`, raise ValueError otherwise."""
+    try:
+        expected = expression.type.python_type
+    except NotImplementedError:
+        # Untyped expressions (e.g. func.* without type_) are not used in keyset orderings
+        raise ValueError(f"Keyset column without a Python type: {expression}")
+
+    if value is None or isinstance(value, bool):
+        raise ValueError("Invalid cursor")
+    if expected is float and isinstance(value, (int, float)):
+        return float(value)
+    if not isinstance(value, expected):
+        raise ValueError("Invalid cursor")
+    return value
+
+
+def check_cursor_values(order_columns, values):
+    """
+    Validate the decoded values of a cursor against `order_columns`.
+
+    The values come from the client, so their arity and types are checked before they reach
+    SQL: a tampered cursor raises ValueError (a 400 for the routes) instead of a database
+    error. Ordering columns are never NULL, so None is rejected too.
+    """
+    if not isinstance(values, list) or len(values) != len(order_columns):
+        raise ValueError("Invalid cursor")
+    return [_check_value(expression, value) for (expression, _), value in zip(order_columns, values)]
+
+
+def keyset_predicate(order_columns, values):
+    """
+    Build the "rows after `values`" predicate for an ordering.
+
+    `order_columns` is a list of (expression, descending) pairs and `values` must already
+    have gone through `check_cursor_values`. When every column goes in
+    the same direction a row-value comparison is used, which PostgreSQL can answer with
+    a matching composite index; mixed directions fall back to the expanded OR form.
+    """
+    directions = {descending for _, descending in order_columns}
+    expressions = [expression for expression, _ in order_columns]
+
+    if len(directions) == 1:
+        if directions.pop():
+            return tuple_(*expressions) < tuple_(*values)
+        return tuple_(*expressions) > tuple_(*values)
+
+    clauses = []
+    for i, (expression, descending) in enumerate(order_columns):
+        equal = [expressions[j] == values[j] for j in range(i)]
+        after = expression < values[i] if descending else expression > values[i]
+        clauses.append(and_(*equal, after))
+    return or_(*clauses)
+
+
+def keyset_page(query, order_columns, after_values, per_page):
+    """
+    Fetch one page of `query` ordered by `order_columns`, starting after `after_values`.
+
+    Raises ValueError when `after_values` does not match the ordering (see `check_cursor_values`).
+    Returns (items, next_values): the entities of the page and the ordering values of its
+    last row, or None when there are no more rows. No OFFSET and no COUNT are issued;
+    one extra row is fetched to know whether another page exists.
+    """
+    if after_values is not None:
+        after_values = check_cursor_values(order_columns, after_values)
+        query = query.filter(keyset_predicate(order_columns, after_values))
+
+    ordering = [expression.desc() if descending else expression.asc() for expression, descending in order_columns]
+    rows = (
+        query
+        .add_columns(*[expression for expression, _ in order_columns])
+        .order_by(None)
+        .order_by(*ordering)
+        .limit(per_page + 1)
+        .all()
+    )
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    items = [row[0] for row in rows]
+    next_values = list(rows[-1][1:]) if has_more else None
+    return items, next_values
@@ -0,0 +1,194 @@
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, update, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from ..database import db
+from ..models.outbox_eventos import OutboxEventos
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+EVENTOS_POR_LOTE = 50
+MAX_INTENTOS = 10
+# Un evento reclamado y no resuelto en este tiempo (worker caído) vuelve a estar disponible
+LEASE_SECONDS = 300
+BACKOFF_MAX_SECONDS = 15 * 60
+RETENCION_PROCESADOS = timedelta(days=7)
+_SESSION_KEY = 'outbox_pendiente'
+
+_manejadores = {}
+_despertar = threading.Event()
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def manejador_outbox(tipo):
+    """Registrar la función que ejecuta los eventos de `tipo`; recibe el payload del evento."""
+    def registrar(funcion):
+        _manejadores[tipo] = funcion
+        return funcion
+    return registrar
+
+
+def encolar_evento(tipo, payload, clave=None):
+    """
+    Registrar un evento en la transacción actual; se procesa después del commit.
+
+    Con `clave`, un evento con la misma clave ya registrado no se duplica. Devuelve False si
+    el evento ya existía.
+    """
+    if clave is None:
+        db.session.add(OutboxEventos(tipo=tipo, payload=payload))
+    else:
+        nuevo = db.session.execute(
+            insert(OutboxEventos)
+            .values(tipo=tipo, payload=payload, clave=clave)
+            .on_conflict_do_nothing(index_elements=[OutboxEventos.clave])
+            .returning(OutboxEventos.evento_id)
+        ).scalar()
+        if nuevo is None:
+            return False
+    db.session.info[_SESSION_KEY] = True
+    return True
+
+
+@event.listens_for(Session, "after_commit")
+def _despertar_despues_del_commit(session):
+    if session.info.pop(_SESSION_KEY, None):
+        _despertar.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _descartar_despues_del_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def _espera_reintento(intentos):
+    return random.uniform(0.5, 1.0) * min(BACKOFF_MAX_SECONDS, 2 ** intentos)
+
+
+def procesar_outbox(lote=EVENTOS_POR_LOTE):
+    """
+    Ejecutar un lote de eventos pendientes; devuelve cuántos se completaron.
+
+    Los eventos se reclaman en una transacción corta (FOR UPDATE SKIP LOCKED, así varios
+    workers no toman los mismos) y se ejecutan fuera de ella. Un evento que falla vuelve a
+    estar disponible con backoff exponencial con jitter; tras MAX_INTENTOS se deja de intentar.
+    """
+    ahora = datetime.utcnow()
+    pendientes = (
+        select(OutboxEventos.evento_id)
+        .where(
+            OutboxEventos.procesado_en.is_(None),
+            OutboxEventos.disponible_en <= ahora,
+            OutboxEventos.intentos < MAX_INTENTOS
+        )
+        .order_by(OutboxEventos.disponible_en, OutboxEventos.evento_id)
+        .limit(lote)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    try:
+        eventos = db.session.execute(
+            update(OutboxEventos)
+            .where(OutboxEventos.evento_id.in_(pendientes))
+            .values(
+                intentos=OutboxEventos.intentos + 1,
+                disponible_en=ahora + timedelta(seconds=LEASE_SECONDS)
+            )
+            .returning(OutboxEventos.evento_id, OutboxEventos.tipo, OutboxEventos.payload, OutboxEventos.intentos)
+            .execution_options(synchronize_session=False)
+        ).all()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    if not eventos:
+        return 0
+
+    completados = []
+    fallidos = {}
+    for evento in eventos:
+        manejador = _manejadores.get(evento.tipo)
+        try:
+            if manejador is None:
+                raise LookupError(f"No hay manejador para eventos '{evento.tipo}'")
+            manejador(evento.payload)
+            completados.append(evento.evento_id)
+        except Exception as e:
+            fallidos[evento.evento_id] = (evento.intentos, str(e)[:1000])
+            nivel = logging.ERROR if evento.intentos >= MAX_INTENTOS else logging.WARNING
+            logger.log(nivel, f"Evento {evento.evento_id} ({evento.tipo}) falló en el intento {evento.intentos}: {e}")
+
+    ahora = datetime.utcnow()
+    try:
+        if completados:
+            db.session.execute(
+                update(OutboxEventos)
+                .where(OutboxEventos.evento_id.in_(completados))
+                .values(procesado_en=ahora, ultimo_error=None)
+                .execution_options(synchronize_session=False)
+            )
+        for evento_id, (intentos, error) in fallidos.items():
+            db.session.execute(
+                update(OutboxEventos)
+                .where(OutboxEventos.evento_id == evento_id)
+                .values(disponible_en=ahora + timedelta(seconds=_espera_reintento(intentos)), ultimo_error=error)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(completados)
+
+
+def purgar_outbox(retencion=RETENCION_PROCESADOS):
+    """Borrar los eventos procesados hace más de `retencion`."""
+    try:
+        borrados = db.session.execute(
+            delete(OutboxEventos).where(OutboxEventos.procesado_en < datetime.utcnow() - retencion)
+        ).rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return borrados
+
+
+def init_outbox(app, intervalo=OUTBOX_POLL_SECONDS):
+    """
+    Procesar el outbox en un hilo del proceso: justo después de cada commit que registra
+    eventos y, además, cada `intervalo` segundos para los reintentos (0 lo desactiva).
+    """
+    global _scheduler
+    if intervalo <= 0:
+        return None
+
+    def procesar_periodicamente():
+        ultima_purga = 0.0
+        while True:
+            _despertar.wait(intervalo)
+            _despertar.clear()
+            with app.app_context():
+                try:
+                    while procesar_outbox() == EVENTOS_POR_LOTE:
+                        pass
+                    if time.monotonic() - ultima_purga > 3600:
+                        purgar_outbox()
+                        ultima_purga = time.monotonic()
+                except Exception as e:
+                    logger.error(f"No se pudo procesar el outbox: {e}")
+                finally:
+                    db.session.remove()
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = threading.Thread(target=procesar_periodicamente, name="outbox", daemon=True)
+            _scheduler.start()
+    return _scheduler
@@ -0,0 +1,268 @@
+import json
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+import click
+from sqlalchemy import text
+from ..database import db
+from .capturas import ESTADO_ESPERANDO_PAGO, ESTADO_PAGADO
+from .paypal_token import paypal_request
+
+logger = logging.getLogger(__name__)
+
+# PayPal's transaction search accepts at most 31 days per request and 500 rows per page
+SEARCH_WINDOW = timedelta(days=31)
+PAGE_SIZE = 500
+# Transactions can take up to three hours to show up in the search API
+SEARCH_LAG = timedelta(hours=3)
+# Captures are searched this much beyond the pedido window (fecha_pago is stored in UTC-5)
+WINDOW_MARGIN = timedelta(days=1)
+INSERT_BATCH = 1000
+REPORT_BATCH = 1000
+
+MISSING_ORDER = "missing_order"
+ORDER_NOT_PAID = "order_not_paid"
+CAPTURE_NOT_COMPLETED = "capture_not_completed"
+NET_AMOUNT_MISMATCH = "net_amount_mismatch"
+MISSING_CAPTURE = "missing_capture"
+
+
+def _paypal_date(value):
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S-0000")
+
+
+def fetch_transactions_page(start, end, page, page_size=PAGE_SIZE):
+    """One page of GET /v1/reporting/transactions (transaction_info only)."""
+    response = paypal_request("GET", "/v1/reporting/transactions", params={
+        "start_date": _paypal_date(start),
+        "end_date": _paypal_date(end),
+        "fields": "transaction_info",
+        "page_size": page_size,
+        "page": page
+    })
+    return response.json()
+
+
+def iter_paypal_captures(start, end, fetch_page=fetch_transactions_page):
+    """
+    Yield the payments received between `start` and `end` as dicts
+    (transaction_id, status, net, date), one PayPal page in memory at a time.
+
+    Only T00xx event codes (payments) with a positive amount are kept; refunds and
+    other balance movements are not reconciled against pedidos.
+    """
+    window_start = start
+    while window_start < end:
+        window_end = min(window_start + SEARCH_WINDOW, end)
+        page = 1
+        while True:
+            body = fetch_page(window_start, window_end, page)
+            for detail in body.get("transaction_details", []):
+                info = detail.get("transaction_info", {})
+                amount = Decimal((info.get("transaction_amount") or {}).get("value", "0"))
+                if not info.get("transaction_event_code", "").startswith("T00") or amount <= 0:
+                    continue
+                fee = Decimal((info.get("fee_amount") or {}).get("value", "0"))
+                yield {
+                    "transaction_id": info["transaction_id"],
+                    "status": info.get("transaction_status"),
+                    "net": amount + fee,  # fee_amount is negative
+                    "date": info.get("transaction_initiation_date")
+                }
+            if page >= body.get("total_pages", 0):
+                break
+            page += 1
+        window_start = window_end
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reconcile_paypal(start, end, fetch_page=fetch_transactions_page):
+    """
+    Join PayPal captures against pedidos and yield one dict per discrepancy.
+
+    The capture stream is copied in batches into a temporary table and joined in Postgres
+    (pedidos.pago_id holds the capture id), so memory stays bounded by the batch sizes
+    whatever the number of transactions. Discrepancies:
+      - missing_order: successful capture with no pedido
+      - order_not_paid: capture whose pedido is still waiting for payment
+      - capture_not_completed: pedido recorded as paid but the capture is not successful
+      - net_amount_mismatch: ingreso_neto differs from PayPal's amount minus fee
+      - missing_capture: pedido in estado 4 paid in [start, end) with no PayPal capture
+    Everything runs in one transaction that is rolled back at the end.
+    """
+    try:
+        db.session.execute(text(
+            "CREATE TEMP TABLE paypal_capturas ("
+            " transaction_id varchar(64) PRIMARY KEY, status varchar(1), neto numeric(10, 2), fecha varchar(40)"
+            ") ON COMMIT DROP"
+        ))
+        insert = text(
+            "INSERT INTO paypal_capturas (transaction_id, status, neto, fecha) "
+            "VALUES (:transaction_id, :status, :net, :date) ON CONFLICT DO NOTHING"
+        )
+        read = 0
+        captures = iter_paypal_captures(start - WINDOW_MARGIN, end + WINDOW_MARGIN, fetch_page)
+        for batch in _batches(captures, INSERT_BATCH):
+            db.session.execute(insert, batch)
+            read += len(batch)
+        logger.info(f"{read} PayPal captures loaded for reconciliation")
+        db.session.execute(text("ANALYZE paypal_capturas"))
+
+        rows = db.session.execute(
+            text(
+                "SELECT c.transaction_id, c.status, c.neto, c.fecha, p.pedido_id, p.estado_pedido_id, p.ingreso_neto "
+                "FROM paypal_capturas c LEFT JOIN pedidos p ON p.pago_id = c.transaction_id "
+                "WHERE (p.pedido_id IS NULL AND c.status = 'S') "
+                "   OR p.estado_pedido_id = :esperando_pago "
+                "   OR (p.pedido_id IS NOT NULL AND c.status <> 'S') "
+                "   OR (p.pedido_id IS NOT NULL AND p.ingreso_neto IS DISTINCT FROM c.neto) "
+                "UNION ALL "
+                "SELECT p.pago_id, NULL, NULL, NULL, p.pedido_id, p.estado_pedido_id, p.ingreso_neto "
+                "FROM pedidos p "
+                "WHERE p.estado_pedido_id = :pagado AND p.fecha_pago >= :start AND p.fecha_pago < :end "
+                "  AND NOT EXISTS (SELECT 1 FROM paypal_capturas c WHERE c.transaction_id = p.pago_id)"
+            ).execution_options(yield_per=REPORT_BATCH),
+            {
+                "esperando_pago": ESTADO_ESPERANDO_PAGO,
+                "pagado": ESTADO_PAGADO,
+                "start": start.replace(tzinfo=None),
+                "end": end.replace(tzinfo=None)
+            }
+        )
+        for row in rows:
+            if row.status is None:
+                kind = MISSING_CAPTURE
+            elif row.pedido_id is None:
+                kind = MISSING_ORDER
+            elif row.estado_pedido_id == ESTADO_ESPERANDO_PAGO:
+                kind = ORDER_NOT_PAID
+            elif row.status != "S":
+                kind = CAPTURE_NOT_COMPLETED
+            else:
+                kind = NET_AMOUNT_MISMATCH
+            yield {
+                "type": kind,
+                "transaction_id": row.transaction_id,
+                "paypal_status": row.status,
+                "paypal_net": str(row.neto) if row.neto is not None else None,
+                "paypal_date": row.fecha,
+                "pedido_id": row.pedido_id,
+                "estado_pedido_id": row.estado_pedido_id,
+                "ingreso_neto": str(row.ingreso_neto) if row.ingreso_neto is not None else None
+            }
+    finally:
+        db.session.rollback()
+
+
+class LocalPayPalTransactions:
+    """
+    Stand-in for PayPal's transaction search, for local runs of the reconciliation.
+
+    Serves the paid pedidos of the database as PayPal captures, one page per query (OFFSET
+    over pedido_id, nothing is kept in memory), with known discrepancies: every
+    `omit_every`-th pedido is left out, every `mismatch_every`-th one has its net amount off
+    by one cent, and `extra` synthetic captures without a pedido are appended to each window.
+    Use `fetch_page` in place of fetch_transactions_page.
+    """
+
+    def __init__(self, omit_every=50, mismatch_every=40, extra=0, page_size=PAGE_SIZE):
+        self.omit_every = omit_every
+        self.mismatch_every = mismatch_every
+        self.extra = extra
+        self.page_size = page_size
+
+    def _window(self, start, end):
+        return {
+            "start": start.astimezone(timezone.utc).replace(tzinfo=None),
+            "end": end.astimezone(timezone.utc).replace(tzinfo=None),
+            "esperando_pago": ESTADO_ESPERANDO_PAGO
+        }
+
+    def _pedidos_filter(self):
+        return ("FROM pedidos WHERE estado_pedido_id <> :esperando_pago AND pago_id IS NOT NULL "
+                "AND fecha_pago >= :start AND fecha_pago < :end")
+
+    def _capture(self, transaction_id, net, date, status="S"):
+        fee = Decimal("0.50")
+        return {"transaction_info": {
+            "transaction_id": transaction_id,
+            "transaction_event_code": "T0006",
+            "transaction_initiation_date": date,
+            "transaction_amount": {"currency_code": "USD", "value": str(net + fee)},
+            "fee_amount": {"currency_code": "USD", "value": str(-fee)},
+            "transaction_status": status
+        }}
+
+    def fetch_page(self, start, end, page, page_size=None):
+        page_size = page_size or self.page_size
+        params = self._window(start, end)
+        total_pedidos = db.session.execute(text(f"SELECT count(*) {self._pedidos_filter()}"), params).scalar()
+        total = total_pedidos + self.extra
+        first = (page - 1) * page_size
+        last = min(first + page_size, total)
+
+        details = []
+        if first < total_pedidos:
+            rows = db.session.execute(
+                text(f"SELECT pedido_id, pago_id, ingreso_neto, fecha_pago {self._pedidos_filter()} "
+                     "ORDER BY pedido_id OFFSET :offset LIMIT :limit"),
+                dict(params, offset=first, limit=min(last, total_pedidos) - first)
+            )
+            for row in rows:
+                if self.omit_every and row.pedido_id % self.omit_every == 0:
+                    continue
+                net = Decimal(row.ingreso_neto or 0)
+                if self.mismatch_every and row.pedido_id % self.mismatch_every == 0:
+                    net += Decimal("0.01")
+                details.append(self._capture(row.pago_id, net, f"{row.fecha_pago:%Y-%m-%dT%H:%M:%S}-0500"))
+        for index in range(max(first, total_pedidos), last):
+            details.append(self._capture(
+                f"LOCAL{start:%Y%m%d}{index - total_pedidos:07d}", Decimal("10.00"), _paypal_date(start)
+            ))
+
+        return {
+            "transaction_details": details,
+            "page": page,
+            "total_items": total,
+            "total_pages": -(-total // page_size)
+        }
+
+
+def init_paypal_reconciliation(app):
+    """Register `flask reconcile-paypal`."""
+
+    @app.cli.command("reconcile-paypal")
+    @click.option("--start", type=click.DateTime(), help="Start of the payment window (UTC). Default: 7 days before --end.")
+    @click.option("--end", type=click.DateTime(), help="End of the payment window (UTC). Default: 3 hours ago.")
+    @click.option("--output", type=click.File("w"), default="-", help="Where to write the report (JSON lines).")
+    @click.option("--local", is_flag=True, help="Use the local PayPal stand-in instead of PayPal.")
+    @click.option("--local-extra", type=int, default=0, help="Synthetic captures without pedido per window (--local).")
+    def reconcile_paypal_command(start, end, output, local, local_extra):
+        """Report discrepancies between PayPal captures and paid pedidos."""
+        end = end.replace(tzinfo=timezone.utc) if end else datetime.now(timezone.utc) - SEARCH_LAG
+        start = start.replace(tzinfo=timezone.utc) if start else end - timedelta(days=7)
+        fetch_page = LocalPayPalTransactions(extra=local_extra).fetch_page if local else fetch_transactions_page
+
+        totals = {}
+        for discrepancy in reconcile_paypal(start, end, fetch_page):
+            output.write(json.dumps(discrepancy) + "\n")
+            totals[discrepancy["type"]] = totals.get(discrepancy["type"], 0) + 1
+
+        click.echo(f"PayPal reconciliation {start:%Y-%m-%d %H:%M} -> {end:%Y-%m-%d %H:%M} UTC", err=True)
+        for kind in (MISSING_ORDER, ORDER_NOT_PAID, CAPTURE_NOT_COMPLETED, NET_AMOUNT_MISMATCH, MISSING_CAPTURE):
+            click.echo(f"  {kind}: {totals.get(kind, 0)}", err=True)
+        if totals:
+            sys.exit(1)
+
+    return reconcile_paypal_command
@@ -0,0 +1,149 @@
+import base64
+import logging
+import os
+import threading
+import time
+from .http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+PAYPAL_CLIENT_ID = os.getenv('PAYPAL_CLIENT_ID')
+PAYPAL_CLIENT_SECRET = os.getenv('PAYPAL_CLIENT_SECRET')
+
+# Toggle sandbox vs production as needed.
+# In production, set this based on an env var if you prefer.
+USE_SANDBOX = True
+
+if USE_SANDBOX:
+    PAYPAL_BASE = "https://api-m.sandbox.paypal.com"
+else:
+    PAYPAL_BASE = "https://api-m.paypal.com"
+
+# Renew this many seconds before PayPal's expires_in so a token never expires mid-request
+TOKEN_SAFETY_MARGIN_SECONDS = 300
+
+
+def fetch_paypal_access_token():
+    """
+    Fetch an OAuth2 access token directly from PayPal (client credentials).
+    https://developer.paypal.com/docs/api/get-an-access-token-curl/
+
+    Returns (access_token, expires_in_seconds).
+    """
+    url = f"{PAYPAL_BASE}/v1/oauth2/token"
+    auth_header = base64.b64encode(
+        f"{PAYPAL_CLIENT_ID}:{PAYPAL_CLIENT_SECRET}".encode("utf-8")
+    ).decode("utf-8")
+
+    headers = {
+        "Authorization": f"Basic {auth_header}",
+        "Content-Type": "application/x-www-form-urlencoded",
+    }
+    data = {"grant_type": "client_credentials"}
+
+    # Asking for a new token has no side effects, so it is safe to retry
+    response = http_client.post("paypal", url, headers=headers, data=data, idempotente=True)
+    response.raise_for_status()  # raise HTTPError if 4xx/5xx
+    token_info = response.json()
+    return token_info["access_token"], int(token_info.get("expires_in", 0))
+
+
+class PayPalTokenCache:
+    """
+    Process-wide cache for the PayPal OAuth access token.
+
+    The token is reused until `expires_in` minus a safety margin. When it has to be renewed
+    only one thread calls PayPal; the others block on the refresh lock and then reuse the
+    token it obtained. `invalidate(token)` is used after a 401 so the next `get()` refreshes,
+    unless another thread already replaced that token.
+    """
+
+    def __init__(self, fetch=fetch_paypal_access_token, safety_margin=TOKEN_SAFETY_MARGIN_SECONDS):
+        self.fetch = fetch
+        self.safety_margin = safety_margin
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0.0
+        self.hits = 0
+        self.fetches = 0
+        self.fetch_failures = 0
+        self.invalidations = 0
+
+    def _valid_token(self):
+        with self._lock:
+            if self._token is not None and time.monotonic() < self._expires_at:
+                self.hits += 1
+                return self._token
+            return None
+
+    def get(self):
+        token = self._valid_token()
+        if token is not None:
+            return token
+
+        with self._refresh_lock:
+            # Another thread may have refreshed while this one waited for the lock
+            token = self._valid_token()
+            if token is not None:
+                return token
+
+            try:
+                token, expires_in = self.fetch()
+            except Exception:
+                with self._lock:
+                    self.fetch_failures += 1
+                raise
+
+            # Short-lived tokens still get reused, just for less time
+            margin = min(self.safety_margin, expires_in // 2)
+            with self._lock:
+                self.fetches += 1
+                self._token = token
+                self._expires_at = time.monotonic() + expires_in - margin
+            logger.info(f"PayPal access token refreshed, valid for {expires_in - margin}s")
+            return token
+
+    def invalidate(self, token=None):
+        """Drop the cached token; with `token`, only if it is still the cached one."""
+        with self._lock:
+            if token is not None and token != self._token:
+                return
+            self.invalidations += 1
+            self._token = None
+            self._expires_at = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "cached": self._token is not None,
+                "expires_in_seconds": max(0, int(self._expires_at - time.monotonic())) if self._token else 0,
+                "hits": self.hits,
+                "fetches": self.fetches,
+                "fetch_failures": self.fetch_failures,
+                "invalidations": self.invalidations
+            }
+
+
+paypal_token_cache = PayPalTokenCache()
+
+
+def paypal_request(method, path, **kwargs):
+    """
+    Call the PayPal REST API with the cached bearer token.
+
+    A 401 means PayPal no longer accepts the token (revoked or rotated credentials): the token
+    is invalidated and the request retried once with a fresh one.
+    """
+    headers = dict(kwargs.pop("headers", None) or {})
+    url = f"{PAYPAL_BASE}{path}"
+    for attempt in range(2):
+        token = paypal_token_cache.get()
+        headers["Authorization"] = f"Bearer {token}"
+        response = http_client.request("paypal", method, url, headers=headers, **kwargs)
+        if response.status_code != 401 or attempt:
+            break
+        logger.warning(f"PayPal rejected the access token for {method} {path}; refreshing and retrying")
+        paypal_token_cache.invalidate(token)
+    response.raise_for_status()  # raise HTTPError if 4xx/5xx
+    return response
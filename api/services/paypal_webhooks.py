@@ -0,0 +1,267 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+from ..database import db
+from ..models.pedidos import Pedidos
+from ..models.pedidos_usuario import PedidosUsuario
+from ..models.usuarios import Usuarios
+from .capturas import CaptureError, ESTADO_ESPERANDO_PAGO, registrar_captura
+from .http_client import http_client
+from .outbox import encolar_evento, manejador_outbox
+
+logger = logging.getLogger(__name__)
+
+PAYPAL_WEBHOOK_ID = os.getenv("PAYPAL_WEBHOOK_ID")
+CAPTURE_COMPLETED = "PAYMENT.CAPTURE.COMPLETED"
+CAPTURE_DENIED = "PAYMENT.CAPTURE.DENIED"
+SUPPORTED_EVENTS = frozenset({CAPTURE_COMPLETED, CAPTURE_DENIED})
+EVENTO_WEBHOOK_PAYPAL = 'paypal.webhook'
+# PayPal only publishes its signing certificates on these hosts
+CERT_HOSTS = frozenset({"api.paypal.com", "api.sandbox.paypal.com", "api-m.paypal.com", "api-m.sandbox.paypal.com"})
+CERT_CACHE_SECONDS = 24 * 3600
+
+
+class WebhookVerificationError(Exception):
+    """The webhook could not be authenticated as coming from PayPal."""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class PayPalCertCache:
+    """
+    In-memory cache of PayPal webhook signing certificates, keyed by PAYPAL-CERT-URL.
+
+    A certificate is downloaded once and reused until CERT_CACHE_SECONDS pass or it expires,
+    so verifying a webhook normally costs no network call. Only PayPal hosts over HTTPS are
+    accepted as certificate URLs.
+    """
+
+    def __init__(self, fetch=None, ttl_seconds=CERT_CACHE_SECONDS, max_entries=20):
+        self.fetch = fetch or self._download
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.fetches = 0
+
+    def public_key(self, cert_url):
+        url = urlparse(cert_url or "")
+        if url.scheme != "https" or url.hostname not in CERT_HOSTS:
+            raise WebhookVerificationError(f"Untrusted certificate URL: {cert_url}")
+
+        key = self._cached(cert_url)
+        if key is not None:
+            return key
+        with self._fetch_lock:
+            key = self._cached(cert_url)
+            if key is not None:
+                return key
+            cert = x509.load_pem_x509_certificate(self.fetch(cert_url))
+            now = datetime.now(timezone.utc)
+            if not cert.not_valid_before_utc <= now < cert.not_valid_after_utc:
+                raise WebhookVerificationError("PayPal certificate is not currently valid")
+            vence = time.monotonic() + min(self.ttl_seconds, (cert.not_valid_after_utc - now).total_seconds())
+            with self._lock:
+                self.fetches += 1
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[cert_url] = (cert.public_key(), vence)
+            return cert.public_key()
+
+    def _cached(self, cert_url):
+        with self._lock:
+            entrada = self._entries.get(cert_url)
+            if entrada is not None and entrada[1] > time.monotonic():
+                self.hits += 1
+                return entrada[0]
+            return None
+
+    @staticmethod
+    def _download(cert_url):
+        response = http_client.get("paypal", cert_url)
+        response.raise_for_status()
+        return response.content
+
+    def stats(self):
+        with self._lock:
+            return {"certificates": len(self._entries), "hits": self.hits, "fetches": self.fetches}
+
+
+def verify_webhook_signature(headers, raw_body, webhook_id=None, certs=None):
+    """
+    Verify a PayPal webhook locally (no call to /v1/notifications/verify-webhook-signature).
+
+    PayPal signs "<transmission id>|<transmission time>|<webhook id>|<crc32 of the raw body>"
+    with SHA256withRSA using the certificate published at PAYPAL-CERT-URL.
+    """
+    webhook_id = webhook_id or PAYPAL_WEBHOOK_ID
+    certs = certs or paypal_cert_cache
+    if not webhook_id:
+        raise WebhookVerificationError("PAYPAL_WEBHOOK_ID is not configured")
+
+    transmission_id = headers.get("PAYPAL-TRANSMISSION-ID")
+    transmission_time = headers.get("PAYPAL-TRANSMISSION-TIME")
+    signature = headers.get("PAYPAL-TRANSMISSION-SIG")
+    if not transmission_id or not transmission_time or not signature:
+        raise WebhookVerificationError("Missing PayPal transmission headers")
+    if headers.get("PAYPAL-AUTH-ALGO", "SHA256withRSA") != "SHA256withRSA":
+        raise WebhookVerificationError(f"Unsupported signature algorithm: {headers.get('PAYPAL-AUTH-ALGO')}")
+
+    public_key = certs.public_key(headers.get("PAYPAL-CERT-URL"))
+    message = f"{transmission_id}|{transmission_time}|{webhook_id}|{zlib.crc32(raw_body)}"
+    try:
+        public_key.verify(base64.b64decode(signature), message.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256())
+    except (InvalidSignature, ValueError):
+        raise WebhookVerificationError("Invalid PayPal webhook signature")
+
+
+def accept_webhook_event(event):
+    """
+    Queue a verified webhook event in the outbox (current transaction) and return whether it
+    was new. PayPal redeliveries of the same event id are not queued twice.
+    """
+    return encolar_evento(EVENTO_WEBHOOK_PAYPAL, event, clave=f"paypal:{event['id']}")
+
+
+def _pedido_del_evento(resource):
+    # create_order sends the pedido_id as the purchase unit custom_id
+    custom_id = str(resource.get("custom_id") or "")
+    return int(custom_id) if custom_id.isdigit() else None
+
+
+@manejador_outbox(EVENTO_WEBHOOK_PAYPAL)
+def process_webhook_event(event):
+    """
+    Apply a PayPal webhook to its pedido. Idempotent: a capture that the browser flow (or an
+    earlier delivery) already recorded changes nothing.
+    """
+    resource = event.get("resource") or {}
+    pedido_id = _pedido_del_evento(resource)
+    if pedido_id is None:
+        logger.warning(f"PayPal event {event.get('id')} has no pedido custom_id; ignored")
+        return
+
+    try:
+        if event.get("event_type") == CAPTURE_COMPLETED:
+            firebase_uid = (
+                db.session.query(Usuarios.firebase_uid)
+                .join(PedidosUsuario, PedidosUsuario.usuario_id == Usuarios.usuario_id)
+                .filter(PedidosUsuario.pedido_id == pedido_id)
+                .scalar()
+            )
+            order_id = ((resource.get("supplementary_data") or {}).get("related_ids") or {}).get("order_id")
+            # Same shape as the /capture response so the stored details stay uniform
+            captured_data = {
+                "id": order_id,
+                "status": "COMPLETED",
+                "purchase_units": [{"custom_id": str(pedido_id), "payments": {"captures": [resource]}}]
+            }
+            registrar_captura(pedido_id, firebase_uid, captured_data)
+        elif event.get("event_type") == CAPTURE_DENIED:
+            pedido = Pedidos.query.filter_by(pedido_id=pedido_id).with_for_update().first()
+            if pedido is not None and pedido.estado_pedido_id == ESTADO_ESPERANDO_PAGO:
+                # The order stays waiting for payment; support can see the denied capture
+                pedido.paypal_capture_id = resource.get("id")
+                pedido.paypal_status = "DENIED"
+        db.session.commit()
+    except CaptureError as e:
+        # Not retryable (e.g. pedido already paid with another capture)
+        db.session.rollback()
+        logger.warning(f"PayPal event {event.get('id')} for pedido {pedido_id} not applied: {e.message}")
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+class LocalPayPalWebhooks:
+    """
+    Stand-in for PayPal webhook delivery, for local development and tests.
+
+    Holds its own RSA key and self-signed certificate, builds PAYMENT.CAPTURE.* events and
+    signs them exactly as PayPal does. Use `cert_fetcher` as the PayPalCertCache fetch
+    function (PAYPAL_WEBHOOK_BACKEND=local does it for the process-wide cache) and send the
+    events with `deliver(client, event)` to a Flask test client or `requests`-like session.
+    """
+
+    CERT_URL = "https://api.sandbox.paypal.com/v1/notifications/certs/CERT-LOCAL-STANDIN"
+
+    def __init__(self, webhook_id=None):
+        self.webhook_id = webhook_id or PAYPAL_WEBHOOK_ID or "WH-LOCAL-STANDIN"
+        self._key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        nombre = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "messageverificationcerts.sandbox.paypal.com")])
+        ahora = datetime.now(timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(nombre)
+            .issuer_name(nombre)
+            .public_key(self._key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(ahora - timedelta(minutes=5))
+            .not_valid_after(ahora + timedelta(days=1))
+            .sign(self._key, hashes.SHA256())
+        )
+        self._cert_pem = cert.public_bytes(serialization.Encoding.PEM)
+
+    def cert_fetcher(self, cert_url):
+        return self._cert_pem
+
+    def capture_event(self, pedido_id, event_type=CAPTURE_COMPLETED, amount="10.00", capture_id=None, order_id=None):
+        capture_id = capture_id or uuid.uuid4().hex[:17].upper()
+        return {
+            "id": f"WH-{uuid.uuid4().hex[:20].upper()}",
+            "event_type": event_type,
+            "resource_type": "capture",
+            "create_time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "resource": {
+                "id": capture_id,
+                "status": "COMPLETED" if event_type == CAPTURE_COMPLETED else "DECLINED",
+                "amount": {"currency_code": "USD", "value": amount},
+                "custom_id": str(pedido_id),
+                "create_time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "seller_receivable_breakdown": {"net_amount": {"currency_code": "USD", "value": amount}},
+                "supplementary_data": {"related_ids": {"order_id": order_id or uuid.uuid4().hex[:17].upper()}}
+            }
+        }
+
+    def sign(self, raw_body):
+        transmission_id = str(uuid.uuid4())
+        transmission_time = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        message = f"{transmission_id}|{transmission_time}|{self.webhook_id}|{zlib.crc32(raw_body)}"
+        signature = self._key.sign(message.encode("utf-8"), padding.PKCS1v15(), hashes.SHA256())
+        return {
+            "Content-Type": "application/json",
+            "PAYPAL-TRANSMISSION-ID": transmission_id,
+            "PAYPAL-TRANSMISSION-TIME": transmission_time,
+            "PAYPAL-TRANSMISSION-SIG": base64.b64encode(signature).decode("ascii"),
+            "PAYPAL-CERT-URL": self.CERT_URL,
+            "PAYPAL-AUTH-ALGO": "SHA256withRSA"
+        }
+
+    def deliver(self, client, event, url="/api/paypal/webhook"):
+        raw_body = json.dumps(event).encode("utf-8")
+        return client.post(url, data=raw_body, headers=self.sign(raw_body))
+
+
+if os.getenv("PAYPAL_WEBHOOK_BACKEND") == "local":
+    local_paypal_webhooks = LocalPayPalWebhooks()
+    PAYPAL_WEBHOOK_ID = local_paypal_webhooks.webhook_id
+    paypal_cert_cache = PayPalCertCache(fetch=local_paypal_webhooks.cert_fetcher)
+else:
+    local_paypal_webhooks = None
+    paypal_cert_cache = PayPalCertCache()
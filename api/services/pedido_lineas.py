@@ -0,0 +1,94 @@
+from sqlalchemy import insert, select, tuple_
+from ..database import db
+from ..models.productos_pedidos import ProductosPedidos
+from ..models.imagenes_ranpulamps import ImagenesRanpulamps
+
+MAX_IMAGENES_RANPULAMP = 4
+
+
+def lineas_desde_carrito(cart_items, con_color=True):
+    """
+    Convertir los items del carrito de Firebase en líneas de pedido.
+
+    Cada línea es {"producto_id", "color_id", "cantidad", "imagenes"}; las imágenes recortadas
+    solo se guardan para productos tipo 'ranpulamp' (máximo 4).
+    """
+    lineas = []
+    for item in cart_items:
+        color = item.get('color') if con_color else None
+        imagenes = (item.get('croppedImages') or []) if item.get('productType') == 'ranpulamp' else []
+        lineas.append({
+            "producto_id": item.get('databaseProductId'),
+            "color_id": color['color_id'] if color and 'color_id' in color else None,
+            "cantidad": item.get('quantity'),
+            "imagenes": list(imagenes)[:MAX_IMAGENES_RANPULAMP]
+        })
+    return lineas
+
+
+def lineas_de_pedidos(pedidos):
+    """
+    Filtro de productos_pedidos para las líneas de `pedidos` (objetos o filas con pedido_id y
+    fecha_creacion). Incluye la clave de partición, así Postgres solo recorre los meses de esos pedidos.
+    """
+    return tuple_(ProductosPedidos.pedido_id, ProductosPedidos.fecha_pedido).in_(
+        [(pedido.pedido_id, pedido.fecha_creacion) for pedido in pedidos]
+    )
+
+
+def insertar_lineas_pedido(pedido, lineas):
+    """
+    Insertar las líneas de un pedido y sus imágenes de ranpulamp con dos sentencias.
+
+    Las líneas se insertan con un INSERT multi-fila ... RETURNING (en el mismo orden que
+    `lineas`), así que no hace falta un flush por línea para conocer su producto_pedido_id.
+    Líneas e imágenes llevan la fecha_creacion del pedido como clave de partición.
+    Devuelve los producto_pedido_id creados.
+    """
+    if not lineas:
+        return []
+    fecha_pedido = pedido.fecha_creacion
+
+    producto_pedido_ids = db.session.scalars(
+        insert(ProductosPedidos).returning(ProductosPedidos.producto_pedido_id, sort_by_parameter_order=True),
+        [
+            {
+                "pedido_id": pedido.pedido_id,
+                "fecha_pedido": fecha_pedido,
+                "producto_id": linea["producto_id"],
+                "color_id": linea["color_id"],
+                "cantidad": linea["cantidad"]
+            }
+            for linea in lineas
+        ]
+    ).all()
+
+    imagenes = [
+        {"producto_pedido_id": producto_pedido_id, "fecha_pedido": fecha_pedido, "imagen_url": imagen_url}
+        for producto_pedido_id, linea in zip(producto_pedido_ids, lineas)
+        for imagen_url in linea["imagenes"]
+    ]
+    if imagenes:
+        db.session.execute(insert(ImagenesRanpulamps), imagenes)
+
+    return producto_pedido_ids
+
+
+def reemplazar_lineas_pedido(pedido, lineas):
+    """
+    Sustituir todas las líneas de un pedido: elimina las anteriores (con sus imágenes de
+    ranpulamp) e inserta las nuevas. Son cuatro sentencias sin importar el tamaño del carrito,
+    y todas se limitan a la partición del mes del pedido.
+    """
+    lineas_anteriores = select(ProductosPedidos.producto_pedido_id).where(
+        ProductosPedidos.pedido_id == pedido.pedido_id, ProductosPedidos.fecha_pedido == pedido.fecha_creacion
+    )
+    ImagenesRanpulamps.query.filter(
+        ImagenesRanpulamps.fecha_pedido == pedido.fecha_creacion,
+        ImagenesRanpulamps.producto_pedido_id.in_(lineas_anteriores)
+    ).delete(synchronize_session=False)
+    ProductosPedidos.query.filter_by(
+        pedido_id=pedido.pedido_id, fecha_pedido=pedido.fecha_creacion
+    ).delete(synchronize_session=False)
+
+    return insertar_lineas_pedido(pedido, lineas)
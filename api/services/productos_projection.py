@@ -0,0 +1,61 @@
+from sqlalchemy.orm import joinedload, selectinload
+from ..models.productos import Productos
+
+# Campos de detalles_productos_ia que algunos endpoints agregan a la respuesta
+DETALLES_IA_CAMPOS_ESCALA = ("scale",)
+DETALLES_IA_CAMPOS_COMPLETOS = ("scale", "obj_downloadable_url", "url_expiring_date")
+
+
+def productos_query():
+    """
+    Query base de productos con la categoría, los tres detalles y las imágenes precargados.
+
+    La categoría y los detalles (relaciones 1:1) se cargan con JOIN en la misma consulta
+    y las imágenes con un único SELECT ... IN, por lo que el número de consultas es fijo
+    sin importar cuántos productos se devuelvan.
+    """
+    return Productos.query.options(
+        joinedload(Productos.categoria_producto),
+        joinedload(Productos.detalles_catalogo),
+        joinedload(Productos.detalles_lamparas_ranpu),
+        joinedload(Productos.detalles_productos_ia),
+        selectinload(Productos.imagenes)
+    )
+
+
+def get_producto_proyectado(producto_id):
+    """Obtener un producto con todas sus relaciones precargadas, o None si no existe."""
+    return productos_query().filter(Productos.producto_id == producto_id).first()
+
+
+def _detalle_dict(producto_id, detalle, campos_extra=()):
+    response = {
+        "producto_id": producto_id,
+        "detalles": detalle.detalles if detalle else None
+    }
+    for campo in campos_extra:
+        response[campo] = getattr(detalle, campo) if detalle else None
+    return response
+
+
+def serializar_producto(producto, campos_detalles_ia=()):
+    """
+    Construir la respuesta JSON de un producto con categoría, detalles e imágenes.
+
+    `campos_detalles_ia` permite agregar columnas extra de detalles_productos_ia
+    (p. ej. la escala) a las que ya se devuelven para todos los endpoints.
+    """
+    producto_id = producto.producto_id
+
+    response = producto.to_dict()
+    response["categoria_producto"] = (
+        producto.categoria_producto.to_dict()
+        if producto.categoria_producto else {"categoria_producto_id": producto.categoria_producto_id, "nombre": None}
+    )
+    response["detalles_catalogo"] = _detalle_dict(producto_id, producto.detalles_catalogo)
+    response["detalles_lamparas_ranpu"] = _detalle_dict(producto_id, producto.detalles_lamparas_ranpu)
+    response["detalles_productos_ia"] = _detalle_dict(
+        producto_id, producto.detalles_productos_ia, campos_detalles_ia
+    )
+    response["imagenes"] = [imagen.to_dict() for imagen in producto.imagenes]
+    return response
@@ -0,0 +1,49 @@
+from datetime import timedelta
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from ..database import db
+from ..models.modelos import Modelos
+from ..models.productos import Productos
+from ..models.resumen_modelos_productos import ResumenModelosProductos
+
+
+def recalcular_resumen_modelos(*producto_ids):
+    """
+    Recalcular en la transacción actual los agregados de modelos de los productos indicados.
+
+    Se llama después de crear, modificar o eliminar un modelo y antes del commit, de modo que
+    el resumen se confirma (o se revierte) junto con el cambio. La fila del producto se bloquea
+    con FOR UPDATE para que dos cambios concurrentes sobre el mismo producto se serialicen y
+    el segundo vea los modelos del primero. Los productos sin modelos pierden su resumen.
+    """
+    for producto_id in sorted({int(p) for p in producto_ids if p is not None}):
+        db.session.flush()
+        db.session.query(Productos.producto_id).filter(Productos.producto_id == producto_id).with_for_update().first()
+
+        cantidad, tiempo_total, peso_total, stock_minimo = db.session.query(
+            func.count(Modelos.modelo_id),
+            func.sum(Modelos.tiempo_estimado),
+            func.coalesce(func.sum(Modelos.peso_estimado_gramos), 0),
+            func.min(Modelos.stock)
+        ).filter(Modelos.producto_id == producto_id).one()
+
+        if not cantidad:
+            ResumenModelosProductos.query.filter_by(producto_id=producto_id).delete()
+            continue
+
+        valores = {
+            "cantidad_modelos": cantidad,
+            "tiempo_estimado_total": tiempo_total or timedelta(0),
+            "peso_estimado_gramos_total": peso_total,
+            "stock_minimo": stock_minimo
+        }
+        db.session.execute(
+            insert(ResumenModelosProductos)
+            .values(producto_id=producto_id, **valores)
+            .on_conflict_do_update(index_elements=[ResumenModelosProductos.producto_id], set_=valores)
+        )
+
+
+def get_resumen_modelos(producto_id):
+    """Devolver el resumen de modelos del producto, o None si no tiene modelos."""
+    return db.session.get(ResumenModelosProductos, producto_id)
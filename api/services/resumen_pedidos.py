@@ -0,0 +1,132 @@
+from datetime import datetime
+import pytz
+from sqlalchemy.dialects.postgresql import insert
+from ..database import db
+from ..models.pedidos import Pedidos
+from ..models.pedidos_usuario import PedidosUsuario
+from ..models.productos_pedidos import ProductosPedidos
+from ..models.productos import Productos
+from ..models.imagenes_productos import ImagenesProductos
+from ..models.resumen_pedidos_usuario import ResumenPedidosUsuario
+from .pedido_lineas import lineas_de_pedidos
+
+ECUADOR_TZ = pytz.timezone("America/Guayaquil")
+MONTHS_ES = [
+    "enero", "febrero", "marzo", "abril", "mayo", "junio",
+    "julio", "agosto", "septiembre", "octubre", "noviembre", "diciembre"
+]
+MONTHS_EN = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+
+
+def format_date_spanish(dt: datetime) -> str:
+    """Example output: 15 de noviembre, 2023."""
+    if dt is None:
+        return ""
+
+    # 1) Interpret dt as UTC (attach tzinfo=UTC)
+    dt_utc = dt.replace(tzinfo=pytz.utc)
+    # 2) Convert to Ecuador time (UTC-5)
+    local_dt = dt_utc.astimezone(ECUADOR_TZ)
+
+    day = local_dt.day
+    month = MONTHS_ES[local_dt.month - 1]
+    year = local_dt.year
+    return f"{day} de {month}, {year}"
+
+
+def format_date_english(dt: datetime) -> str:
+    """Example output: November 15, 2023."""
+    if dt is None:
+        return ""
+
+    # 1) Interpret dt as UTC
+    dt_utc = dt.replace(tzinfo=pytz.utc)
+    # 2) Convert to Ecuador time (UTC-5)
+    local_dt = dt_utc.astimezone(ECUADOR_TZ)
+
+    day = local_dt.day
+    month = MONTHS_EN[local_dt.month - 1]
+    year = local_dt.year
+    return f"{month} {day}, {year}"
+
+
+def actualizar_resumen_pedidos(*pedido_ids):
+    """
+    Recalcular en la transacción actual el resumen de "Mis pedidos" de los pedidos indicados.
+
+    Se llama antes del commit cada vez que un pedido se crea, cambia de productos, de estado,
+    de fecha de pago o de usuario. Usa un número fijo de consultas sin importar cuántos pedidos
+    se actualicen. Los pedidos sin usuario asociado (o ya eliminados) pierden su resumen.
+    """
+    pedido_ids = sorted({int(p) for p in pedido_ids if p is not None})
+    if not pedido_ids:
+        return
+    db.session.flush()
+
+    pedidos = (
+        db.session.query(
+            Pedidos.pedido_id,
+            Pedidos.fecha_creacion,
+            Pedidos.estado_pedido_id,
+            db.func.coalesce(Pedidos.fecha_pago, Pedidos.fecha_creacion).label('fecha_efectiva'),
+            PedidosUsuario.usuario_id
+        )
+        .join(PedidosUsuario, PedidosUsuario.pedido_id == Pedidos.pedido_id)
+        .filter(Pedidos.pedido_id.in_(pedido_ids))
+        .all()
+    )
+
+    items_por_pedido = {}
+    items = (
+        db.session.query(ProductosPedidos.pedido_id, ProductosPedidos.producto_id, ProductosPedidos.cantidad, Productos.nombre)
+        .join(Productos, Productos.producto_id == ProductosPedidos.producto_id)
+        .filter(lineas_de_pedidos(pedidos))
+        .order_by(ProductosPedidos.producto_pedido_id)
+    )
+    for item in items:
+        items_por_pedido.setdefault(item.pedido_id, []).append(item)
+
+    # Thumbnail: la imagen marcada como thumbnail del primer producto, o su primera imagen
+    primeros_productos = {lista[0].producto_id for lista in items_por_pedido.values()}
+    thumbnails = {}
+    if primeros_productos:
+        imagenes = (
+            db.session.query(ImagenesProductos.producto_id, ImagenesProductos.ubicacion)
+            .filter(ImagenesProductos.producto_id.in_(primeros_productos))
+            .order_by(ImagenesProductos.is_thumbnail.desc(), ImagenesProductos.imagen_producto_id)
+        )
+        for imagen in imagenes:
+            thumbnails.setdefault(imagen.producto_id, imagen.ubicacion)
+
+    filas = []
+    for pedido in pedidos:
+        if pedido.fecha_efectiva is None:
+            continue
+        lista = items_por_pedido.get(pedido.pedido_id, [])
+        filas.append({
+            "pedido_id": pedido.pedido_id,
+            "usuario_id": pedido.usuario_id,
+            "estado_pedido_id": pedido.estado_pedido_id,
+            "fecha_efectiva": pedido.fecha_efectiva,
+            "fecha_efectiva_es": format_date_spanish(pedido.fecha_efectiva),
+            "fecha_efectiva_en": format_date_english(pedido.fecha_efectiva),
+            "productos_nombres": ", ".join(item.nombre for item in lista),
+            "cantidad_total": sum(item.cantidad for item in lista),
+            "thumbnail": thumbnails.get(lista[0].producto_id) if lista else None
+        })
+
+    vigentes = [fila["pedido_id"] for fila in filas]
+    ResumenPedidosUsuario.query.filter(
+        ResumenPedidosUsuario.pedido_id.in_(pedido_ids),
+        ResumenPedidosUsuario.pedido_id.notin_(vigentes)
+    ).delete(synchronize_session=False)
+
+    if filas:
+        stmt = insert(ResumenPedidosUsuario).values(filas)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[ResumenPedidosUsuario.pedido_id],
+            set_={columna: stmt.excluded[columna] for columna in filas[0] if columna != "pedido_id"}
+        ))
@@ -0,0 +1,85 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlparse, unquote
+from firebase_admin import storage
+
+logger = logging.getLogger(__name__)
+
+# Las URLs se firman por 15 minutos y se reutilizan durante 10, así nunca se entrega una
+# URL a la que le queden menos de 5 minutos de validez
+SIGNED_URL_EXPIRATION = timedelta(minutes=15)
+SIGNED_URL_REUSE_SECONDS = 10 * 60
+MAX_URLS_EN_CACHE = 5000
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="signed-urls")
+
+
+def ruta_objeto(url):
+    """Ruta del objeto dentro del bucket de Firebase Storage a partir de su URL de descarga."""
+    # Decode the path and remove leading "/v0/b/<bucket_name>/o/"
+    return unquote(urlparse(url).path).split('/o/')[-1]
+
+
+class SignedUrlCache:
+    """
+    Caché en memoria de URLs firmadas de Firebase Storage por ruta de objeto.
+
+    `firmar(urls)` devuelve {url_original: url_firmada}; las que no están en caché se firman
+    en paralelo con un pool de hilos compartido, de modo que el tiempo de respuesta no crece
+    con la cantidad de imágenes. Una URL que no se puede firmar se devuelve como None.
+    """
+
+    def __init__(self, reuse_seconds=SIGNED_URL_REUSE_SECONDS, max_entries=MAX_URLS_EN_CACHE):
+        self.reuse_seconds = reuse_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def firmar(self, urls):
+        rutas = {url: ruta_objeto(url) for url in dict.fromkeys(urls) if url}
+        ahora = time.monotonic()
+
+        firmadas = {}
+        with self._lock:
+            for ruta in set(rutas.values()):
+                entrada = self._entries.get(ruta)
+                if entrada is not None and entrada[1] > ahora:
+                    firmadas[ruta] = entrada[0]
+
+        faltantes = sorted(set(rutas.values()) - set(firmadas))
+        if faltantes:
+            bucket = storage.bucket()
+            resultados = _executor.map(lambda ruta: self._firmar_objeto(bucket, ruta), faltantes)
+            nuevas = {ruta: url for ruta, url in zip(faltantes, resultados) if url is not None}
+            firmadas.update(nuevas)
+            self._guardar(nuevas, ahora + self.reuse_seconds)
+
+        return {url: firmadas.get(ruta) for url, ruta in rutas.items()}
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _firmar_objeto(self, bucket, ruta):
+        try:
+            return bucket.blob(ruta).generate_signed_url(expiration=SIGNED_URL_EXPIRATION, method="GET")
+        except Exception as e:
+            logger.error(f"No se pudo firmar la URL de {ruta}: {e}")
+            return None
+
+    def _guardar(self, nuevas, vence):
+        if not nuevas:
+            return
+        with self._lock:
+            self._entries.update((ruta, (url, vence)) for ruta, url in nuevas.items())
+            if len(self._entries) > self.max_entries:
+                # Descartar primero las entradas que vencen antes
+                sobrantes = sorted(self._entries.items(), key=lambda entrada: entrada[1][1])
+                for ruta, _ in sobrantes[:len(self._entries) - self.max_entries]:
+                    del self._entries[ruta]
+
+
+signed_url_cache = SignedUrlCache()
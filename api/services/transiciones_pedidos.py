@@ -0,0 +1,135 @@
+import threading
+import time
+from sqlalchemy import select, update, insert, literal
+from ..database import db
+from ..models.pedidos import Pedidos
+from ..models.estados_pedidos import EstadosPedidos
+from ..models.transiciones_pedidos import TransicionesPedidos
+from .resumen_pedidos import actualizar_resumen_pedidos
+
+MAX_PEDIDOS_POR_TRANSICION = 1000
+
+
+class TransicionError(Exception):
+    """Transición imposible de aplicar; `status_code` es la respuesta HTTP sugerida."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class EstadosGraphCache:
+    """
+    Caché en memoria del grafo de estados de pedidos, construido a partir de EstadosPedidos.orden.
+
+    Un pedido puede avanzar a cualquier estado con `orden` mayor que el actual, o pasar desde un
+    estado con `orden` a uno sin `orden` (p. ej. cancelado). No se retrocede y no se sale de los
+    estados sin `orden`. Las rutas de estados llaman a `invalidate()` después de cada cambio.
+    """
+
+    def __init__(self, ttl_seconds=300):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires_at = 0.0
+
+    def get(self):
+        """Devolver {estado_destino_id: frozenset(estados_origen_permitidos)}."""
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires_at:
+                return self._value
+
+        estados = db.session.query(EstadosPedidos.estado_pedido_id, EstadosPedidos.orden).all()
+        ordenados = [estado for estado in estados if estado.orden is not None]
+        origenes = {}
+        for destino in estados:
+            if destino.orden is None:
+                permitidos = {estado.estado_pedido_id for estado in ordenados}
+            else:
+                permitidos = {estado.estado_pedido_id for estado in ordenados if estado.orden < destino.orden}
+            origenes[destino.estado_pedido_id] = frozenset(permitidos - {destino.estado_pedido_id})
+
+        with self._lock:
+            self._value = origenes
+            self._expires_at = time.monotonic() + self.ttl_seconds
+            return self._value
+
+    def invalidate(self):
+        with self._lock:
+            self._value = None
+            self._expires_at = 0.0
+
+
+estados_graph = EstadosGraphCache()
+
+
+def transicionar_pedidos(pedido_ids, estado_destino_id, usuario=None):
+    """
+    Mover varios pedidos a `estado_destino_id` en la transacción actual.
+
+    Una sola sentencia bloquea los pedidos cuyo estado actual permite la transición, los
+    actualiza y escribe una fila por pedido en transiciones_pedidos. Los pedidos que no existen
+    o cuyo estado no lo permite no se tocan. Devuelve (movidos, rechazados), donde `movidos` es
+    [{"pedido_id", "estado_anterior_id"}] y `rechazados` es {pedido_id: motivo}.
+    """
+    pedido_ids = sorted({int(pedido_id) for pedido_id in pedido_ids})
+    if not pedido_ids:
+        raise TransicionError("pedido_ids no puede estar vacío")
+    if len(pedido_ids) > MAX_PEDIDOS_POR_TRANSICION:
+        raise TransicionError(f"Se pueden mover como máximo {MAX_PEDIDOS_POR_TRANSICION} pedidos por llamada")
+
+    grafo = estados_graph.get()
+    if estado_destino_id not in grafo:
+        raise TransicionError(f"Estado de pedido {estado_destino_id} no encontrado", 404)
+    origenes = grafo[estado_destino_id]
+
+    pedidos = Pedidos.__table__
+    transiciones = TransicionesPedidos.__table__
+    movidos = []
+    if origenes:
+        anteriores = (
+            select(pedidos.c.pedido_id, pedidos.c.estado_pedido_id)
+            .where(pedidos.c.pedido_id.in_(pedido_ids), pedidos.c.estado_pedido_id.in_(sorted(origenes)))
+            .with_for_update()
+            .cte("anteriores")
+        )
+        actualizados = (
+            update(pedidos)
+            .where(pedidos.c.pedido_id == anteriores.c.pedido_id)
+            .values(estado_pedido_id=estado_destino_id)
+            .returning(pedidos.c.pedido_id, anteriores.c.estado_pedido_id.label("estado_anterior_id"))
+            .cte("actualizados")
+        )
+        stmt = insert(transiciones).from_select(
+            ["pedido_id", "estado_anterior_id", "estado_nuevo_id", "usuario"],
+            select(
+                actualizados.c.pedido_id,
+                actualizados.c.estado_anterior_id,
+                literal(estado_destino_id),
+                literal(usuario, transiciones.c.usuario.type)
+            )
+        ).returning(transiciones.c.pedido_id, transiciones.c.estado_anterior_id)
+        movidos = [dict(fila._mapping) for fila in db.session.execute(stmt)]
+
+    rechazados = {}
+    ids_movidos = {fila["pedido_id"] for fila in movidos}
+    pendientes = [pedido_id for pedido_id in pedido_ids if pedido_id not in ids_movidos]
+    if pendientes:
+        actuales = dict(
+            db.session.query(Pedidos.pedido_id, Pedidos.estado_pedido_id).filter(Pedidos.pedido_id.in_(pendientes))
+        )
+        for pedido_id in pendientes:
+            if pedido_id not in actuales:
+                rechazados[pedido_id] = "Pedido no encontrado"
+            else:
+                rechazados[pedido_id] = (
+                    f"No se permite pasar del estado {actuales[pedido_id]} al estado {estado_destino_id}"
+                )
+
+    if movidos:
+        # El UPDATE no pasa por el ORM: los pedidos ya cargados en la sesión deben releerse
+        db.session.expire_all()
+        actualizar_resumen_pedidos(*ids_movidos)
+
+    return movidos, rechazados
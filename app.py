@@ -23,6 +23,12 @@ firebase_admin.initialize_app(cred, {
 #API 
 from api.database import init_db
 from api.swagger import init_swagger
+from api.json_provider import init_json
+from api.services.analytics import init_analytics
+from api.services.archivo_pagos import init_archivo_pagos
+from api.services.outbox import init_outbox
+from api.services.cart_store import init_cart_sync
+from api.services.paypal_reconciliation import init_paypal_reconciliation
 
 #API ROUTES
 from api.routes import (
@@ -41,7 +47,9 @@ from api.routes import (
     paypal_bp,
     firebase_images_bp,
     ai_generation_bp,
-    colors_bp
+    colors_bp,
+    carritos_bp,
+    analytics_bp
 )
 
 app = Flask(__name__)
@@ -51,6 +59,12 @@ CORS(app, resources={r"/*": {"origins": ["https://ranpuoficial.com", "https://ra
 
 init_db(app)
 init_swagger(app)
+init_json(app)
+init_analytics(app)
+init_archivo_pagos(app)
+init_outbox(app)
+init_cart_sync(app)
+init_paypal_reconciliation(app)
 
 #Blueprints for APIs
 app.register_blueprint(usuarios_bp, url_prefix="/api/usuarios")
@@ -69,6 +83,8 @@ app.register_blueprint(paypal_bp, url_prefix="/api/paypal")
 app.register_blueprint(firebase_images_bp, url_prefix="/api/firebase_images")
 app.register_blueprint(ai_generation_bp, url_prefix="/api/ai_generation")
 app.register_blueprint(colors_bp, url_prefix="/api/colores")
+app.register_blueprint(carritos_bp, url_prefix="/api/carritos")
+app.register_blueprint(analytics_bp, url_prefix="/api/analytics")
 
 # # Configuration in production mode
 # app.config.from_object(config['production'])
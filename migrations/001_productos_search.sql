@@ -0,0 +1,23 @@
+-- Búsqueda de texto completo y por trigramas para el catálogo de productos.
+-- search_vector es una columna generada: PostgreSQL la mantiene en cada INSERT/UPDATE.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE productos
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(nombre, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'B')
+    ) STORED;
+
+-- Índices parciales: solo los productos del catálogo (categoría 4), para que los
+-- productos generados por IA no inflen los índices que usa /api/productos/catalog.
+CREATE INDEX IF NOT EXISTS ix_productos_catalogo_search_vector
+    ON productos USING GIN (search_vector)
+    WHERE categoria_producto_id = 4;
+
+CREATE INDEX IF NOT EXISTS ix_productos_catalogo_nombre_trgm
+    ON productos USING GIN (nombre gin_trgm_ops)
+    WHERE categoria_producto_id = 4;
+
+ANALYZE productos;
@@ -0,0 +1,14 @@
+-- Índices para la paginación por cursor (keyset) del catálogo y del historial de pedidos.
+
+-- Catálogo sin búsqueda: WHERE categoria_producto_id = 4 AND producto_id > :ultimo ORDER BY producto_id
+CREATE INDEX IF NOT EXISTS ix_productos_catalogo_producto_id
+    ON productos (producto_id)
+    WHERE categoria_producto_id = 4;
+
+-- Pedidos de un usuario: la clave primaria de pedidos_usuario empieza por pedido_id
+CREATE INDEX IF NOT EXISTS ix_pedidos_usuario_usuario_id
+    ON pedidos_usuario (usuario_id, pedido_id);
+
+-- Historial: ORDER BY coalesce(fecha_pago, fecha_creacion) DESC, pedido_id DESC
+CREATE INDEX IF NOT EXISTS ix_pedidos_fecha_efectiva
+    ON pedidos ((coalesce(fecha_pago, fecha_creacion)) DESC, pedido_id DESC);
@@ -0,0 +1,65 @@
+-- Columnas updated_at para los GET condicionales (ETag / Last-Modified) de productos y datos de referencia.
+-- Se mantienen con triggers para cubrir también las actualizaciones masivas (Query.update) y el SQL manual.
+-- Los valores se guardan en UTC sin zona horaria, como el resto de fechas de la base.
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := timezone('utc', now());
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tabla text;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY['productos', 'colores', 'impuestos', 'categorias_productos', 'filamentos'] LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT timezone(''utc'', now())',
+            tabla
+        );
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_updated_at ON %I', tabla, tabla);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_updated_at BEFORE UPDATE ON %I FOR EACH ROW EXECUTE FUNCTION set_updated_at()',
+            tabla, tabla
+        );
+    END LOOP;
+END;
+$$;
+
+-- La respuesta de GET /api/productos/<id> incluye imágenes, detalles y los tiempos de los modelos:
+-- cualquier cambio en esas tablas marca al producto como modificado.
+CREATE OR REPLACE FUNCTION touch_producto_updated_at() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE productos SET updated_at = timezone('utc', now()) WHERE producto_id = OLD.producto_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE productos SET updated_at = timezone('utc', now()) WHERE producto_id = NEW.producto_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tabla text;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY[
+        'imagenes_productos', 'detalles_catalogo', 'detalles_lamparas_ranpu', 'detalles_productos_ia', 'modelos'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_touch_producto ON %I', tabla, tabla);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_touch_producto AFTER INSERT OR UPDATE OR DELETE ON %I '
+            'FOR EACH ROW EXECUTE FUNCTION touch_producto_updated_at()',
+            tabla, tabla
+        );
+    END LOOP;
+END;
+$$;
+
+-- Validadores de los listados: max(updated_at) por tabla
+CREATE INDEX IF NOT EXISTS ix_colores_updated_at ON colores (updated_at);
+CREATE INDEX IF NOT EXISTS ix_filamentos_updated_at ON filamentos (updated_at);
+CREATE INDEX IF NOT EXISTS ix_impuestos_updated_at ON impuestos (updated_at);
+CREATE INDEX IF NOT EXISTS ix_categorias_productos_updated_at ON categorias_productos (updated_at);
@@ -0,0 +1,29 @@
+-- Agregados de producción por producto (tiempo total de impresión, peso total, cantidad de
+-- modelos y stock mínimo). Los mantienen create_modelo, update_modelo y delete_modelo dentro
+-- de su transacción (api/services/resumen_modelos.py); GET /api/productos/<id> lee una fila.
+
+CREATE TABLE IF NOT EXISTS resumen_modelos_productos (
+    producto_id integer PRIMARY KEY REFERENCES productos (producto_id) ON DELETE CASCADE,
+    cantidad_modelos integer NOT NULL,
+    tiempo_estimado_total interval NOT NULL,
+    peso_estimado_gramos_total numeric(12, 2) NOT NULL,
+    stock_minimo integer NOT NULL
+);
+
+-- Carga inicial a partir de los modelos existentes
+INSERT INTO resumen_modelos_productos (
+    producto_id, cantidad_modelos, tiempo_estimado_total, peso_estimado_gramos_total, stock_minimo
+)
+SELECT
+    producto_id,
+    count(*),
+    coalesce(sum(tiempo_estimado), interval '0'),
+    coalesce(sum(peso_estimado_gramos), 0),
+    min(stock)
+FROM modelos
+GROUP BY producto_id
+ON CONFLICT (producto_id) DO UPDATE SET
+    cantidad_modelos = EXCLUDED.cantidad_modelos,
+    tiempo_estimado_total = EXCLUDED.tiempo_estimado_total,
+    peso_estimado_gramos_total = EXCLUDED.peso_estimado_gramos_total,
+    stock_minimo = EXCLUDED.stock_minimo;
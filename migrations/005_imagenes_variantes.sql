@@ -0,0 +1,3 @@
+-- URLs de las variantes redimensionadas (thumbnail, card, detail; WebP y JPEG) de cada imagen.
+-- Las filas existentes quedan en NULL y los clientes siguen usando `ubicacion`.
+ALTER TABLE imagenes_productos ADD COLUMN IF NOT EXISTS variantes jsonb;
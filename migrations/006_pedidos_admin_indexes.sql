@@ -0,0 +1,9 @@
+-- Índices del listado de administración de pedidos (GET /api/pedidos/).
+
+-- Filtro por estado ordenado por fecha efectiva: WHERE estado_pedido_id IN (...) ORDER BY coalesce(...) DESC, pedido_id DESC
+CREATE INDEX IF NOT EXISTS ix_pedidos_estado_fecha_efectiva
+    ON pedidos (estado_pedido_id, (coalesce(fecha_pago, fecha_creacion)) DESC, pedido_id DESC);
+
+-- Productos de cada lote de pedidos: WHERE productos_pedidos.pedido_id IN (...)
+CREATE INDEX IF NOT EXISTS ix_productos_pedidos_pedido_id
+    ON productos_pedidos (pedido_id);
@@ -0,0 +1,75 @@
+-- Modelo de lectura de "Mis pedidos": una fila por pedido con la fecha efectiva ya formateada,
+-- los nombres de productos, la cantidad total y el thumbnail. Lo mantienen create_pedido,
+-- update_pedido, update_order_products y capture_order dentro de su transacción
+-- (api/services/resumen_pedidos.py); GET /api/pedidos/usuario/<uid> lee un rango del índice.
+
+CREATE TABLE IF NOT EXISTS resumen_pedidos_usuario (
+    pedido_id integer PRIMARY KEY REFERENCES pedidos (pedido_id) ON DELETE CASCADE,
+    usuario_id integer NOT NULL REFERENCES usuarios (usuario_id) ON DELETE CASCADE,
+    estado_pedido_id integer NOT NULL REFERENCES estados_pedidos (estado_pedido_id),
+    fecha_efectiva timestamp NOT NULL,
+    fecha_efectiva_es varchar(50) NOT NULL,
+    fecha_efectiva_en varchar(50) NOT NULL,
+    productos_nombres text NOT NULL,
+    cantidad_total integer NOT NULL,
+    thumbnail varchar(1000)
+);
+
+CREATE INDEX IF NOT EXISTS idx_resumen_pedidos_usuario_fecha
+    ON resumen_pedidos_usuario (usuario_id, fecha_efectiva DESC, pedido_id DESC);
+
+-- Carga inicial. Las fechas se guardan en UTC y se muestran en hora de Ecuador, igual que
+-- format_date_spanish / format_date_english.
+INSERT INTO resumen_pedidos_usuario (
+    pedido_id, usuario_id, estado_pedido_id, fecha_efectiva, fecha_efectiva_es, fecha_efectiva_en,
+    productos_nombres, cantidad_total, thumbnail
+)
+SELECT
+    p.pedido_id,
+    pu.usuario_id,
+    p.estado_pedido_id,
+    f.fecha,
+    extract(day FROM f.local)::int || ' de '
+        || (ARRAY['enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio', 'agosto',
+                  'septiembre', 'octubre', 'noviembre', 'diciembre'])[extract(month FROM f.local)::int]
+        || ', ' || extract(year FROM f.local)::int,
+    (ARRAY['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August',
+           'September', 'October', 'November', 'December'])[extract(month FROM f.local)::int]
+        || ' ' || extract(day FROM f.local)::int || ', ' || extract(year FROM f.local)::int,
+    coalesce(items.nombres, ''),
+    coalesce(items.cantidad, 0),
+    (
+        SELECT ip.ubicacion
+        FROM productos_pedidos pp
+        JOIN imagenes_productos ip ON ip.producto_id = pp.producto_id
+        WHERE pp.pedido_id = p.pedido_id
+          AND pp.producto_pedido_id = items.primer_producto_pedido_id
+        ORDER BY ip.is_thumbnail DESC, ip.imagen_producto_id
+        LIMIT 1
+    )
+FROM pedidos p
+JOIN pedidos_usuario pu ON pu.pedido_id = p.pedido_id
+CROSS JOIN LATERAL (
+    SELECT
+        coalesce(p.fecha_pago, p.fecha_creacion) AS fecha,
+        (coalesce(p.fecha_pago, p.fecha_creacion) AT TIME ZONE 'UTC') AT TIME ZONE 'America/Guayaquil' AS local
+) f
+LEFT JOIN LATERAL (
+    SELECT
+        string_agg(pr.nombre, ', ' ORDER BY pp.producto_pedido_id) AS nombres,
+        sum(pp.cantidad) AS cantidad,
+        min(pp.producto_pedido_id) AS primer_producto_pedido_id
+    FROM productos_pedidos pp
+    JOIN productos pr ON pr.producto_id = pp.producto_id
+    WHERE pp.pedido_id = p.pedido_id
+) items ON true
+WHERE f.fecha IS NOT NULL
+ON CONFLICT (pedido_id) DO UPDATE SET
+    usuario_id = EXCLUDED.usuario_id,
+    estado_pedido_id = EXCLUDED.estado_pedido_id,
+    fecha_efectiva = EXCLUDED.fecha_efectiva,
+    fecha_efectiva_es = EXCLUDED.fecha_efectiva_es,
+    fecha_efectiva_en = EXCLUDED.fecha_efectiva_en,
+    productos_nombres = EXCLUDED.productos_nombres,
+    cantidad_total = EXCLUDED.cantidad_total,
+    thumbnail = EXCLUDED.thumbnail;
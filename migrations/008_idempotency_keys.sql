@@ -0,0 +1,19 @@
+-- Respuestas guardadas por Idempotency-Key (api/middlewares/idempotency_middleware.py).
+-- Una fila por (usuario, endpoint, clave): 'en_proceso' mientras la primera petición corre
+-- y 'completado' con la respuesta hasta expira_en (24 h por defecto).
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    usuario varchar(128) NOT NULL,
+    endpoint varchar(100) NOT NULL,
+    clave varchar(255) NOT NULL,
+    huella varchar(64) NOT NULL,
+    estado varchar(20) NOT NULL,
+    status_code integer,
+    mimetype varchar(100),
+    cuerpo bytea,
+    creado_en timestamp NOT NULL DEFAULT timezone('utc', now()),
+    expira_en timestamp NOT NULL,
+    PRIMARY KEY (usuario, endpoint, clave)
+);
+
+CREATE INDEX IF NOT EXISTS ix_idempotency_keys_expira_en ON idempotency_keys (expira_en);
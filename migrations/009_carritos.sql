@@ -0,0 +1,13 @@
+-- Copia en Postgres de los carritos de Firebase (/carts/<firebase_uid>). El checkout lee
+-- de aquí; los cambios se replican en Firebase en segundo plano (api/services/cart_store.py).
+-- Los carritos que aún no tienen copia se importan de Firebase la primera vez que se leen.
+
+CREATE TABLE IF NOT EXISTS carritos (
+    firebase_uid varchar(128) PRIMARY KEY,
+    contenido jsonb NOT NULL,
+    updated_at timestamp NOT NULL DEFAULT timezone('utc', now())
+);
+
+DROP TRIGGER IF EXISTS trg_carritos_updated_at ON carritos;
+CREATE TRIGGER trg_carritos_updated_at BEFORE UPDATE ON carritos
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
@@ -0,0 +1,13 @@
+-- Historial de cambios de estado hechos en lote con POST /api/pedidos/transiciones
+-- (api/services/transiciones_pedidos.py). Cada llamada escribe todas sus filas con un solo INSERT.
+
+CREATE TABLE IF NOT EXISTS transiciones_pedidos (
+    transicion_id bigserial PRIMARY KEY,
+    pedido_id integer NOT NULL REFERENCES pedidos (pedido_id) ON DELETE CASCADE,
+    estado_anterior_id integer NOT NULL REFERENCES estados_pedidos (estado_pedido_id),
+    estado_nuevo_id integer NOT NULL REFERENCES estados_pedidos (estado_pedido_id),
+    usuario varchar(128),
+    fecha timestamp NOT NULL DEFAULT timezone('utc', now())
+);
+
+CREATE INDEX IF NOT EXISTS ix_transiciones_pedidos_pedido_id ON transiciones_pedidos (pedido_id);
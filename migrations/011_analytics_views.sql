@@ -0,0 +1,42 @@
+-- Vistas materializadas de analítica de ventas (api/services/analytics.py, /api/analytics).
+-- Las consultas del panel leen estas vistas, nunca las tablas vivas. Se refrescan con
+-- REFRESH MATERIALIZED VIEW CONCURRENTLY (por eso cada una tiene un índice único), así que
+-- las lecturas no se bloquean mientras se recalculan.
+-- Los días se cuentan en hora de Ecuador. Un pedido cuenta como venta cuando tiene fecha_pago
+-- y ya no está 'Esperando pago' (estado 8).
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_ventas_diarias AS
+SELECT
+    ((p.fecha_pago AT TIME ZONE 'UTC') AT TIME ZONE 'America/Guayaquil')::date AS dia,
+    count(*) AS pedidos,
+    sum(p.precio) AS subtotal,
+    sum(p.precio_final) AS ingresos,
+    coalesce(sum(p.ingreso_neto), 0) AS ingreso_neto
+FROM pedidos p
+WHERE p.fecha_pago IS NOT NULL AND p.estado_pedido_id <> 8
+GROUP BY 1;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_ventas_diarias ON mv_ventas_diarias (dia);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_productos_vendidos_diarios AS
+SELECT
+    ((p.fecha_pago AT TIME ZONE 'UTC') AT TIME ZONE 'America/Guayaquil')::date AS dia,
+    pp.producto_id,
+    sum(pp.cantidad) AS unidades,
+    count(DISTINCT pp.pedido_id) AS pedidos
+FROM productos_pedidos pp
+JOIN pedidos p ON p.pedido_id = pp.pedido_id
+WHERE p.fecha_pago IS NOT NULL AND p.estado_pedido_id <> 8
+GROUP BY 1, 2;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_productos_vendidos_diarios ON mv_productos_vendidos_diarios (dia, producto_id);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_pedidos_por_estado AS
+SELECT
+    p.estado_pedido_id,
+    count(*) AS pedidos,
+    sum(p.precio_final) AS total
+FROM pedidos p
+GROUP BY p.estado_pedido_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_pedidos_por_estado ON mv_pedidos_por_estado (estado_pedido_id);
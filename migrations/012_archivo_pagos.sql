@@ -0,0 +1,15 @@
+-- Archivo en frío de detalles_pago.
+--
+-- `pedidos` no se particiona: en PostgreSQL una clave foránea hacia una tabla particionada
+-- debe incluir la columna de partición, y pedidos_usuario, productos_pedidos,
+-- resumen_pedidos_usuario y transiciones_pedidos referencian solo pedido_id. Lo que hace
+-- crecer la tabla es el JSON completo de la captura de PayPal; ese JSON se mueve a
+-- Cloud Storage (api/services/archivo_pagos.py) y en la fila queda solo la referencia.
+
+ALTER TABLE pedidos ADD COLUMN IF NOT EXISTS detalles_pago_archivo varchar(500);
+ALTER TABLE pedidos ADD COLUMN IF NOT EXISTS detalles_pago_archivado_en timestamp;
+
+-- Candidatos del archivador: pagos con JSON todavía en la fila, por fecha de pago
+CREATE INDEX IF NOT EXISTS ix_pedidos_detalles_pago_por_archivar
+    ON pedidos (fecha_pago, pedido_id)
+    WHERE detalles_pago IS NOT NULL AND detalles_pago_archivo IS NULL;
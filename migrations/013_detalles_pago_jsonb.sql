@@ -0,0 +1,28 @@
+-- detalles_pago pasa de json a jsonb, con los campos que usa soporte extraídos en columnas
+-- indexadas y un índice GIN para consultas ad hoc sobre el JSON.
+--
+-- Los campos extraídos son columnas normales (no GENERATED) porque el archivador de
+-- migrations/012 deja detalles_pago en NULL y las columnas deben seguir con su valor.
+
+ALTER TABLE pedidos ALTER COLUMN detalles_pago TYPE jsonb USING detalles_pago::jsonb;
+
+-- El ORM guardaba None como el JSON 'null'; ahora se guarda como NULL de SQL
+UPDATE pedidos SET detalles_pago = NULL WHERE detalles_pago = 'null'::jsonb;
+
+ALTER TABLE pedidos ADD COLUMN IF NOT EXISTS paypal_capture_id varchar(64);
+ALTER TABLE pedidos ADD COLUMN IF NOT EXISTS paypal_payer_id varchar(64);
+ALTER TABLE pedidos ADD COLUMN IF NOT EXISTS paypal_status varchar(32);
+
+-- Los pagos ya archivados no se pueden completar desde aquí: su JSON está en Cloud Storage
+UPDATE pedidos SET
+    paypal_capture_id = detalles_pago #>> '{purchase_units,0,payments,captures,0,id}',
+    paypal_payer_id = detalles_pago #>> '{payer,payer_id}',
+    paypal_status = detalles_pago ->> 'status'
+WHERE detalles_pago IS NOT NULL AND paypal_capture_id IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_pedidos_paypal_capture_id ON pedidos (paypal_capture_id);
+CREATE INDEX IF NOT EXISTS ix_pedidos_paypal_payer_id ON pedidos (paypal_payer_id);
+CREATE INDEX IF NOT EXISTS ix_pedidos_paypal_status ON pedidos (paypal_status);
+
+-- Consultas de contención (detalles_pago @> '{"payer": {"email_address": "..."}}')
+CREATE INDEX IF NOT EXISTS ix_pedidos_detalles_pago_gin ON pedidos USING gin (detalles_pago jsonb_path_ops);
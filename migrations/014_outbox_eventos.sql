@@ -0,0 +1,24 @@
+-- Outbox transaccional (api/services/outbox.py). La captura de PayPal registra aquí la
+-- limpieza del carrito en Firebase en la misma transacción que marca el pedido como pagado;
+-- un hilo en segundo plano la ejecuta con reintentos, sin retener conexiones de las peticiones.
+
+CREATE TABLE IF NOT EXISTS outbox_eventos (
+    evento_id bigserial PRIMARY KEY,
+    tipo varchar(50) NOT NULL,
+    payload jsonb NOT NULL,
+    intentos integer NOT NULL DEFAULT 0,
+    disponible_en timestamp NOT NULL DEFAULT timezone('utc', now()),
+    procesado_en timestamp,
+    ultimo_error varchar(1000),
+    creado_en timestamp NOT NULL DEFAULT timezone('utc', now())
+);
+
+-- Solo los pendientes, en orden de llegada
+CREATE INDEX IF NOT EXISTS ix_outbox_eventos_pendientes
+    ON outbox_eventos (disponible_en, evento_id)
+    WHERE procesado_en IS NULL;
+
+-- Purga de eventos ya procesados
+CREATE INDEX IF NOT EXISTS ix_outbox_eventos_procesado_en
+    ON outbox_eventos (procesado_en)
+    WHERE procesado_en IS NOT NULL;
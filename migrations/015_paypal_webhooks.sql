@@ -0,0 +1,13 @@
+-- Webhooks de PayPal (api/services/paypal_webhooks.py). Cada notificación se guarda como
+-- evento del outbox con clave 'paypal:<id del evento>'; las reentregas de PayPal con el mismo
+-- id no se vuelven a encolar.
+
+ALTER TABLE outbox_eventos ADD COLUMN IF NOT EXISTS clave varchar(200);
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_outbox_eventos_clave') THEN
+        ALTER TABLE outbox_eventos ADD CONSTRAINT uq_outbox_eventos_clave UNIQUE (clave);
+    END IF;
+END;
+$$;
@@ -0,0 +1,4 @@
+-- Conciliación con PayPal (flask reconcile-paypal, api/services/paypal_reconciliation.py).
+-- Las capturas de PayPal se unen con los pedidos por pago_id (id de la captura).
+
+CREATE INDEX IF NOT EXISTS ix_pedidos_pago_id ON pedidos (pago_id);
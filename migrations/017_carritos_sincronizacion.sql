@@ -0,0 +1,7 @@
+-- Los carritos se validan contra Firebase por ETag en cada lectura y los cambios locales se
+-- replican por el outbox (api/services/cart_store.py). Las filas existentes no tienen ETag,
+-- así que la primera lectura de cada una vuelve a traer el carrito de Firebase.
+
+ALTER TABLE carritos ADD COLUMN IF NOT EXISTS firebase_etag varchar(100);
+ALTER TABLE carritos ADD COLUMN IF NOT EXISTS pendiente_firebase boolean NOT NULL DEFAULT false;
+ALTER TABLE carritos ADD COLUMN IF NOT EXISTS version bigint NOT NULL DEFAULT 0;
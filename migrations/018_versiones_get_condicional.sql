@@ -0,0 +1,73 @@
+-- Validadores monotónicos para los GET condicionales (corrige migrations/003).
+--
+-- now() es la hora de inicio de la transacción: una transacción larga que confirma después de
+-- otra más corta deja un updated_at menor que el máximo ya servido, el ETag no cambia y el
+-- cliente recibe 304 con datos viejos. Ahora:
+--   - cada fila lleva `version`, que el trigger sube desde la versión confirmada (OLD.version + 1;
+--     las escrituras sobre la misma fila se serializan por su bloqueo);
+--   - versiones_tablas guarda un contador por tabla que sube una vez por sentencia; como es una
+--     sola fila, los incrementos quedan en orden de commit y cubren también los DELETE;
+--   - updated_at usa clock_timestamp() y queda solo para Last-Modified.
+
+CREATE TABLE IF NOT EXISTS versiones_tablas (
+    tabla varchar(63) PRIMARY KEY,
+    version bigint NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := timezone('utc', clock_timestamp());
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION set_updated_at_version() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := timezone('utc', clock_timestamp());
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION incrementar_version_tabla() RETURNS trigger AS $$
+BEGIN
+    UPDATE versiones_tablas SET version = version + 1 WHERE tabla = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION touch_producto_updated_at() RETURNS trigger AS $$
+BEGIN
+    -- El trigger de productos fija updated_at y sube la versión de la fila y de la tabla
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE productos SET updated_at = timezone('utc', clock_timestamp()) WHERE producto_id = OLD.producto_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE productos SET updated_at = timezone('utc', clock_timestamp()) WHERE producto_id = NEW.producto_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    tabla text;
+BEGIN
+    FOREACH tabla IN ARRAY ARRAY['productos', 'colores', 'impuestos', 'categorias_productos', 'filamentos'] LOOP
+        EXECUTE format('ALTER TABLE %I ADD COLUMN IF NOT EXISTS version bigint NOT NULL DEFAULT 0', tabla);
+        INSERT INTO versiones_tablas (tabla) VALUES (tabla) ON CONFLICT DO NOTHING;
+
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_updated_at ON %I', tabla, tabla);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_updated_at BEFORE UPDATE ON %I FOR EACH ROW EXECUTE FUNCTION set_updated_at_version()',
+            tabla, tabla
+        );
+        EXECUTE format('DROP TRIGGER IF EXISTS trg_%s_version_tabla ON %I', tabla, tabla);
+        EXECUTE format(
+            'CREATE TRIGGER trg_%s_version_tabla AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION incrementar_version_tabla()',
+            tabla, tabla
+        );
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,9 @@
+-- Las claves de idempotencia también se separan por los parámetros de la ruta (p. ej. el id de la
+-- orden de PayPal en /orders/<order_id>/capture). Sin usuario verificado, `usuario` queda vacío:
+-- el userId del cuerpo lo elige el cliente y no sirve para aislar a nadie.
+-- Las filas existentes quedan con recurso '' y expiran solas.
+
+ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS recurso varchar(255) NOT NULL DEFAULT '';
+
+ALTER TABLE idempotency_keys DROP CONSTRAINT IF EXISTS idempotency_keys_pkey;
+ALTER TABLE idempotency_keys ADD PRIMARY KEY (usuario, endpoint, recurso, clave);
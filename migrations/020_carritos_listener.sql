@@ -0,0 +1,7 @@
+-- El checkout lee los carritos solo de Postgres: un listener de Firebase mantiene la copia al
+-- día y las escrituras locales se replican por lotes (api/services/cart_store.py), así que el
+-- ETag de migrations/017 ya no se usa. La réplica busca las filas pendientes con este índice.
+
+ALTER TABLE carritos DROP COLUMN IF EXISTS firebase_etag;
+
+CREATE INDEX IF NOT EXISTS ix_carritos_pendientes ON carritos (updated_at) WHERE pendiente_firebase;
@@ -0,0 +1,157 @@
+-- Particionado mensual de las líneas de pedido (productos_pedidos e imagenes_ranpulamps).
+--
+-- `pedidos` no se particiona: la referencian por pedido_id pedidos_usuario,
+-- resumen_pedidos_usuario, transiciones_pedidos y las líneas. Las tablas que crecen con cada
+-- pedido son las de líneas, así que son esas las que se particionan por RANGE sobre el mes del
+-- pedido:
+--   - pedidos.fecha_creacion pasa a ser NOT NULL (las filas antiguas sin ella toman fecha_pago
+--     o la fecha de la migración) y (pedido_id, fecha_creacion) queda UNIQUE;
+--   - productos_pedidos.fecha_pedido copia fecha_creacion del pedido y es la clave de partición;
+--     la FK compuesta (pedido_id, fecha_pedido) -> pedidos (pedido_id, fecha_creacion) impide que
+--     se desincronicen (fecha_creacion no se puede cambiar mientras el pedido tenga líneas);
+--   - imagenes_ranpulamps.fecha_pedido copia la de su línea, con FK compuesta hacia ella.
+-- Las consultas de la aplicación filtran las líneas por (pedido_id, fecha_pedido), así Postgres
+-- solo recorre los meses de esos pedidos (benchmarks/partition_pruning_check.py lo comprueba).
+-- Las particiones de los próximos meses las crea crear_particiones_lineas_pedido(), que llama
+-- el mantenimiento diario (api/services/archivo_pagos.py). Todo corre en una transacción.
+
+BEGIN;
+
+UPDATE pedidos SET fecha_creacion = coalesce(fecha_pago, timezone('utc', now())) WHERE fecha_creacion IS NULL;
+
+DO $$
+BEGIN
+    IF (SELECT column_default FROM information_schema.columns
+        WHERE table_name = 'pedidos' AND column_name = 'fecha_creacion') IS NULL THEN
+        ALTER TABLE pedidos ALTER COLUMN fecha_creacion SET DEFAULT timezone('utc', now());
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'uq_pedidos_pedido_id_fecha_creacion') THEN
+        ALTER TABLE pedidos ADD CONSTRAINT uq_pedidos_pedido_id_fecha_creacion UNIQUE (pedido_id, fecha_creacion);
+    END IF;
+END;
+$$;
+
+ALTER TABLE pedidos ALTER COLUMN fecha_creacion SET NOT NULL;
+
+-- Crea las particiones mensuales de ambas tablas desde el mes de `desde` y `meses` meses más.
+-- Un mes que ya tiene filas en la partición DEFAULT (el mantenimiento no corrió a tiempo) se
+-- omite con un aviso: esas filas siguen siendo correctas, solo no se podan.
+CREATE OR REPLACE FUNCTION crear_particiones_lineas_pedido(desde date, meses integer) RETURNS void AS $$
+DECLARE
+    inicio date;
+    fin date;
+    tabla text;
+    en_default boolean;
+BEGIN
+    FOR i IN 0..meses LOOP
+        inicio := (date_trunc('month', desde) + make_interval(months => i))::date;
+        fin := (inicio + interval '1 month')::date;
+        FOREACH tabla IN ARRAY ARRAY['productos_pedidos', 'imagenes_ranpulamps'] LOOP
+            CONTINUE WHEN to_regclass(format('%I', tabla || '_' || to_char(inicio, 'YYYY_MM'))) IS NOT NULL;
+            EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE fecha_pedido >= %L AND fecha_pedido < %L)',
+                           tabla || '_default', inicio, fin)
+                INTO en_default;
+            IF en_default THEN
+                RAISE WARNING 'La partición DEFAULT de % tiene filas de %; no se crea su partición', tabla, to_char(inicio, 'YYYY-MM');
+                CONTINUE;
+            END IF;
+            EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           tabla || '_' || to_char(inicio, 'YYYY_MM'), tabla, inicio, fin);
+        END LOOP;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    primer_mes date;
+    meses integer;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'productos_pedidos'::regclass) = 'p' THEN
+        RETURN;  -- ya migrada
+    END IF;
+
+    -- La vista materializada depende de productos_pedidos; se recrea más abajo
+    DROP MATERIALIZED VIEW IF EXISTS mv_productos_vendidos_diarios;
+
+    ALTER TABLE imagenes_ranpulamps RENAME TO imagenes_ranpulamps_anterior;
+    ALTER TABLE productos_pedidos RENAME TO productos_pedidos_anterior;
+
+    CREATE SEQUENCE productos_pedidos_id_seq;
+    PERFORM setval('productos_pedidos_id_seq', coalesce((SELECT max(producto_pedido_id) FROM productos_pedidos_anterior), 0) + 1, false);
+    CREATE SEQUENCE imagenes_ranpulamps_id_seq;
+    PERFORM setval('imagenes_ranpulamps_id_seq', coalesce((SELECT max(imagenes_ranpulamps_id) FROM imagenes_ranpulamps_anterior), 0) + 1, false);
+
+    CREATE TABLE productos_pedidos (
+        producto_pedido_id integer NOT NULL DEFAULT nextval('productos_pedidos_id_seq'),
+        pedido_id integer NOT NULL,
+        fecha_pedido timestamp NOT NULL,
+        producto_id integer NOT NULL REFERENCES productos (producto_id),
+        color_id integer REFERENCES colores (color_id),
+        cantidad integer NOT NULL,
+        CONSTRAINT pk_productos_pedidos_particionada PRIMARY KEY (producto_pedido_id, fecha_pedido),
+        CONSTRAINT fk_productos_pedidos_pedido FOREIGN KEY (pedido_id, fecha_pedido)
+            REFERENCES pedidos (pedido_id, fecha_creacion)
+    ) PARTITION BY RANGE (fecha_pedido);
+
+    CREATE TABLE imagenes_ranpulamps (
+        imagenes_ranpulamps_id integer NOT NULL DEFAULT nextval('imagenes_ranpulamps_id_seq'),
+        imagen_url varchar(1000) NOT NULL,
+        producto_pedido_id integer NOT NULL,
+        fecha_pedido timestamp NOT NULL,
+        CONSTRAINT pk_imagenes_ranpulamps_particionada PRIMARY KEY (imagenes_ranpulamps_id, fecha_pedido),
+        CONSTRAINT fk_imagenes_ranpulamps_linea FOREIGN KEY (producto_pedido_id, fecha_pedido)
+            REFERENCES productos_pedidos (producto_pedido_id, fecha_pedido)
+    ) PARTITION BY RANGE (fecha_pedido);
+
+    ALTER SEQUENCE productos_pedidos_id_seq OWNED BY productos_pedidos.producto_pedido_id;
+    ALTER SEQUENCE imagenes_ranpulamps_id_seq OWNED BY imagenes_ranpulamps.imagenes_ranpulamps_id;
+
+    CREATE TABLE productos_pedidos_default PARTITION OF productos_pedidos DEFAULT;
+    CREATE TABLE imagenes_ranpulamps_default PARTITION OF imagenes_ranpulamps DEFAULT;
+
+    -- Un mes por partición desde el pedido más antiguo con líneas hasta tres meses adelante
+    SELECT date_trunc('month', min(p.fecha_creacion))::date INTO primer_mes
+    FROM pedidos p WHERE EXISTS (SELECT 1 FROM productos_pedidos_anterior pp WHERE pp.pedido_id = p.pedido_id);
+    primer_mes := coalesce(primer_mes, date_trunc('month', timezone('utc', now()))::date);
+    meses := (extract(year FROM age(date_trunc('month', timezone('utc', now())), primer_mes)) * 12
+              + extract(month FROM age(date_trunc('month', timezone('utc', now())), primer_mes)))::integer + 3;
+    PERFORM crear_particiones_lineas_pedido(primer_mes, meses);
+
+    INSERT INTO productos_pedidos (producto_pedido_id, pedido_id, fecha_pedido, producto_id, color_id, cantidad)
+    SELECT pp.producto_pedido_id, pp.pedido_id, p.fecha_creacion, pp.producto_id, pp.color_id, pp.cantidad
+    FROM productos_pedidos_anterior pp
+    JOIN pedidos p ON p.pedido_id = pp.pedido_id;
+
+    INSERT INTO imagenes_ranpulamps (imagenes_ranpulamps_id, imagen_url, producto_pedido_id, fecha_pedido)
+    SELECT i.imagenes_ranpulamps_id, i.imagen_url, i.producto_pedido_id, pp.fecha_pedido
+    FROM imagenes_ranpulamps_anterior i
+    JOIN productos_pedidos pp ON pp.producto_pedido_id = i.producto_pedido_id;
+
+    -- Sin CASCADE: si algo más dependiera de las tablas anteriores, la migración se revierte
+    DROP TABLE imagenes_ranpulamps_anterior;
+    DROP TABLE productos_pedidos_anterior;
+
+    CREATE MATERIALIZED VIEW mv_productos_vendidos_diarios AS
+    SELECT
+        ((p.fecha_pago AT TIME ZONE 'UTC') AT TIME ZONE 'America/Guayaquil')::date AS dia,
+        pp.producto_id,
+        sum(pp.cantidad) AS unidades,
+        count(DISTINCT pp.pedido_id) AS pedidos
+    FROM productos_pedidos pp
+    JOIN pedidos p ON p.pedido_id = pp.pedido_id
+    WHERE p.fecha_pago IS NOT NULL AND p.estado_pedido_id <> 8
+    GROUP BY 1, 2;
+END;
+$$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_productos_vendidos_diarios ON mv_productos_vendidos_diarios (dia, producto_id);
+
+-- Índices en la tabla particionada (se crean en cada partición)
+CREATE INDEX IF NOT EXISTS ix_productos_pedidos_pedido_id ON productos_pedidos (pedido_id, fecha_pedido);
+CREATE INDEX IF NOT EXISTS ix_imagenes_ranpulamps_linea ON imagenes_ranpulamps (producto_pedido_id, fecha_pedido);
+
+ANALYZE productos_pedidos;
+ANALYZE imagenes_ranpulamps;
+
+COMMIT;